@@ -0,0 +1,223 @@
+"""
+Headless batch export.
+Lays out photos and writes PDFs from JSON job manifests, without Qt or
+Streamlit. All jobs run in one process, so decoded frames, strip templates
+and the render pool are shared across jobs.
+
+A manifest holds one job, a list of jobs, or {"jobs": [...]}:
+
+    {
+        "output": "orders/1042.pdf",
+        "photos": [
+            "a.jpg",
+            {"path": "b.jpg", "crop": "long", "color": "sepia", "type": "negative", "rotation": 90, "contrast": 20}
+        ],
+        "paper_size": "A4", "orientation": "Auto", "margin_mm": 10, "gap_mm": 2,
+        "dpi": 600, "mode": "raster", "compression": "jpeg", "jpeg_quality": 85,
+        "output_profile": "profiles/printer.icc", "intent": "relative"
+    }
+
+"paper_size" may also be roll media, e.g. "Roll 610" for a 610 mm wide roll
+whose single page is as long as the frames need.
+"output_profile" is "sRGB" (the default) or an RGB ICC profile file that frames
+are converted to and that is embedded in the PDF; "intent" is one of
+processor.RENDERING_INTENTS.
+Relative paths are resolved against the manifest's directory. Settings left
+out of a photo fall back to the job's "crop", "color", "type", "rotation" and
+"contrast". See processor.CROP_MODES, processor.COLOR_MODES and
+processor.FILM_TYPES for the values.
+
+    python batch.py jobs/*.json --report report.json
+    python batch.py -    # one job per line on stdin, for a long-running worker
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import processor
+import pdfwriter
+
+PHOTO_DEFAULTS = {"crop": "short", "color": "color", "type": "positive", "rotation": 0, "contrast": 0}
+LAYOUT_DEFAULTS = {
+    "paper_size": "A4",
+    "orientation": "Auto",
+    "margin_mm": 10,
+    "gap_mm": 2,
+    "dpi": processor.DEFAULT_DPI,
+}
+EXPORT_MODES = ("raster", "vector")
+EXPORT_DEFAULTS = {"compression": "flate", "jpeg_quality": pdfwriter.DEFAULT_JPEG_QUALITY}
+COLOR_DEFAULTS = {"output_profile": processor.DEFAULT_OUTPUT_PROFILE, "intent": "perceptual"}
+
+def load_manifest(path):
+    """
+    Reads a manifest file.
+    returns: list of (job, base_dir)
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "jobs" in data:
+        data = data["jobs"]
+    if isinstance(data, dict):
+        data = [data]
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [(job, base_dir) for job in data]
+
+def job_specs(job, base_dir=""):
+    """
+    Returns the frame specs (image_path, crop_mode, color_mode, film_type, rotation, contrast) of a job.
+    """
+    photos = job.get("photos")
+    if not photos:
+        raise ValueError("job has no photos")
+    specs = []
+    for photo in photos:
+        if isinstance(photo, str):
+            photo = {"path": photo}
+        settings = {k: photo.get(k, job.get(k, v)) for k, v in PHOTO_DEFAULTS.items()}
+        if settings["crop"] not in processor.CROP_MODES:
+            raise ValueError(f"unknown crop mode: {settings['crop']}")
+        if settings["color"] not in processor.COLOR_MODES:
+            raise ValueError(f"unknown color mode: {settings['color']}")
+        if settings["type"] not in processor.FILM_TYPES:
+            raise ValueError(f"unknown film type: {settings['type']}")
+        for key in ("rotation", "contrast"):
+            try:
+                settings[key] = int(settings[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number: {settings[key]!r}")
+        path = os.path.join(base_dir, photo["path"])
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"photo not found: {path}")
+        specs.append((path, settings["crop"], settings["color"], settings["type"], settings["rotation"], settings["contrast"]))
+    return specs
+
+def run_job(job, base_dir="", workers=None):
+    """
+    Lays out one job and writes its PDF.
+    returns: report dict with output, frames, pages, cached (frames served from
+    the frame cache), seconds and stages (per-stage totals, see processor.Metrics)
+    """
+    start = time.perf_counter()
+    output = job.get("output")
+    if not output:
+        raise ValueError("job has no output path")
+    output = os.path.join(base_dir, output)
+    mode = job.get("mode", "raster")
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"unknown export mode: {mode}")
+    export = {k: job.get(k, v) for k, v in EXPORT_DEFAULTS.items()}
+    if export["compression"] not in pdfwriter.COMPRESSIONS:
+        raise ValueError(f"unknown compression: {export['compression']}")
+    export["jpeg_quality"] = int(export["jpeg_quality"])
+    color = {k: job.get(k, v) for k, v in COLOR_DEFAULTS.items()}
+    if color["output_profile"] != processor.DEFAULT_OUTPUT_PROFILE:
+        color["output_profile"] = os.path.join(base_dir, color["output_profile"])
+    color_target = processor.color_target(color["output_profile"], color["intent"])
+
+    specs = job_specs(job, base_dir)
+    layout = {k: job.get(k, v) for k, v in LAYOUT_DEFAULTS.items()}
+    layout["dpi"] = int(layout["dpi"])
+    if processor.plan_layout(len(specs), **layout).page_count == 0:
+        raise ValueError("no frame fits on the page with these margins")
+    out_dir = os.path.dirname(output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    hits = processor.frame_cache.hits
+    with processor.collect_metrics() as metrics:
+        if mode == "vector":
+            pages = pdfwriter.write_vector_pdf(output, specs, **layout, **export, color_target=color_target, workers=workers)
+        else:
+            engine = processor.LayoutEngine(processor.frame_source("full", workers=workers, color_target=color_target), max_pages=0)
+            engine.update(specs, **layout)
+            pages = pdfwriter.write_layout_pdf(output, engine, **export, icc_profile=processor.output_profile_bytes(color_target))
+
+    return {
+        "output": output,
+        "frames": len(specs),
+        "pages": pages,
+        "cached": processor.frame_cache.hits - hits,
+        "seconds": round(time.perf_counter() - start, 3),
+        "stages": metrics.stages,
+        "breakdown": metrics.breakdown(4),
+    }
+
+def run_jobs(jobs, workers=None):
+    """
+    Runs (job, base_dir) pairs in order. A job may also be given as a JSON
+    string, or as the exception raised while reading its manifest (base_dir
+    is then the manifest path). A failing job is reported and the remaining
+    jobs still run.
+    yields: report dict per job, with status "ok" or "error"
+    """
+    for job, base_dir in jobs:
+        name = None
+        start = time.perf_counter()
+        try:
+            if isinstance(job, Exception):
+                name = base_dir
+                raise job
+            if isinstance(job, str):
+                job = json.loads(job)
+            if not isinstance(job, dict):
+                raise ValueError("job must be a JSON object")
+            name = job.get("name") or job.get("output")
+            report = run_job(job, base_dir, workers)
+            report["status"] = "ok"
+        except Exception as e:
+            report = {"status": "error", "error": str(e), "seconds": round(time.perf_counter() - start, 3)}
+        report["name"] = name
+        yield report
+
+def _stdin_jobs():
+    for line in sys.stdin:
+        line = line.strip()
+        if line:
+            yield line, os.getcwd()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export film layout PDFs from JSON job manifests.")
+    parser.add_argument("manifests", nargs="+", help="manifest files, or - to read one job per line from stdin")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: one per CPU)")
+    parser.add_argument("--cache-mb", type=int, default=None, help="frame cache budget in MB")
+    parser.add_argument("--report", help="write the per-job reports to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.cache_mb is not None:
+        processor.frame_cache.max_bytes = args.cache_mb * 1024 * 1024
+
+    def jobs():
+        for path in args.manifests:
+            if path == "-":
+                yield from _stdin_jobs()
+            else:
+                try:
+                    manifest = load_manifest(path)
+                except Exception as e:
+                    # Reported like a failed job; the other manifests still run
+                    yield e, path
+                    continue
+                yield from manifest
+
+    reports = []
+    start = time.perf_counter()
+    for report in run_jobs(jobs(), args.workers):
+        reports.append(report)
+        if report["status"] == "ok":
+            print(f"[ok] {report['name']}: {report['frames']} frames, {report['pages']} pages "
+                  f"in {report['seconds']:.2f}s ({report['cached']} cached; {report['breakdown']})", flush=True)
+        else:
+            print(f"[error] {report['name']}: {report['error']}", file=sys.stderr, flush=True)
+
+    failed = sum(r["status"] != "ok" for r in reports)
+    print(f"{len(reports) - failed}/{len(reports)} jobs done in {time.perf_counter() - start:.2f}s")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
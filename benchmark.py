@@ -0,0 +1,232 @@
+"""
+Benchmark suite for frame rendering, layout and PDF export.
+
+Generates a synthetic photo corpus (varied sizes and aspect ratios, fixed
+seed) and times each case at every DPI. Each case runs in its own
+subprocess so its peak RSS is measured in isolation. Results are written as
+JSON and can be compared against an earlier run:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+    python benchmark.py --cases film_frame layout --dpi 300 600
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+import PIL
+from PIL import Image, ImageDraw
+
+import processor
+import pdfwriter
+
+DPIS = (300, 600, 1200, 2400, 3600)
+
+# (width, height) of the synthetic photos: landscape and portrait 3:2, 4:3,
+# square, 16:9, a panorama and a small phone-sized shot
+CORPUS_SIZES = (
+    (6000, 4000), (4000, 6000), (4032, 3024), (3024, 4032),
+    (3000, 3000), (3840, 2160), (8000, 2000), (1600, 1200),
+)
+
+def make_corpus(directory, sizes=CORPUS_SIZES, seed=0):
+    """
+    Writes one JPEG per size into directory (reused if already there).
+    The content mixes gradients, shapes and noise so decoding and
+    resampling cost about what they would on a real photo.
+    returns: list of file paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i, (w, h) in enumerate(sizes):
+        path = os.path.join(directory, f"photo_{i:02d}_{w}x{h}.jpg")
+        # Drawn up front so every photo is the same whether or not earlier ones were reused
+        shapes = [
+            (rng.randrange(w), rng.randrange(h), rng.randrange(min(w, h) // 20, min(w, h) // 4),
+             tuple(rng.randrange(256) for _ in range(3)))
+            for _ in range(12)
+        ]
+        if not os.path.exists(path):
+            gradient = Image.linear_gradient('L').resize((w, h))
+            noise = Image.effect_noise((w, h), 40)
+            img = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_180)))
+            draw = ImageDraw.Draw(img)
+            for x, y, r, color in shapes:
+                draw.ellipse([x - r, y - r, x + r, y + r], fill=color)
+            img.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def corpus_specs(paths):
+    # Cycle through the settings so every code path is exercised
+    crops = ('short', 'long')
+    colors = processor.COLOR_MODES
+    types = processor.FILM_TYPES
+    return [
+        (path, crops[i % 2], colors[i % 3], types[i // 3 % 3], (0, 90, 180, 270)[i % 4], (0, 25)[i // 2 % 2])
+        for i, path in enumerate(paths)
+    ]
+
+def bench_film_frame(specs, dpi, tmp_dir):
+    for spec in specs:
+        processor.create_film_frame(**processor.spec_kwargs(spec), dpi=dpi)
+    return len(specs)
+
+def bench_sprocket_holes(specs, dpi, tmp_dir):
+    # One strip as wide as an A4 landscape row
+    grid = processor.page_grid("A4", "Landscape", dpi=dpi)
+    width = grid["cols"] * grid["frame_w"] + (grid["cols"] - 1) * grid["gap"]
+    strip = Image.new('RGB', (width, grid["frame_h"] + 1), color='black')
+    rows = 20
+    for _ in range(rows):
+        processor.draw_sprocket_holes(strip, 0, 0, width, dpi)
+    return rows
+
+def bench_layout(specs, dpi, tmp_dir):
+    frame = Image.new('RGB', (processor.mm_to_px(processor.FRAME_W_MM, dpi), processor.mm_to_px(processor.FRAME_H_MM, dpi)))
+    pages, _ = processor.layout_on_paper([frame] * len(specs), "A4", dpi=dpi)
+    return len(pages)
+
+def bench_pdf_raster(specs, dpi, tmp_dir):
+    engine = processor.LayoutEngine(processor.frame_source("full", cache=processor.FrameCache(), workers=1), max_pages=0)
+    engine.update(specs, "A4", dpi=dpi)
+    return pdfwriter.write_layout_pdf(os.path.join(tmp_dir, "raster.pdf"), engine)
+
+def bench_pdf_vector(specs, dpi, tmp_dir):
+    return pdfwriter.write_vector_pdf(os.path.join(tmp_dir, "vector.pdf"), specs, "A4", dpi=dpi)
+
+CASES = {
+    "film_frame": bench_film_frame,
+    "sprocket_holes": bench_sprocket_holes,
+    "layout": bench_layout,
+    "pdf_raster": bench_pdf_raster,
+    "pdf_vector": bench_pdf_vector,
+}
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_case(case, dpi, corpus_dir, repeat=1):
+    """
+    Runs one case in this process.
+    returns: result dict with wall times (best and median of repeat runs),
+    peak RSS and the number of items (frames, strips or pages) processed
+    """
+    specs = corpus_specs(make_corpus(corpus_dir))
+    times = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            items = CASES[case](specs, dpi, tmp_dir)
+            times.append(time.perf_counter() - start)
+    return {
+        "case": case,
+        "dpi": dpi,
+        "seconds": round(min(times), 4),
+        "median_seconds": round(statistics.median(times), 4),
+        "repeat": repeat,
+        "items": items,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run_isolated(case, dpi, corpus_dir, repeat=1):
+    # A fresh interpreter per case, so one case's peak memory does not hide another's
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-case", case, str(dpi),
+           "--corpus", corpus_dir, "--repeat", str(repeat)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"case": case, "dpi": dpi, "error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Matches results to a baseline run by (case, dpi).
+    returns: list of (case, dpi, old_seconds, new_seconds, ratio, regressed)
+    """
+    old = {(r["case"], r["dpi"]): r for r in baseline["results"] if "seconds" in r}
+    rows = []
+    for r in results:
+        base = old.get((r["case"], r["dpi"]))
+        if base is None or "seconds" not in r:
+            continue
+        ratio = r["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+        rows.append((r["case"], r["dpi"], base["seconds"], r["seconds"], ratio, ratio > 1 + threshold))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark frame rendering, layout and PDF export.")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--dpi", nargs="+", type=int, default=list(DPIS))
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the best time is reported")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "filmlayout-bench"),
+                        help="directory of the synthetic photos (generated once)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown counted as a regression (0.1 = 10%%)")
+    parser.add_argument("--run-case", nargs=2, metavar=("CASE", "DPI"), help=argparse.SUPPRESS)
+    parser.add_argument("--make-corpus", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.make_corpus:
+        make_corpus(args.corpus)
+        return 0
+
+    if args.run_case:
+        case, dpi = args.run_case
+        print(json.dumps(run_case(case, int(dpi), args.corpus, args.repeat)))
+        return 0
+
+    # Generated in a child too: on Linux a child starts with its parent's peak RSS
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--make-corpus", "--corpus", args.corpus], check=True)
+    results = []
+    for case in args.cases:
+        for dpi in args.dpi:
+            result = run_isolated(case, dpi, args.corpus, args.repeat)
+            results.append(result)
+            if "error" in result:
+                print(f"{case:<16}{dpi:>6} dpi  failed: {result['error']}", flush=True)
+            else:
+                print(f"{case:<16}{dpi:>6} dpi  {result['seconds']:9.3f}s  {result['peak_rss_mb'] or 0:9.1f} MB", flush=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": [list(size) for size in CORPUS_SIZES],
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    regressed = False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n{'case':<16}{'dpi':>6}{'before':>10}{'after':>10}{'ratio':>8}")
+        for case, dpi, old, new, ratio, slower in compare(results, baseline, args.threshold):
+            regressed |= slower
+            print(f"{case:<16}{dpi:>6}{old:>10.3f}{new:>10.3f}{ratio:>8.2f}{'  REGRESSION' if slower else ''}")
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,278 @@
 import sys
 import os
+import math
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QListWidget, QLabel, 
-                             QFileDialog, QScrollArea, QSpinBox, QComboBox, QGroupBox, QMessageBox)
-from PySide6.QtGui import QPixmap, QImage
-from PySide6.QtCore import Qt, Signal, QPoint
+                             QFileDialog, QScrollArea, QSpinBox, QComboBox, QGroupBox, QMessageBox,
+                             QCheckBox, QProgressBar, QProgressDialog)
+from PySide6.QtGui import QImage, QPainter, QIcon, QPixmap
+from PySide6.QtCore import Qt, Signal, QPoint, QRect, QObject, QRunnable, QThreadPool, QTimer, QEvent, QSize
 from PIL import Image
 
 import processor
+import pdfwriter
+import project
 
-class ClickableLabel(QLabel):
+# The preview is rendered at the DPI the viewport needs, within these bounds
+MIN_PREVIEW_DPI = 36
+MAX_PREVIEW_DPI = 600
+ZOOM_LEVELS = (1.0, 1.5, 2.0, 3.0, 4.0)
+# A roll is rendered whole, so no side may be longer than Qt can paint
+# (see also processor.MAX_ROLL_PREVIEW_PIXELS)
+MAX_PREVIEW_SIDE = 32767
+
+# Side of the photo list icons (pixels)
+ICON_SIZE = 48
+
+def pil_to_qimage(pil_img):
+    """
+    Wraps a PIL image in a QImage with a single copy.
+    Pillow keeps RGB pixels as 4 bytes (RGBX), so packing them as RGBX is a
+    plain copy that Qt uses directly as Format_RGBX8888 with an explicit
+    stride. QImage does not own the bytes, so they are kept on the image.
+    """
+    if pil_img.mode != "RGB":
+        pil_img = pil_img.convert("RGB")
+    data = pil_img.tobytes("raw", "RGBX")
+    qimage = QImage(data, pil_img.width, pil_img.height, pil_img.width * 4, QImage.Format_RGBX8888)
+    qimage.buffer = data
+    return qimage
+
+class PreviewCanvas(QWidget):
+    """
+    Paints the preview page straight from its QImage, centered at
+    display_size, so the page is never copied into a QPixmap.
+    """
     clicked = Signal(QPoint)
+
+    def __init__(self, text=""):
+        super().__init__()
+        self.text = text
+        self.image = None
+        self.display_size = QSize()
+
+    def set_image(self, image, display_size):
+        self.image = image
+        self.display_size = display_size
+        # Grows the scroll area's content when zoomed in
+        self.setMinimumSize(display_size)
+        self.update()
+
+    def clear(self, text):
+        self.image = None
+        self.text = text
+        self.setMinimumSize(0, 0)
+        self.update()
+
+    def image_rect(self):
+        x = max(0, (self.width() - self.display_size.width()) // 2)
+        y = max(0, (self.height() - self.display_size.height()) // 2)
+        return QRect(QPoint(x, y), self.display_size)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self.image is None:
+            painter.drawText(self.rect(), Qt.AlignCenter, self.text)
+            return
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(self.image_rect(), self.image)
+
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
             # In PySide6, position() returns QPointF
             self.clicked.emit(event.position().toPoint())
         super().mousePressEvent(event)
 
+class PreviewSignals(QObject):
+    finished = Signal(int, object)
+
+class PreviewTask(QRunnable):
+    """
+    Lays out and rasterizes one preview page off the UI thread.
+    Tasks run one at a time on their own pool, so the layout engine is only
+    ever touched by one thread.
+    """
+    def __init__(self, generation, engine, specs, settings, page_index):
+        super().__init__()
+        self.generation = generation
+        self.engine = engine
+        self.specs = specs
+        self.settings = settings
+        self.page_index = page_index
+        self.cancelled = False
+        self.signals = PreviewSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        if self.cancelled:
+            return
+        engine = self.engine
+        with processor.collect_metrics() as metrics:
+            engine.update(self.specs, **self.settings)
+            result = {
+                "page_count": engine.page_count,
+                "page_index": 0,
+                "page": None,
+                "plan": engine.plan,
+                "dpi": engine.dpi,
+                "metrics": metrics,
+            }
+            if engine.page_count:
+                page_index = max(0, min(self.page_index, engine.page_count - 1))
+                try:
+                    page = engine.render_page(page_index, cancelled=lambda: self.cancelled)
+                except processor.RenderCancelled:
+                    return
+                # QImage (unlike QPixmap) may be built off the UI thread
+                result["page"] = pil_to_qimage(page)
+                result["page_index"] = page_index
+        self.signals.finished.emit(self.generation, result)
+
+class ProbeSignals(QObject):
+    probed = Signal(int, object, object, bool)
+
+class ProbeTask(QRunnable):
+    """
+    Reads one photo's header and makes its list icon off the UI thread.
+    With prefetch set, the photo's preview frame is also rendered into the
+    shared frame cache, so the first preview finds it ready. Tasks run on a
+    pool with a thread per core.
+    The photo's settings are copied here, on the UI thread.
+    """
+    def __init__(self, generation, data, prefetch=None):
+        super().__init__()
+        self.generation = generation
+        self.data = data
+        self.spec = (data["path"], data["crop"], data["color"], data["type"], data["rotation"], data["contrast"])
+        self.prefetch = prefetch # (dpi, color_target) or None
+        self.signals = ProbeSignals()
+
+    def run(self):
+        path, crop, color, film_type, rotation, contrast = self.spec
+        try:
+            info = processor.probe_image(path, ICON_SIZE)
+            # Cameras without an EXIF thumbnail cost a reduced-scale decode
+            thumb = info.pop("thumbnail") or processor.make_thumbnail(path, ICON_SIZE)
+            if rotation in processor.TRANSPOSES:
+                thumb = thumb.transpose(processor.TRANSPOSES[rotation])
+            info["icon"] = pil_to_qimage(thumb)
+            if self.prefetch is not None:
+                dpi, color_target = self.prefetch
+                processor.frame_cache.get(path, crop, color, film_type, rotation, contrast=contrast, draw_holes=False,
+                                          dpi=dpi, quality="preview", color_target=color_target)
+        except Exception as e:
+            info = {"error": str(e)}
+        self.signals.probed.emit(self.generation, self.data, info, self.prefetch is not None)
+
+class ExportSignals(QObject):
+    progress = Signal(int, int) # frames done, pages done
+    finished = Signal(object, int) # metrics, pages written
+    failed = Signal(str)
+    cancelled = Signal()
+
+class ExportTask(QRunnable):
+    """
+    Writes the PDF off the UI thread; see pdfwriter.write_layout_pdf for how
+    rendering, compositing, encoding and writing overlap. cancel() stops it
+    at the next film row, band or photo, and the target file is left untouched.
+    """
+    def __init__(self, save_path, specs, layout, dpi, vector, color_target, compression):
+        super().__init__()
+        self.save_path = save_path
+        self.specs = specs
+        self.layout = layout
+        self.dpi = dpi
+        self.vector = vector
+        self.color_target = color_target
+        self.compression = compression
+        self.cancelled = False
+        self.signals = ExportSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        options = dict(progress=self.signals.progress.emit, cancelled=lambda: self.cancelled, **self.compression)
+        try:
+            with processor.collect_metrics() as metrics:
+                if self.vector:
+                    # Vector film base and holes; each photo embedded once at up to dpi
+                    pages = pdfwriter.write_vector_pdf(self.save_path, self.specs, **self.layout, dpi=self.dpi,
+                                                       color_target=self.color_target, **options)
+                else:
+                    # Each film row's frames are rendered across all cores
+                    engine = processor.LayoutEngine(
+                        processor.frame_source("full", workers=None, color_target=self.color_target), max_pages=0
+                    )
+                    engine.update(self.specs, **self.layout, dpi=self.dpi)
+                    pages = 0
+                    if engine.page_count:
+                        pages = pdfwriter.write_layout_pdf(
+                            self.save_path, engine, icc_profile=processor.output_profile_bytes(self.color_target), **options
+                        )
+        except processor.RenderCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(metrics, pages)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("35mm 胶片排版工具")
         self.resize(1100, 900)
 
-        self.images_data = [] # List of dict: {"path": str, "crop": str, "color": str, "type": str}
-        self.preview_pages = []
-        self.layout_info = []
+        self.images_data = [] # List of dict: {"path": str, "crop": str, "color": str, "type": str, "rotation": int, "contrast": int}
+        # Keeps rasterized preview pages and only redraws the ones that changed.
+        # Frames opened from a project are drawn from its proxies until edited.
+        # The preview task passes the preview color target to the engine, which
+        # switches frame sources itself on the preview thread.
+        self.proxies = {}
+        self.layout_engine = processor.LayoutEngine(
+            project.proxy_frame_source(self.proxies, processor.frame_source("preview")),
+            source_factory=lambda target: project.proxy_frame_source(
+                self.proxies, processor.frame_source("preview", color_target=target)
+            ),
+        )
+        self.layout_plan = None # Geometry of the previewed layout (processor.LayoutPlan)
+        self.page_count = 0
         self.current_page = 0
 
+        # Preview rendering runs on a single background thread. Rapid changes are
+        # coalesced by the debounce timer and only the newest result is shown.
+        self.preview_pool = QThreadPool()
+        self.preview_pool.setMaxThreadCount(1)
+        self.preview_generation = 0
+        self.preview_task = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(150)
+        self.preview_timer.timeout.connect(self.start_preview_render)
+
+        # Exports run one at a time in the background behind a progress dialog
+        self.export_pool = QThreadPool()
+        self.export_pool.setMaxThreadCount(1)
+        self.export_dialog = None
+        self.export_task = None
+
+        # Added photos are probed on a thread per core. The first preview waits
+        # for the frames of the shown page, which are rendered there as well.
+        self.probe_pool = QThreadPool()
+        self.probe_generation = 0
+        self.probe_total = 0
+        self.probe_done = 0
+        self.prefetch_pending = 0
+
+        # The rendered page is kept at its own DPI and rescaled on resize;
+        # only zooming in (or a much larger window) renders it again
+        self.zoom = 1.0
+        self.preview_image = None
+        self.preview_dpi = 0
+
         self.init_ui()
 
     def init_ui(self):
@@ -40,6 +285,15 @@ class MainWindow(QMainWindow):
         left_layout = QVBoxLayout(left_panel)
         left_panel.setFixedWidth(300)
 
+        project_layout = QHBoxLayout()
+        self.btn_open_project = QPushButton("打开项目")
+        self.btn_open_project.clicked.connect(self.open_project)
+        project_layout.addWidget(self.btn_open_project)
+        self.btn_save_project = QPushButton("保存项目")
+        self.btn_save_project.clicked.connect(self.save_project)
+        project_layout.addWidget(self.btn_save_project)
+        left_layout.addLayout(project_layout)
+
         self.btn_add = QPushButton("添加照片")
         self.btn_add.clicked.connect(self.add_photos)
         left_layout.addWidget(self.btn_add)
@@ -60,8 +314,14 @@ class MainWindow(QMainWindow):
         self.list_widget.setDragDropMode(QListWidget.InternalMove)
         self.list_widget.model().rowsMoved.connect(self.on_rows_moved)
         self.list_widget.currentRowChanged.connect(self.on_selection_changed)
+        self.list_widget.setIconSize(QSize(ICON_SIZE, ICON_SIZE))
         left_layout.addWidget(self.list_widget)
 
+        self.probe_progress = QProgressBar()
+        self.probe_progress.setFormat("读取照片信息 %v / %m")
+        self.probe_progress.hide()
+        left_layout.addWidget(self.probe_progress)
+
         # Per-image settings group
         self.group_settings = QGroupBox("选中照片设置")
         settings_layout = QVBoxLayout(self.group_settings)
@@ -81,7 +341,7 @@ class MainWindow(QMainWindow):
         settings_layout.addWidget(QLabel("色彩模式:"))
         color_layout = QHBoxLayout()
         self.combo_color = QComboBox()
-        self.combo_color.addItems(["彩色", "黑白"])
+        self.combo_color.addItems(["彩色", "黑白", "棕褐色"]) # processor.COLOR_MODES order
         self.combo_color.currentIndexChanged.connect(self.update_image_settings)
         color_layout.addWidget(self.combo_color)
         self.btn_apply_color_all = QPushButton("应用全部")
@@ -92,7 +352,7 @@ class MainWindow(QMainWindow):
         settings_layout.addWidget(QLabel("胶片类型:"))
         type_layout = QHBoxLayout()
         self.combo_type = QComboBox()
-        self.combo_type.addItems(["正片", "负片 (反相)"])
+        self.combo_type.addItems(["正片", "负片 (反相)", "彩色负片 (橙色片基)"]) # processor.FILM_TYPES order
         self.combo_type.currentIndexChanged.connect(self.update_image_settings)
         type_layout.addWidget(self.combo_type)
         self.btn_apply_type_all = QPushButton("应用全部")
@@ -111,6 +371,19 @@ class MainWindow(QMainWindow):
         rotate_layout.addWidget(self.btn_apply_rotate_all)
         settings_layout.addLayout(rotate_layout)
 
+        settings_layout.addWidget(QLabel("对比度:"))
+        contrast_layout = QHBoxLayout()
+        self.spin_contrast = QSpinBox()
+        self.spin_contrast.setRange(*processor.CONTRAST_RANGE)
+        self.spin_contrast.setSingleStep(10)
+        self.spin_contrast.setSuffix(" %")
+        self.spin_contrast.valueChanged.connect(self.update_image_settings)
+        contrast_layout.addWidget(self.spin_contrast)
+        self.btn_apply_contrast_all = QPushButton("应用全部")
+        self.btn_apply_contrast_all.clicked.connect(self.apply_contrast_to_all)
+        contrast_layout.addWidget(self.btn_apply_contrast_all)
+        settings_layout.addLayout(contrast_layout)
+
         left_layout.addWidget(self.group_settings)
 
         # Layout settings
@@ -119,10 +392,20 @@ class MainWindow(QMainWindow):
 
         layout_vbox.addWidget(QLabel("纸张大小:"))
         self.combo_paper_size = QComboBox()
-        self.combo_paper_size.addItems(["A4", "A5", "A6"])
-        self.combo_paper_size.currentIndexChanged.connect(self.update_preview)
+        self.combo_paper_size.addItems(["A4", "A5", "A6", "卷筒纸"])
+        self.combo_paper_size.currentIndexChanged.connect(self.on_paper_size_changed)
         layout_vbox.addWidget(self.combo_paper_size)
 
+        # Roll media: fixed width, the length follows the number of frames
+        self.spin_roll_width = QSpinBox()
+        self.spin_roll_width.setRange(50, 2000)
+        self.spin_roll_width.setValue(processor.DEFAULT_ROLL_WIDTH_MM)
+        self.spin_roll_width.setPrefix("卷宽 ")
+        self.spin_roll_width.setSuffix(" mm")
+        self.spin_roll_width.setEnabled(False)
+        self.spin_roll_width.valueChanged.connect(self.update_preview)
+        layout_vbox.addWidget(self.spin_roll_width)
+
         layout_vbox.addWidget(QLabel("纸张方向:"))
         self.combo_orientation = QComboBox()
         self.combo_orientation.addItems(["自动 (Auto)", "纵向 (Portrait)", "横向 (Landscape)"])
@@ -147,7 +430,54 @@ class MainWindow(QMainWindow):
         self.combo_export_dpi = QComboBox()
         self.combo_export_dpi.addItems(["300", "600", "1200", "2400", "3600"])
         self.combo_export_dpi.setCurrentIndex(2) # Default 1200
+        # The export DPI decides how many frames fit, so the preview follows it
+        self.combo_export_dpi.currentIndexChanged.connect(self.update_preview)
         layout_vbox.addWidget(self.combo_export_dpi)
+
+        layout_vbox.addWidget(QLabel("导出模式:"))
+        self.combo_export_mode = QComboBox()
+        self.combo_export_mode.addItems(["栅格 (整页位图)", "矢量 (胶片底与齿孔为路径)"])
+        layout_vbox.addWidget(self.combo_export_mode)
+
+        layout_vbox.addWidget(QLabel("图像压缩:"))
+        compression_layout = QHBoxLayout()
+        self.combo_compression = QComboBox()
+        self.combo_compression.addItems(["无损 (Flate)", "JPEG"]) # pdfwriter.COMPRESSIONS order
+        compression_layout.addWidget(self.combo_compression)
+        self.spin_jpeg_quality = QSpinBox()
+        self.spin_jpeg_quality.setRange(50, 100)
+        self.spin_jpeg_quality.setValue(pdfwriter.DEFAULT_JPEG_QUALITY)
+        self.spin_jpeg_quality.setPrefix("质量 ")
+        self.spin_jpeg_quality.setEnabled(False)
+        self.combo_compression.currentIndexChanged.connect(lambda index: self.spin_jpeg_quality.setEnabled(index == 1))
+        compression_layout.addWidget(self.spin_jpeg_quality)
+        layout_vbox.addLayout(compression_layout)
+        # JPEG is offered only while the raster page fits its size limit
+        for signal in (self.combo_paper_size.currentIndexChanged, self.combo_orientation.currentIndexChanged,
+                       self.spin_roll_width.valueChanged, self.combo_export_dpi.currentIndexChanged,
+                       self.combo_export_mode.currentIndexChanged):
+            signal.connect(self.update_compression_options)
+
+        # Color management: frames are converted from each photo's embedded profile
+        layout_vbox.addWidget(QLabel("输出色彩配置:"))
+        profile_layout = QHBoxLayout()
+        self.combo_profile = QComboBox()
+        self.combo_profile.addItem("sRGB", processor.DEFAULT_OUTPUT_PROFILE)
+        self.combo_profile.currentIndexChanged.connect(self.on_color_target_changed)
+        profile_layout.addWidget(self.combo_profile, 1)
+        self.btn_profile = QPushButton("载入 ICC...")
+        self.btn_profile.clicked.connect(self.load_output_profile)
+        profile_layout.addWidget(self.btn_profile)
+        layout_vbox.addLayout(profile_layout)
+
+        self.combo_intent = QComboBox()
+        self.combo_intent.addItems(["感知", "相对比色", "饱和度", "绝对比色"]) # processor.RENDERING_INTENTS order
+        self.combo_intent.currentIndexChanged.connect(self.on_color_target_changed)
+        layout_vbox.addWidget(self.combo_intent)
+
+        self.check_soft_proof = QCheckBox("预览软打样 (模拟输出配置文件)")
+        self.check_soft_proof.toggled.connect(self.on_color_target_changed)
+        layout_vbox.addWidget(self.check_soft_proof)
         
         left_layout.addWidget(layout_group)
 
@@ -164,6 +494,11 @@ class MainWindow(QMainWindow):
         header_layout = QHBoxLayout()
         header_layout.addWidget(QLabel("预览 (点击照片可选择):"))
         header_layout.addStretch()
+
+        self.combo_zoom = QComboBox()
+        self.combo_zoom.addItems(["适应窗口"] + [f"{int(z * 100)}%" for z in ZOOM_LEVELS[1:]])
+        self.combo_zoom.currentIndexChanged.connect(self.on_zoom_changed)
+        header_layout.addWidget(self.combo_zoom)
         
         self.btn_prev = QPushButton("<")
         self.btn_prev.setFixedWidth(30)
@@ -181,11 +516,11 @@ class MainWindow(QMainWindow):
         right_layout.addLayout(header_layout)
 
         self.scroll_area = QScrollArea()
-        self.preview_label = ClickableLabel("添加照片后显示预览")
-        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label = PreviewCanvas("添加照片后显示预览")
         self.preview_label.clicked.connect(self.on_preview_clicked)
         self.scroll_area.setWidget(self.preview_label)
         self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.viewport().installEventFilter(self)
         right_layout.addWidget(self.scroll_area)
 
         main_layout.addWidget(right_panel)
@@ -197,25 +532,175 @@ class MainWindow(QMainWindow):
             self, "选择照片", "", "Images (*.png *.jpg *.jpeg *.bmp *.tiff)"
         )
         if files:
+            start = len(self.images_data)
             for f in files:
                 self.images_data.append({
                     "path": f,
                     "crop": "short",
                     "color": "color",
                     "type": "positive",
-                    "rotation": 0
+                    "rotation": 0,
+                    "contrast": 0
                 })
                 self.list_widget.addItem(os.path.basename(f))
+            # The preview starts once the shown page's frames are prefetched
+            if not self.probe_photos(range(start, len(self.images_data))):
+                self.update_preview()
+
+    def open_project(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "打开项目", "", f"Film Layout Project (*{project.PROJECT_EXT})"
+        )
+        if not path:
+            return
+        try:
+            specs, settings, proxies = project.load_project(path)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"打开项目失败: {e}")
+            return
+
+        self.clear_photos()
+        self.combo_intent.setCurrentIndex(list(processor.RENDERING_INTENTS).index(settings["intent"]))
+        if settings["output_profile"] == processor.DEFAULT_OUTPUT_PROFILE or not self.select_output_profile(settings["output_profile"]):
+            self.combo_profile.setCurrentIndex(0)
+        # Only the proxies were decoded; sources are read when a frame is edited or exported.
+        # They are rendered for the default sRGB target, so any other preview
+        # target (a soft proof or another intent) renders from the sources instead.
+        if self.preview_color_target() == processor.DEFAULT_COLOR_TARGET:
+            self.proxies.update(proxies)
+        unprobed = []
+        for row, spec in enumerate(specs):
+            self.images_data.append({
+                "path": spec[0],
+                "crop": spec[1],
+                "color": spec[2],
+                "type": spec[3],
+                "rotation": spec[4],
+                "contrast": spec[5]
+            })
+            self.list_widget.addItem(os.path.basename(spec[0]))
+            # Icons come from the proxies too, so opening a project reads no source
+            proxy = proxies.get(spec)
+            if proxy is None:
+                unprobed.append(row)
+            else:
+                icon = proxy.copy()
+                icon.thumbnail((ICON_SIZE, ICON_SIZE), Image.Resampling.BILINEAR)
+                self.list_widget.item(row).setIcon(QIcon(QPixmap.fromImage(pil_to_qimage(icon))))
+        # Only frames saved without a proxy are probed, for their icons
+        if unprobed:
+            self.probe_photos(unprobed, prefetch=False)
+
+        roll_width = processor.roll_width_mm(settings["paper_size"])
+        if roll_width is not None:
+            self.spin_roll_width.setValue(round(roll_width))
+            self.combo_paper_size.setCurrentIndex(self.combo_paper_size.count() - 1)
+        else:
+            self.combo_paper_size.setCurrentText(settings["paper_size"])
+        self.combo_orientation.setCurrentIndex(["Auto", "Portrait", "Landscape"].index(settings["orientation"]))
+        self.spin_margin.setValue(settings["margin_mm"])
+        self.spin_gap.setValue(settings["gap_mm"])
+        self.combo_export_dpi.setCurrentText(str(settings["dpi"]))
+        self.combo_export_mode.setCurrentIndex(1 if settings["mode"] == "vector" else 0)
+        self.combo_compression.setCurrentIndex(pdfwriter.COMPRESSIONS.index(settings["compression"]))
+        self.spin_jpeg_quality.setValue(settings["jpeg_quality"])
+        self.update_compression_options()
+        self.update_preview()
+
+    def save_project(self):
+        if not self.images_data:
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "保存项目", "", f"Film Layout Project (*{project.PROJECT_EXT})"
+        )
+        if not path:
+            return
+        if not path.lower().endswith(project.PROJECT_EXT):
+            path += project.PROJECT_EXT
+
+        settings = self.layout_settings()
+        settings["dpi"] = int(self.combo_export_dpi.currentText())
+        settings["mode"] = "vector" if self.combo_export_mode.currentIndex() == 1 else "raster"
+        settings.update(self.compression_settings())
+        settings.update(self.color_settings())
+        try:
+            # Frames that still have a proxy reuse it; the rest are rendered once
+            project.save_project(path, self.frame_specs(), settings, self.proxies)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"保存项目失败: {e}")
+
+    def probe_photos(self, rows, prefetch=True):
+        """
+        Queues the photos in rows for probing on the probe pool.
+        returns: number of photos whose preview frames are prefetched
+        """
+        prefetch_rows = range(0)
+        if prefetch:
+            dpi = self.target_preview_dpi()
+            plan = processor.plan_layout(len(self.images_data), dpi=dpi, layout_dpi=int(self.combo_export_dpi.currentText()),
+                                         **self.layout_settings())
+            prefetch_rows = range(*plan.page_range(self.current_page))
+            target = (dpi, self.preview_color_target())
+        prefetched = 0
+        for row in rows:
+            task = ProbeTask(self.probe_generation, self.images_data[row], target if row in prefetch_rows else None)
+            task.signals.probed.connect(self.on_photo_probed)
+            self.probe_pool.start(task)
+            self.probe_total += 1
+            prefetched += task.prefetch is not None
+        self.prefetch_pending += prefetched
+        self.probe_progress.setRange(0, self.probe_total)
+        self.probe_progress.setValue(self.probe_done)
+        self.probe_progress.show()
+        return prefetched
+
+    def on_photo_probed(self, generation, data, info, prefetched):
+        if generation != self.probe_generation:
+            return # The list was cleared meanwhile
+        self.probe_done += 1
+        self.probe_progress.setValue(self.probe_done)
+        finished = self.probe_done == self.probe_total
+        if finished:
+            self.probe_total = self.probe_done = 0
+            self.probe_progress.hide()
+        if prefetched:
+            self.prefetch_pending -= 1
+
+        # The photo may have been moved or removed while it was probed
+        row = next((i for i, d in enumerate(self.images_data) if d is data), None)
+        if row is not None:
+            item = self.list_widget.item(row)
+            if "error" in info:
+                item.setToolTip(f"无法读取此照片: {info['error']}")
+            else:
+                item.setIcon(QIcon(QPixmap.fromImage(info["icon"])))
+                w, h = info["size"]
+                tip = f"{w} × {h} {info['mode']}"
+                if info["icc"]:
+                    tip += "，内嵌 ICC 配置文件"
+                # Only shown: frames use the pixels as stored, turned by the rotation setting
+                if info["orientation"] != 1:
+                    tip += f"，EXIF 方向 {info['orientation']} (未自动转正)"
+                item.setToolTip(tip)
+
+        if (prefetched and self.prefetch_pending == 0) or finished:
             self.update_preview()
 
     def clear_photos(self):
+        self.probe_generation += 1
+        self.probe_pool.clear()
+        self.probe_total = self.probe_done = self.prefetch_pending = 0
+        self.probe_progress.hide()
         self.images_data = []
+        self.proxies.clear()
         self.list_widget.clear()
-        self.preview_label.setText("添加照片后显示预览")
-        self.preview_label.setPixmap(QPixmap())
+        self.preview_label.clear("添加照片后显示预览")
+        self.preview_image = None
+        self.preview_dpi = 0
         self.group_settings.setEnabled(False)
-        self.preview_pages = []
-        self.layout_info = []
+        self.cancel_preview_render()
+        self.layout_plan = None
+        self.page_count = 0
         self.current_page = 0
         self.lbl_page.setText("第 0 / 0 页")
 
@@ -269,9 +754,10 @@ class MainWindow(QMainWindow):
         
         self._updating_ui = True
         self.combo_crop.setCurrentIndex(0 if data["crop"] == "short" else 1)
-        self.combo_color.setCurrentIndex(0 if data["color"] == "color" else 1)
-        self.combo_type.setCurrentIndex(0 if data["type"] == "positive" else 1)
+        self.combo_color.setCurrentIndex(processor.COLOR_MODES.index(data["color"]))
+        self.combo_type.setCurrentIndex(processor.FILM_TYPES.index(data["type"]))
         self.combo_rotate.setCurrentIndex(data["rotation"] // 90)
+        self.spin_contrast.setValue(data["contrast"])
         self._updating_ui = False
 
     def update_image_settings(self):
@@ -283,20 +769,21 @@ class MainWindow(QMainWindow):
             return
         
         self.images_data[row]["crop"] = "short" if self.combo_crop.currentIndex() == 0 else "long"
-        self.images_data[row]["color"] = "color" if self.combo_color.currentIndex() == 0 else "bw"
-        self.images_data[row]["type"] = "positive" if self.combo_type.currentIndex() == 0 else "negative"
+        self.images_data[row]["color"] = processor.COLOR_MODES[self.combo_color.currentIndex()]
+        self.images_data[row]["type"] = processor.FILM_TYPES[self.combo_type.currentIndex()]
         self.images_data[row]["rotation"] = self.combo_rotate.currentIndex() * 90
+        self.images_data[row]["contrast"] = self.spin_contrast.value()
         
         self.update_preview()
 
     def apply_color_to_all(self):
-        color = "color" if self.combo_color.currentIndex() == 0 else "bw"
+        color = processor.COLOR_MODES[self.combo_color.currentIndex()]
         for data in self.images_data:
             data["color"] = color
         self.update_preview()
 
     def apply_type_to_all(self):
-        film_type = "positive" if self.combo_type.currentIndex() == 0 else "negative"
+        film_type = processor.FILM_TYPES[self.combo_type.currentIndex()]
         for data in self.images_data:
             data["type"] = film_type
         self.update_preview()
@@ -313,87 +800,136 @@ class MainWindow(QMainWindow):
             data["rotation"] = rotation
         self.update_preview()
 
+    def apply_contrast_to_all(self):
+        contrast = self.spin_contrast.value()
+        for data in self.images_data:
+            data["contrast"] = contrast
+        self.update_preview()
+
     def prev_page(self):
         if self.current_page > 0:
             self.current_page -= 1
-            self.update_preview()
+            self.schedule_preview(0)
 
     def next_page(self):
-        if self.current_page < len(self.preview_pages) - 1:
+        if self.current_page < self.page_count - 1:
             self.current_page += 1
-            self.update_preview()
+            self.schedule_preview(0)
+
+    def frame_specs(self):
+        # Hashable per-frame settings; the layout engine diffs them to find dirty pages
+        return [
+            (data["path"], data["crop"], data["color"], data["type"], data["rotation"], data["contrast"])
+            for data in self.images_data
+        ]
 
     def update_preview(self):
+        self.schedule_preview()
+
+    def schedule_preview(self, delay=None):
+        """
+        Restarts the debounce timer; the render starts once changes stop arriving.
+        """
         if not self.images_data:
             return
+        # Anything still rendering is stale from now on
+        self.cancel_preview_render()
+        if delay is not None:
+            self.preview_timer.start(delay)
+        else:
+            self.preview_timer.start()
 
-        # Create film frames
-        frames = []
-        for data in self.images_data:
-            # We don't draw holes here because layout_on_paper will draw them continuously
-            frame = processor.create_film_frame(
-                data["path"], 
-                crop_mode=data["crop"],
-                color_mode=data["color"],
-                film_type=data["type"],
-                rotation=data["rotation"],
-                draw_holes=False
-            )
-            frames.append(frame)
-
-        # Layout on paper
-        paper_size = self.combo_paper_size.currentText()
+    def cancel_preview_render(self):
+        self.preview_timer.stop()
+        self.preview_generation += 1
+        if self.preview_task is not None:
+            self.preview_task.cancel()
+            self.preview_task = None
+
+    def is_roll(self):
+        return self.combo_paper_size.currentIndex() == self.combo_paper_size.count() - 1
+
+    def on_paper_size_changed(self):
+        self.spin_roll_width.setEnabled(self.is_roll())
+        self.combo_orientation.setEnabled(not self.is_roll())
+        self.update_preview()
+
+    def layout_settings(self):
         orientation_idx = self.combo_orientation.currentIndex()
-        orientation = ["Auto", "Portrait", "Landscape"][orientation_idx]
-        margin = self.spin_margin.value()
-        gap = self.spin_gap.value()
-        self.preview_pages, self.layout_info = processor.layout_on_paper(
-            frames, 
-            paper_size=paper_size, 
-            orientation=orientation,
-            margin_mm=margin, 
-            gap_mm=gap
+        if self.is_roll():
+            paper_size = processor.roll_paper(self.spin_roll_width.value())
+        else:
+            paper_size = self.combo_paper_size.currentText()
+        return dict(
+            paper_size=paper_size,
+            orientation=["Auto", "Portrait", "Landscape"][orientation_idx],
+            margin_mm=self.spin_margin.value(),
+            gap_mm=self.spin_gap.value()
         )
 
-        if not self.preview_pages:
+    def target_preview_dpi(self):
+        """
+        DPI at which the page fills the viewport at the current zoom, in device pixels.
+        Long rolls get less, see processor.roll_preview_dpi.
+        """
+        viewport = self.scroll_area.viewport()
+        ratio = self.devicePixelRatioF()
+        settings = self.layout_settings()
+        layout_dpi = int(self.combo_export_dpi.currentText())
+        dpi = processor.fit_dpi(
+            max(1, viewport.width() - 10) * ratio,
+            max(1, viewport.height() - 10) * ratio,
+            layout_dpi=layout_dpi,
+            **settings
+        ) * self.zoom
+        dpi = max(MIN_PREVIEW_DPI, min(MAX_PREVIEW_DPI, math.ceil(dpi)))
+        return processor.roll_preview_dpi(dpi, len(self.images_data), layout_dpi=layout_dpi,
+                                          max_side=MAX_PREVIEW_SIDE, **settings)
+
+    def start_preview_render(self):
+        if not self.images_data:
+            return
+
+        # Layout on paper; only pages whose frames or settings changed are redrawn
+        settings = self.layout_settings()
+        settings["dpi"] = self.target_preview_dpi()
+        # Laid out as exported; only the pixel size follows the viewport
+        settings["layout_dpi"] = int(self.combo_export_dpi.currentText())
+        settings["color_target"] = self.preview_color_target()
+        task = PreviewTask(self.preview_generation, self.layout_engine, self.frame_specs(), settings, self.current_page)
+        task.signals.finished.connect(self.on_preview_rendered)
+        self.preview_task = task
+        self.preview_pool.start(task)
+
+    def on_preview_rendered(self, generation, result):
+        if generation != self.preview_generation:
+            return # Settings changed again while this page was rendering
+        self.preview_task = None
+
+        self.layout_plan = result["plan"]
+        self.page_count = page_count = result["page_count"]
+
+        if page_count == 0:
             self.lbl_page.setText("第 0 / 0 页")
             return
 
-        # Ensure current_page is valid
-        if self.current_page >= len(self.preview_pages):
-            self.current_page = len(self.preview_pages) - 1
-        if self.current_page < 0:
-            self.current_page = 0
+        self.current_page = result["page_index"]
+        if result["metrics"].stages:
+            self.statusBar().showMessage(f"预览渲染 ({result['dpi']} DPI) {result['metrics'].breakdown(4)}")
             
-        self.lbl_page.setText(f"第 {self.current_page + 1} / {len(self.preview_pages)} 页")
+        self.lbl_page.setText(f"第 {self.current_page + 1} / {page_count} 页")
         self.btn_prev.setEnabled(self.current_page > 0)
-        self.btn_next.setEnabled(self.current_page < len(self.preview_pages) - 1)
+        self.btn_next.setEnabled(self.current_page < page_count - 1)
 
-        # Show current page
-        pil_img = self.preview_pages[self.current_page]
-        qimg = self.pil_to_qimage(pil_img)
-        pixmap = QPixmap.fromImage(qimg)
-        
-        # Scale to container
-        view_w = self.scroll_area.viewport().width() - 10
-        view_h = self.scroll_area.viewport().height() - 10
-        
-        if view_w > 0 and view_h > 0:
-            scaled_pixmap = pixmap.scaled(
-                view_w, 
-                view_h, 
-                Qt.KeepAspectRatio, 
-                Qt.SmoothTransformation
-            )
-            self.preview_label.setPixmap(scaled_pixmap)
-        else:
-            self.preview_label.setPixmap(pixmap.scaled(800, 800, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        # Show current page; it was rendered at the size the viewport needs
+        self.preview_image = result["page"]
+        self.preview_dpi = result["dpi"]
+        self.show_preview_image()
 
         # Update list widget items to show which ones are NOT on the current page
-        current_page_indices = {info["index"] for info in self.layout_info[self.current_page]}
         for i in range(self.list_widget.count()):
             item = self.list_widget.item(i)
-            if i in current_page_indices:
+            if self.layout_plan.page_of(i) == self.current_page:
                 item.setForeground(Qt.black)
                 # Maybe add a small indicator?
                 text = os.path.basename(self.images_data[i]["path"])
@@ -403,34 +939,63 @@ class MainWindow(QMainWindow):
                 text = os.path.basename(self.images_data[i]["path"]) + " (不在当前页)"
                 item.setText(text)
 
-    def on_preview_clicked(self, pos):
-        if not self.layout_info or not self.preview_pages:
+    def show_preview_image(self):
+        """
+        Fits the rendered page to the viewport at the current zoom. The page is
+        drawn unscaled when its size is within a rounding pixel of the target.
+        """
+        if self.preview_image is None:
             return
-        
-        # Use the current page info
-        page_info = self.layout_info[self.current_page]
-        pixmap = self.preview_label.pixmap()
-        if not pixmap or pixmap.isNull():
+        page_w, page_h = self.layout_plan.page_size
+        view_w = self.scroll_area.viewport().width() - 10
+        view_h = self.scroll_area.viewport().height() - 10
+        if view_w <= 0 or view_h <= 0:
+            view_w = view_h = 800
+        ratio = self.devicePixelRatioF()
+        if self.layout_plan.grid["roll"]:
+            # Rolls fill the width and scroll along their length
+            scale = view_w / page_w * self.zoom * ratio
+        else:
+            scale = min(view_w / page_w, view_h / page_h) * self.zoom * ratio
+        image = self.preview_image
+        if abs(image.width() - page_w * scale) <= 2 and abs(image.height() - page_h * scale) <= 2:
+            size = QSize(image.width(), image.height())
+        else:
+            size = QSize(max(1, round(page_w * scale)), max(1, round(page_h * scale)))
+        self.preview_label.set_image(image, size / ratio)
+
+    def on_zoom_changed(self, index):
+        self.zoom = ZOOM_LEVELS[index]
+        self.show_preview_image()
+        # Zooming out reuses the sharper page; zooming in needs more pixels
+        if self.preview_image is not None and self.target_preview_dpi() > self.preview_dpi:
+            self.schedule_preview(0)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Resize and obj is self.scroll_area.viewport():
+            self.show_preview_image()
+            # Small changes just rescale the page; re-render once it would get visibly soft
+            if self.preview_image is not None and self.target_preview_dpi() > self.preview_dpi * 1.25:
+                self.schedule_preview()
+        return super().eventFilter(obj, event)
+
+    def on_preview_clicked(self, pos):
+        if self.layout_plan is None or self.page_count == 0 or self.preview_label.image is None:
             return
-            
-        lbl_w = self.preview_label.width()
-        lbl_h = self.preview_label.height()
-        pix_w = pixmap.width()
-        pix_h = pixmap.height()
-        
-        # Calculate offset due to alignment
-        offset_x = (lbl_w - pix_w) / 2
-        offset_y = (lbl_h - pix_h) / 2
+
+        # Where the page is drawn inside the canvas
+        rect = self.preview_label.image_rect()
+        pix_w = rect.width()
+        pix_h = rect.height()
         
-        rel_x = pos.x() - offset_x
-        rel_y = pos.y() - offset_y
+        rel_x = pos.x() - rect.x()
+        rel_y = pos.y() - rect.y()
         
         if rel_x < 0 or rel_x >= pix_w or rel_y < 0 or rel_y >= pix_h:
             return
             
         # Map to original image coordinates
-        orig_w = self.preview_pages[0].width
-        orig_h = self.preview_pages[0].height
+        orig_w, orig_h = self.layout_plan.page_size
         
         scale_x = orig_w / pix_w
         scale_y = orig_h / pix_h
@@ -439,19 +1004,74 @@ class MainWindow(QMainWindow):
         orig_y = rel_y * scale_y
         
         # Check which frame was clicked
-        for item in page_info:
-            x1, y1, x2, y2 = item["rect"]
-            if x1 <= orig_x <= x2 and y1 <= orig_y <= y2:
-                self.list_widget.setCurrentRow(item["index"])
-                break
-
-    def pil_to_qimage(self, pil_img):
-        if pil_img.mode != "RGB":
-            pil_img = pil_img.convert("RGB")
-        
-        data = pil_img.tobytes("raw", "RGB")
-        qimage = QImage(data, pil_img.width, pil_img.height, QImage.Format_RGB888)
-        return qimage
+        index = self.layout_plan.frame_at(self.current_page, orig_x, orig_y)
+        if index is not None:
+            self.list_widget.setCurrentRow(index)
+
+    def update_compression_options(self):
+        """
+        Greys out JPEG when a raster page would be wider than a JPEG image can
+        be; long rolls are cut into several images, but their width is not.
+        """
+        export_dpi = int(self.combo_export_dpi.currentText())
+        page_w = processor.page_grid(dpi=export_dpi, **self.layout_settings())["page_w"]
+        usable = self.combo_export_mode.currentIndex() == 1 or page_w <= pdfwriter.JPEG_MAX_SIDE
+        item = self.combo_compression.model().item(1)
+        item.setEnabled(usable)
+        item.setToolTip("" if usable else f"页面宽 {page_w} 像素, 超出 JPEG 上限 {pdfwriter.JPEG_MAX_SIDE}")
+        if not usable and self.combo_compression.currentIndex() == 1:
+            self.combo_compression.setCurrentIndex(0)
+
+    def compression_settings(self):
+        return {
+            "compression": pdfwriter.COMPRESSIONS[self.combo_compression.currentIndex()],
+            "jpeg_quality": self.spin_jpeg_quality.value(),
+        }
+
+    def color_settings(self):
+        return {
+            "output_profile": self.combo_profile.currentData(),
+            "intent": list(processor.RENDERING_INTENTS)[self.combo_intent.currentIndex()],
+        }
+
+    def color_target(self):
+        return processor.color_target(**self.color_settings())
+
+    def preview_color_target(self):
+        # The preview shows sRGB, or a soft proof of the output profile
+        return processor.preview_color_target(self.color_target(), self.check_soft_proof.isChecked())
+
+    def select_output_profile(self, path):
+        """
+        Selects an output profile file, adding it to the list first.
+        returns: False if the profile cannot be used
+        """
+        index = self.combo_profile.findData(path)
+        if index < 0:
+            try:
+                processor.color_target(path)
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"无法使用该配置文件: {e}")
+                return False
+            self.combo_profile.addItem(os.path.basename(path), path)
+            index = self.combo_profile.count() - 1
+        self.combo_profile.setCurrentIndex(index)
+        return True
+
+    def load_output_profile(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "选择输出 ICC 配置文件", "", "ICC Profiles (*.icc *.icm)"
+        )
+        if path:
+            self.select_output_profile(path)
+
+    def on_color_target_changed(self):
+        # Project proxies were rendered for the default sRGB target; other
+        # preview targets must render from the sources
+        if self.proxies and self.preview_color_target() != processor.DEFAULT_COLOR_TARGET:
+            self.proxies.clear()
+        # The next preview task hands the new target to the layout engine
+        self.update_preview()
 
     def export_pdf(self):
         if not self.images_data:
@@ -462,52 +1082,78 @@ class MainWindow(QMainWindow):
         save_path, _ = QFileDialog.getSaveFileName(
             self, "导出 PDF", "", "PDF Files (*.pdf)"
         )
-        if save_path:
-            if not save_path.lower().endswith(".pdf"):
-                save_path += ".pdf"
-            
-            try:
-                # Re-generate frames and layout at the chosen resolution
-                high_res_frames = []
-                for data in self.images_data:
-                    frame = processor.create_film_frame(
-                        data["path"], 
-                        crop_mode=data["crop"],
-                        color_mode=data["color"],
-                        film_type=data["type"],
-                        rotation=data["rotation"],
-                        draw_holes=False,
-                        dpi=export_dpi
-                    )
-                    high_res_frames.append(frame)
-                
-                paper_size = self.combo_paper_size.currentText()
-                orientation_idx = self.combo_orientation.currentIndex()
-                orientation = ["Auto", "Portrait", "Landscape"][orientation_idx]
-                margin = self.spin_margin.value()
-                gap = self.spin_gap.value()
-                high_res_pages, _ = processor.layout_on_paper(
-                    high_res_frames, 
-                    paper_size=paper_size, 
-                    orientation=orientation,
-                    margin_mm=margin, 
-                    gap_mm=gap, 
-                    dpi=export_dpi
-                )
-                
-                if not high_res_pages:
-                    return
+        if not save_path:
+            return
+        if not save_path.lower().endswith(".pdf"):
+            save_path += ".pdf"
 
-                pages_to_save = [p.convert("RGB") for p in high_res_pages]
-                pages_to_save[0].save(
-                    save_path, 
-                    save_all=True, 
-                    append_images=pages_to_save[1:],
-                    resolution=export_dpi
-                )
-                QMessageBox.information(self, "完成", f"PDF 已成功导出 (分辨率: {export_dpi} DPI)。")
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"导出 PDF 失败: {e}")
+        try:
+            specs = self.frame_specs()
+            layout = self.layout_settings()
+            vector = self.combo_export_mode.currentIndex() == 1
+            task = ExportTask(save_path, specs, layout, export_dpi, vector, self.color_target(), self.compression_settings())
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出 PDF 失败: {e}")
+            return
+        page_total = processor.plan_layout(len(specs), dpi=export_dpi, **layout).page_count
+
+        dialog = QProgressDialog("正在导出 PDF...", "取消", 0, len(specs), self)
+        dialog.setWindowTitle("导出 PDF")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.canceled.connect(task.cancel)
+        task.signals.progress.connect(
+            lambda frames, pages: self.on_export_progress(frames, len(specs), pages, page_total)
+        )
+        task.signals.finished.connect(
+            lambda metrics, pages: self.on_export_finished(metrics, pages, export_dpi, vector)
+        )
+        task.signals.failed.connect(self.on_export_failed)
+        task.signals.cancelled.connect(self.on_export_cancelled)
+        self.export_dialog = dialog
+        self.export_task = task
+        self.btn_export.setEnabled(False)
+        self.export_pool.start(task)
+        dialog.show()
+
+    def on_export_progress(self, frames, frame_total, pages, page_total):
+        if self.export_dialog is None or self.export_dialog.wasCanceled():
+            return
+        self.export_dialog.setValue(frames)
+        self.export_dialog.setLabelText(f"已渲染 {frames} / {frame_total} 帧，已写入 {pages} / {page_total} 页")
+
+    def closeEvent(self, event):
+        # A running export would keep writing after the window is gone
+        if self.export_task is not None:
+            self.export_task.cancel()
+            self.export_pool.waitForDone()
+        super().closeEvent(event)
+
+    def close_export_dialog(self):
+        if self.export_dialog is not None:
+            self.export_dialog.close()
+            self.export_dialog = None
+        self.export_task = None
+        self.btn_export.setEnabled(True)
+
+    def on_export_finished(self, metrics, pages, export_dpi, vector):
+        self.close_export_dialog()
+        if not pages:
+            return
+        if vector:
+            QMessageBox.information(self, "完成", f"矢量 PDF 已成功导出 (照片最高 {export_dpi} DPI)。\n耗时 {metrics.breakdown(4)}")
+        else:
+            QMessageBox.information(self, "完成", f"PDF 已成功导出 (分辨率: {export_dpi} DPI)。\n耗时 {metrics.breakdown(4)}")
+
+    def on_export_failed(self, message):
+        self.close_export_dialog()
+        QMessageBox.critical(self, "错误", f"导出 PDF 失败: {message}")
+
+    def on_export_cancelled(self):
+        self.close_export_dialog()
+        self.statusBar().showMessage("已取消导出")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
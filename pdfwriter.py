@@ -0,0 +1,643 @@
+import io
+import math
+import os
+import re
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import processor
+from processor import DEFAULT_DPI
+
+# Raw bytes handed to one encoder job when a page is streamed
+CHUNK_BYTES = 16 * 1024 * 1024
+
+# Image compression: "flate" is lossless, "jpeg" (DCT) is far smaller for photos
+COMPRESSIONS = ("flate", "jpeg")
+DEFAULT_JPEG_QUALITY = 90
+
+# JPEG pieces are cut at whole 4:2:0 MCU rows so their scans join into one image
+JPEG_MCU_ROWS = 16
+
+# Largest JPEG image side; taller pages are stored as a stack of images
+JPEG_MAX_SIDE = 65535
+
+# Largest page side most readers accept (200 inches); longer pages, such as
+# roll paper, are scaled down with a larger /UserUnit
+MAX_PAGE_PT = 14400
+
+# Film rows rendered ahead of compositing when a layout is exported
+ROWS_AHEAD = 2
+
+# Bezier control point distance for a quarter circle
+KAPPA = 0.5523
+
+class PdfWriter:
+    """
+    Streaming PDF writer.
+    Every page is compressed and written to the output as soon as it is
+    added, so only the page being written has to be in memory. Raster pages
+    can also be fed as horizontal bands with begin_page/write_band/end_page,
+    optionally stored as several images stacked on the page; add_vector_page draws the film base and holes as paths instead.
+    Images are cut into pieces that are encoded concurrently on a thread
+    pool (zlib and Pillow's JPEG encoder release the GIL) and joined back
+    into one stream per image, written strictly in order.
+    compression: "flate" or "jpeg", see COMPRESSIONS
+    workers: encoder threads (default: one per CPU, 1 encodes inline)
+    icc_profile: ICC data of the RGB profile the images were converted to,
+    embedded once and referenced by every image (default: plain DeviceRGB)
+    A path is written to a temporary file next to it and only renamed once
+    the document is complete, so a failed or cancelled export leaves no
+    half-written PDF behind.
+    """
+    def __init__(self, fp, dpi=DEFAULT_DPI, compression="flate", jpeg_quality=DEFAULT_JPEG_QUALITY, workers=None,
+                 icc_profile=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"unknown compression: {compression}")
+        self._path = None
+        if isinstance(fp, (str, bytes)) or hasattr(fp, "__fspath__"):
+            self._path = os.fsdecode(fp)
+            self._file = open(self._path + ".tmp", "wb")
+            self._owns_file = True
+        else:
+            self._file = fp
+            self._owns_file = False
+        self.dpi = dpi
+        self.compression = compression
+        self.jpeg_quality = jpeg_quality
+        self.page_count = 0
+        self._pos = 0
+        self._offsets = {}
+        self._next_id = 3 # 1: catalog, 2: page tree (written on close)
+        self._page_ids = []
+        self._images = {} # key -> image XObject id, so repeated photos are embedded once
+        self._page = None
+        self._closed = False
+        self._version = b"1.4"
+        workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="pdf-encode") if workers > 1 else None
+        # Bounds the encoded-but-unwritten pieces, and so the memory they hold
+        self._max_pending = 2 * workers
+        self._pending = deque() # (future or None, write) in output order
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._color_space = b"/DeviceRGB"
+        if icc_profile:
+            profile_id = self._new_id()
+            self._write_stream_obj(profile_id, b"/N 3 /Alternate /DeviceRGB /Filter /FlateDecode", zlib.compress(icc_profile))
+            self._color_space = b"[/ICCBased %d 0 R]" % profile_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        if self._owns_file:
+            self._file.close()
+            os.remove(self._path + ".tmp")
+
+    def _write(self, data):
+        self._file.write(data)
+        self._pos += len(data)
+
+    def _emit(self, write, job=None):
+        """
+        Queues write(result) behind every earlier write. job, if given, runs
+        on the encoder pool and its result is passed to write; without a pool
+        both run right away.
+        """
+        if self._pool is None:
+            write(job() if job is not None else None)
+            return
+        future = None
+        if job is not None:
+            metrics = processor.current_metrics()
+            if metrics is not None:
+                job, write = _collected(metrics, job, write)
+            future = self._pool.submit(job)
+        self._pending.append((future, write))
+        self._drain(self._max_pending)
+
+    def _drain(self, keep=0):
+        # Writes finished work in order, waiting while more than `keep` items are queued
+        while self._pending:
+            future, write = self._pending[0]
+            if len(self._pending) <= keep and future is not None and not future.done():
+                break
+            self._pending.popleft()
+            write(future.result() if future is not None else None)
+
+    def _new_id(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _begin_obj(self, obj_id):
+        self._offsets[obj_id] = self._pos
+        self._write(b"%d 0 obj\n" % obj_id)
+
+    def _write_obj(self, obj_id, body):
+        self._begin_obj(obj_id)
+        self._write(body + b"\nendobj\n")
+
+    def _write_stream_obj(self, obj_id, dictionary, data):
+        self._begin_obj(obj_id)
+        self._write(b"<< %s /Length %d >>\nstream\n" % (dictionary, len(data)))
+        self._write(data)
+        self._write(b"\nendstream\nendobj\n")
+
+    def _begin_image(self, width, height):
+        if self.compression == "jpeg" and max(width, height) > JPEG_MAX_SIDE:
+            raise ValueError(f"JPEG images are limited to {JPEG_MAX_SIDE} pixels per side")
+        state = {
+            "size": (width, height),
+            "image_id": self._new_id(),
+            "length_id": self._new_id(),
+            "rows": 0,
+            "carry": None, # JPEG rows short of a whole MCU row, held for the next band
+            "start": 0,
+            "adler": 1,
+        }
+        filter_name = b"/DCTDecode" if self.compression == "jpeg" else b"/FlateDecode"
+
+        def write(_):
+            self._begin_obj(state["image_id"])
+            self._write(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+                b"/ColorSpace %s /BitsPerComponent 8 /Filter %s "
+                b"/Length %d 0 R >>\nstream\n" % (width, height, self._color_space, filter_name, state["length_id"])
+            )
+            state["start"] = self._pos
+            if self.compression == "flate":
+                self._write(b"\x78\x9c") # zlib header; the pieces are raw deflate
+        self._emit(write)
+        return state
+
+    def _write_rows(self, state, image):
+        y = state["rows"]
+        state["rows"] += image.height
+        if self.compression == "jpeg":
+            height = state["size"][1]
+            self._emit(self._write, lambda: _encode_jpeg(image, y, height, self.jpeg_quality))
+            return
+
+        def write(result):
+            data, adler, length = result
+            self._write(data)
+            state["adler"] = _adler32_combine(state["adler"], adler, length)
+        self._emit(write, lambda: _deflate(image))
+
+    def _end_image(self, state):
+        width, height = state["size"]
+        if state["carry"] is not None:
+            carry, state["carry"] = state["carry"], None
+            self._write_rows(state, carry)
+        if state["rows"] != height:
+            raise ValueError(f"image has {state['rows']} rows, expected {height}")
+
+        def write(_):
+            if self.compression == "jpeg":
+                self._write(b"\xff\xd9")
+            else:
+                # Empty final block, then the checksum of all pieces
+                self._write(b"\x03\x00" + state["adler"].to_bytes(4, "big"))
+            length = self._pos - state["start"]
+            self._write(b"\nendstream\nendobj\n")
+            self._write_obj(state["length_id"], b"%d" % length)
+        self._emit(write)
+        return state["image_id"]
+
+    def _write_chunked(self, state, image):
+        # Converting a large image to bytes at once would double its memory,
+        # and smaller pieces keep every encoder thread busy
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.width != state["size"][0]:
+            raise ValueError("band width does not match the image width")
+        rows = max(1, CHUNK_BYTES // (image.width * 3))
+        y = 0
+        if self.compression == "jpeg":
+            rows = max(JPEG_MCU_ROWS, rows - rows % JPEG_MCU_ROWS)
+            carry = state["carry"]
+            if carry is not None:
+                # Top up the held rows to one whole MCU row
+                y = min(JPEG_MCU_ROWS - carry.height, image.height)
+                joined = Image.new("RGB", (image.width, carry.height + y))
+                joined.paste(carry, (0, 0))
+                joined.paste(image.crop((0, 0, image.width, y)), (0, carry.height))
+                state["carry"] = None
+                if joined.height < JPEG_MCU_ROWS:
+                    state["carry"] = joined
+                    return
+                self._write_rows(state, joined)
+        while y < image.height:
+            y1 = min(y + rows, image.height)
+            if self.compression == "jpeg" and y1 - y < rows:
+                # Whole MCU rows go now; the rest waits for the next band or the end
+                aligned = y + (y1 - y) // JPEG_MCU_ROWS * JPEG_MCU_ROWS
+                if aligned < y1:
+                    state["carry"] = image.crop((0, aligned, image.width, y1))
+                    y1 = aligned
+                if y1 == y:
+                    break
+            piece = image if (y, y1) == (0, image.height) else image.crop((0, y, image.width, y1))
+            self._write_rows(state, piece)
+            y = y1
+
+    def _write_image(self, image):
+        state = self._begin_image(image.width, image.height)
+        self._write_chunked(state, image)
+        return self._end_image(state)
+
+    def _write_page(self, width, height, content, xobjects):
+        """
+        Writes the content stream and page object of a width x height pixel page.
+        """
+        w_pt = width * 72 / self.dpi
+        h_pt = height * 72 / self.dpi
+        unit = max(1, math.ceil(max(w_pt, h_pt) / MAX_PAGE_PT))
+        user_unit = b""
+        if unit > 1:
+            # Content keeps its coordinates and is scaled into the smaller box
+            content = b"%.6f 0 0 %.6f 0 0 cm\n" % (1 / unit, 1 / unit) + content
+            w_pt, h_pt = w_pt / unit, h_pt / unit
+            user_unit = b" /UserUnit %d" % unit
+            self._version = b"1.6"
+        content_id = self._new_id()
+        page_id = self._new_id()
+        names = b" ".join(b"/Im%d %d 0 R" % (obj_id, obj_id) for obj_id in xobjects)
+
+        def write(_):
+            self._write_stream_obj(content_id, b"/Filter /FlateDecode", zlib.compress(content))
+            self._write_obj(
+                page_id,
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.4f %.4f]%s "
+                b"/Resources << /XObject << %s >> >> /Contents %d 0 R >>"
+                % (w_pt, h_pt, user_unit, names, content_id)
+            )
+        # Object ids are fixed now, so the page can be queued behind its images
+        self._emit(write)
+        self._page_ids.append(page_id)
+        self.page_count += 1
+
+    def add_page(self, image):
+        """
+        Writes one page holding the whole image, sized by the writer's DPI.
+        The encoder threads may still read the image after this returns, so
+        it must not be modified until the writer is closed.
+        """
+        if self._page is not None:
+            raise RuntimeError("previous page was not finished")
+        image_id = self._write_image(image)
+        self._write_page(image.width, image.height, self._image_op(image_id, 0, 0, image.width, image.height, image.height), [image_id])
+
+    def begin_page(self, width, height, breaks=()):
+        """
+        Starts a page of width x height pixels whose pixels follow as bands.
+        breaks: rows at which a new image starts, so a long page is stored as
+        a stack of images that each stay within JPEG_MAX_SIDE rows
+        """
+        if self._page is not None:
+            raise RuntimeError("previous page was not finished")
+        bounds = [0, *breaks, height]
+        self._page = {
+            "size": (width, height),
+            "spans": list(zip(bounds, bounds[1:])), # (y0, y1) of the images not started yet
+            "images": [], # (image id, y0, rows) of the finished images
+            "image": None, # (state, y0, y1) of the image being written
+            "y": 0,
+        }
+        self._next_page_image()
+
+    def _next_page_image(self):
+        page = self._page
+        y0, y1 = page["spans"].pop(0)
+        page["image"] = (self._begin_image(page["size"][0], y1 - y0), y0, y1)
+
+    def write_band(self, band):
+        """
+        Appends the next rows of the current page (full page width).
+        Like add_page, the band must not be modified afterwards.
+        """
+        page = self._page
+        top = 0
+        while top < band.height:
+            state, y0, y1 = page["image"]
+            if page["y"] == y1 and page["spans"]:
+                page["images"].append((self._end_image(state), y0, y1 - y0))
+                self._next_page_image()
+                continue
+            rows = min(band.height - top, y1 - page["y"]) if page["spans"] else band.height - top
+            piece = band if rows == band.height else band.crop((0, top, band.width, top + rows))
+            self._write_chunked(state, piece)
+            page["y"] += rows
+            top += rows
+
+    def end_page(self):
+        page = self._page
+        state, y0, y1 = page["image"]
+        if page["spans"]:
+            raise ValueError(f"page has {page['y']} rows, expected {page['size'][1]}")
+        images = page["images"] + [(self._end_image(state), y0, y1 - y0)]
+        self._page = None
+        width, height = page["size"]
+        ops = b"\n".join(self._image_op(image_id, 0, y, width, rows, height) for image_id, y, rows in images)
+        self._write_page(width, height, ops, [image_id for image_id, _, _ in images])
+
+    def add_vector_page(self, width, height, strips=(), photos=(), holes=()):
+        """
+        Writes a page whose film base and sprocket holes are vector paths.
+        All coordinates are pixels at the writer's DPI, origin top-left.
+        strips: (x, y, w, h) black film base rectangles
+        photos: (key, (x, y, w, h), render) placed images; render() is only
+                called the first time a key is seen, later uses share the XObject
+        holes: (x, y, w, h, r) white rounded rectangles
+        """
+        if self._page is not None:
+            raise RuntimeError("previous page was not finished")
+        s = 72 / self.dpi
+        h_pt = height * s
+        ops = [b"0 g"]
+        for x, y, w, h in strips:
+            ops.append(b"%.3f %.3f %.3f %.3f re" % (x * s, h_pt - (y + h) * s, w * s, h * s))
+        if strips:
+            ops.append(b"f")
+
+        xobjects = []
+        for key, (x, y, w, h), render in photos:
+            image_id = self._images.get(key)
+            if image_id is None:
+                image_id = self._write_image(render())
+                self._images[key] = image_id
+            if image_id not in xobjects:
+                xobjects.append(image_id)
+            ops.append(self._image_op(image_id, x, y, w, h, height))
+
+        if holes:
+            ops.append(b"1 g")
+            for x, y, w, h, r in holes:
+                ops.append(_rounded_rect_path(x * s, h_pt - (y + h) * s, w * s, h * s, r * s))
+            ops.append(b"f")
+        self._write_page(width, height, b"\n".join(ops), xobjects)
+
+    def _image_op(self, image_id, x, y, w, h, page_height):
+        s = 72 / self.dpi
+        return b"q %.4f 0 0 %.4f %.4f %.4f cm /Im%d Do Q" % (
+            w * s, h * s, x * s, (page_height - y - h) * s, image_id
+        )
+
+    def close(self):
+        """
+        Writes the page tree, cross-reference table and trailer.
+        """
+        if self._closed:
+            return
+        if self._page is not None:
+            raise RuntimeError("last page was not finished")
+        self._closed = True
+        self._drain()
+        if self._pool is not None:
+            self._pool.shutdown()
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids)
+        # The header says 1.4; the catalog raises it if a page needed a user unit
+        version = b" /Version /%s" % self._version if self._version != b"1.4" else b""
+        self._write_obj(1, b"<< /Type /Catalog /Pages 2 0 R%s >>" % version)
+        self._write_obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_ids)))
+
+        xref_pos = self._pos
+        count = self._next_id
+        lines = [b"xref\n0 %d\n" % count, b"0000000000 65535 f \n"]
+        for obj_id in range(1, count):
+            lines.append(b"%010d 00000 n \n" % self._offsets[obj_id])
+        self._write(b"".join(lines))
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref_pos))
+
+        if self._owns_file:
+            self._file.close()
+            os.replace(self._path + ".tmp", self._path)
+        else:
+            self._file.flush()
+
+def _collected(metrics, job, write):
+    # Stages are thread-local: a job's totals are gathered in its worker and
+    # merged into the writer thread's metrics when its result is written
+    def run():
+        with processor.collect_metrics() as worker_metrics:
+            result = job()
+        return result, worker_metrics.stages
+
+    def merge(result):
+        metrics.merge(result[1])
+        write(result[0])
+    return run, merge
+
+def _deflate(image):
+    """
+    Compresses image rows into a raw deflate piece that ends on a byte
+    boundary, so pieces compressed independently can be concatenated.
+    returns: (data, adler32 of the raw bytes, number of raw bytes)
+    """
+    with processor.stage("encode") as st:
+        raw = image.tobytes()
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        data = compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        st.add(image, allocated=False)
+    return data, zlib.adler32(raw), len(raw)
+
+def _adler32_combine(adler1, adler2, length2):
+    # zlib's adler32_combine, which the zlib module does not expose
+    base = 65521
+    rem = length2 % base
+    sum1 = adler1 & 0xFFFF
+    sum2 = rem * sum1 % base
+    sum1 = (sum1 + (adler2 & 0xFFFF) + base - 1) % base
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + base - rem) % base
+    return sum1 | (sum2 << 16)
+
+_RESTART_MARKER = re.compile(rb"\xff([\xd0-\xd7])")
+
+def _encode_jpeg(image, y, height, quality):
+    """
+    Encodes rows y.. of a `height` rows tall image as a piece of one baseline
+    JPEG. Every MCU row ends with a restart marker, which resets the DC
+    prediction, so pieces encoded separately join into a single scan:
+    the first piece carries the headers (with the full height) and later
+    pieces only their entropy-coded data, preceded by the marker that ends
+    the previous piece.
+    returns: bytes to write
+    """
+    with processor.stage("encode") as st:
+        buf = io.BytesIO()
+        image.save(buf, "JPEG", quality=quality, subsampling=2, restart_marker_rows=1)
+        st.add(image, allocated=False)
+    data = buf.getvalue()
+
+    # Walk the marker segments up to the start of scan
+    pos = 2
+    while True:
+        marker = data[pos + 1]
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker == 0xC0: # Baseline frame header: precision, then height
+            sof_height = pos + 5
+        pos += 2 + length
+        if marker == 0xDA:
+            break
+    scan = data[pos:-2] # Without the end of image marker
+
+    # Restart markers count MCU rows modulo 8 across the whole image
+    mcu_row = y // JPEG_MCU_ROWS
+    if mcu_row % 8:
+        scan = _RESTART_MARKER.sub(lambda m: bytes((0xFF, 0xD0 + (m[1][0] - 0xD0 + mcu_row) % 8)), scan)
+    if y == 0:
+        return data[:sof_height] + height.to_bytes(2, "big") + data[sof_height + 2:pos] + scan
+    return bytes((0xFF, 0xD0 + (mcu_row - 1) % 8)) + scan
+
+def _rounded_rect_path(x, y, w, h, r):
+    k = KAPPA * r
+    return (
+        b"%.3f %.3f m %.3f %.3f l %.3f %.3f %.3f %.3f %.3f %.3f c "
+        b"%.3f %.3f l %.3f %.3f %.3f %.3f %.3f %.3f c "
+        b"%.3f %.3f l %.3f %.3f %.3f %.3f %.3f %.3f c "
+        b"%.3f %.3f l %.3f %.3f %.3f %.3f %.3f %.3f c h"
+    ) % (
+        x + r, y, x + w - r, y, x + w - r + k, y, x + w, y + r - k, x + w, y + r,
+        x + w, y + h - r, x + w, y + h - r + k, x + w - r + k, y + h, x + w - r, y + h,
+        x + r, y + h, x + r - k, y + h, x, y + h - r + k, x, y + h - r,
+        x, y + r, x, y + r - k, x + r - k, y, x + r, y,
+    )
+
+def write_pdf(fp, pages, dpi=DEFAULT_DPI, compression="flate", jpeg_quality=DEFAULT_JPEG_QUALITY, icc_profile=None):
+    """
+    Writes an iterable of page images to a PDF, one page at a time.
+    pages can be a generator, so each page is built only after the previous
+    one has been written and released.
+    returns: number of pages written
+    """
+    with PdfWriter(fp, dpi, compression, jpeg_quality, icc_profile=icc_profile) as writer:
+        for page in pages:
+            writer.add_page(page)
+            del page
+    return writer.page_count
+
+def strip_breaks(grid, count, max_rows=None):
+    """
+    Returns the rows at which a page of `count` frames is cut into stacked
+    images of at most max_rows rows (default JPEG_MAX_SIDE), for
+    PdfWriter.begin_page. Cuts fall in the gaps between film strips, so no
+    strip is split; pages that fit in one image get none.
+    """
+    max_rows = max_rows or JPEG_MAX_SIDE
+    if grid["page_h"] <= max_rows:
+        return []
+    breaks = []
+    top = 0
+    strip_end = 0
+    for _, y, _ in processor.page_rows(grid, count):
+        # A strip's base rectangle includes its bottom edge, hence frame_h + 1 rows
+        if y + grid["frame_h"] + 1 - top > max_rows and strip_end > top:
+            top = (strip_end + y) // 2
+            breaks.append(top)
+        strip_end = y + grid["frame_h"] + 1
+    if grid["page_h"] - top > max_rows and top < strip_end < grid["page_h"]:
+        breaks.append(strip_end)
+    return breaks
+
+def write_layout_pdf(fp, engine, band_height=None, compression="flate", jpeg_quality=DEFAULT_JPEG_QUALITY, icc_profile=None,
+                     progress=None, cancelled=None, rows_ahead=ROWS_AHEAD):
+    """
+    Writes every page of a LayoutEngine band by band, so neither a whole page
+    nor a whole document is ever held in memory. The work is a pipeline whose
+    stages overlap: film rows are rendered on a background thread up to
+    rows_ahead rows ahead, composited into bands here, encoded on the
+    writer's pool and written in order, each hand-over through a bounded queue.
+    band_height: rows per band (default: one film strip)
+    compression: "flate" or "jpeg", see COMPRESSIONS
+    icc_profile: ICC data of the engine's output profile, if not sRGB
+    progress: optional callable(frames_done, pages_done)
+    cancelled: optional callable checked between rows and bands; when it
+    returns True the export stops with processor.RenderCancelled
+    returns: number of pages written
+    """
+    with PdfWriter(fp, engine.dpi, compression, jpeg_quality, icc_profile=icc_profile) as writer, \
+            processor.RowPipeline(engine, rows_ahead, cancelled) as rows:
+        for page_index in range(engine.page_count):
+            # A long roll page is stored as several images, one per run of strips
+            start, end = engine.page_range(page_index)
+            writer.begin_page(engine.grid["page_w"], engine.grid["page_h"], strip_breaks(engine.grid, end - start))
+            for _, band in engine.iter_page_bands(page_index, band_height, rows):
+                if cancelled is not None and cancelled():
+                    raise processor.RenderCancelled()
+                writer.write_band(band)
+                del band
+                if progress is not None:
+                    progress(rows.frames_taken, writer.page_count)
+            writer.end_page()
+            if progress is not None:
+                progress(rows.frames_taken, writer.page_count)
+    return writer.page_count
+
+def write_vector_pdf(fp, specs, paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, dpi=DEFAULT_DPI,
+                     compression="flate", jpeg_quality=DEFAULT_JPEG_QUALITY, color_target=processor.DEFAULT_COLOR_TARGET,
+                     progress=None, cancelled=None, workers=None):
+    """
+    Writes the layout as a vector PDF: film base and sprocket holes are paths,
+    and each distinct photo is embedded once at its own pixel density, capped at dpi.
+    A page's new photos are rendered together on the process pool.
+    specs: frame specs (image_path, crop_mode, color_mode, film_type, rotation, contrast)
+    color_target: see processor.color_target; a non-sRGB output profile is embedded
+    progress, cancelled: see write_layout_pdf; checked before every photo is
+    taken from the pool, so a page of large photos does not hold up a cancel
+    workers: see processor.render_frames
+    returns: number of pages written
+    """
+    grid = processor.page_grid(paper_size, orientation, margin_mm, gap_mm, dpi, len(specs))
+    fpp = grid["frames_per_page"]
+    frame_h = grid["frame_h"]
+    offset_y = processor.mm_to_px((processor.FRAME_H_MM - processor.IMAGE_H_MM) / 2, dpi)
+    img_w = processor.mm_to_px(processor.IMAGE_W_MM, dpi)
+    img_h = processor.mm_to_px(processor.IMAGE_H_MM, dpi)
+
+    def photo_renderer(images, index):
+        # The writer asks for new photos in page order, the order they were submitted in
+        def render():
+            if cancelled is not None and cancelled():
+                raise processor.RenderCancelled()
+            image = next(images)
+            if progress is not None:
+                progress(index + 1, writer.page_count)
+            return image
+        return render
+
+    icc_profile = processor.output_profile_bytes(color_target)
+    embedded = set()
+    with PdfWriter(fp, dpi, compression, jpeg_quality, icc_profile=icc_profile) as writer:
+        for start in range(0, len(specs) if fpp else 0, fpp):
+            if cancelled is not None and cancelled():
+                raise processor.RenderCancelled()
+            count = min(fpp, len(specs) - start)
+            strips = []
+            holes = []
+            for x, y, row_w in processor.page_rows(grid, count):
+                strips.append((x, y, row_w, frame_h))
+                holes.extend(processor.sprocket_hole_rects(x, y, row_w, dpi))
+            infos = processor.page_layout_info(grid, start, count)
+            fresh = list(dict.fromkeys(specs[info["index"]] for info in infos if specs[info["index"]] not in embedded))
+            embedded.update(fresh)
+            images = processor.iter_photos(fresh, dpi, workers, color_target)
+            try:
+                photos = []
+                for info in infos:
+                    x, y = info["rect"][:2]
+                    spec = specs[info["index"]]
+                    photos.append((spec, (x, y + offset_y, img_w, img_h), photo_renderer(images, info["index"])))
+                writer.add_vector_page(grid["page_w"], grid["page_h"], strips, photos, holes)
+            finally:
+                images.close()
+            if progress is not None:
+                progress(start + count, writer.page_count)
+    return writer.page_count
@@ -1,8 +1,31 @@
 import os
-from PIL import Image, ImageDraw, ImageOps
+import io
+import math
+import hashlib
+import time
+import logging
+import queue
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from PIL import Image, ImageDraw, ExifTags
+
+try:
+    from PIL import ImageCms
+except ImportError: # Pillow built without littlecms: profiles are ignored
+    ImageCms = None
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_DPI = 300
 
+# Default memory budget for rendered frames kept by frame_cache
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
 def mm_to_px(mm, dpi=DEFAULT_DPI):
     return int(mm * dpi / 25.4)
 
@@ -16,6 +39,50 @@ SPROCKET_HOLE_H_MM = 1.98
 SPROCKET_HOLE_PITCH_MM = 4.75
 SPROCKET_HOLE_RADIUS_MM = 0.5
 
+# Quality tiers: "preview" lets the JPEG decoder downscale (draft mode) and
+# uses a cheap resampler; "full" keeps full decoding and Lanczos for export.
+QUALITY_TIERS = ("full", "preview")
+RESAMPLING = {
+    "full": Image.Resampling.LANCZOS,
+    "preview": Image.Resampling.BILINEAR,
+}
+
+# Fields of a frame spec, the hashable per-frame settings tuple
+SPEC_FIELDS = ("image_path", "crop_mode", "color_mode", "film_type", "rotation", "contrast")
+
+# Longest side of photo list thumbnails (pixels)
+THUMBNAIL_SIZE = 256
+
+# Crop modes: "short" fills the frame (cropping the long side), "long" fits the whole photo
+CROP_MODES = ("short", "long")
+
+# Color settings. "bw" and "sepia" work on the gray level; "color_negative"
+# inverts and tints with the orange base of C-41 film.
+COLOR_MODES = ("color", "bw", "sepia")
+FILM_TYPES = ("positive", "negative", "color_negative")
+# Contrast is a percentage: -100 halves it, 100 is a full S-curve
+CONTRAST_RANGE = (-100, 100)
+# Per-channel gamma of the sepia tone: black and white stay, midtones turn brown
+SEPIA_GAMMA = (0.85, 1.0, 1.35)
+# Transmission of the orange mask (film base) in R, G, B
+ORANGE_MASK = (0.96, 0.62, 0.40)
+
+# Color management: frames are converted from the ICC profile embedded in each
+# source (untagged sources count as sRGB) to an output profile. "sRGB" is
+# built in; any other output profile is the path of an RGB .icc/.icm file.
+DEFAULT_OUTPUT_PROFILE = "sRGB"
+RENDERING_INTENTS = {
+    "perceptual": "PERCEPTUAL",
+    "relative": "RELATIVE_COLORIMETRIC",
+    "saturation": "SATURATION",
+    "absolute": "ABSOLUTE_COLORIMETRIC",
+}
+# ICC color space signature of the source profile each image mode expects
+ICC_COLOR_SPACES = {"RGB": "RGB", "CMYK": "CMYK", "L": "GRAY"}
+# color_target: (output profile, rendering intent, soft proof). A soft proof
+# renders for an sRGB screen while simulating the output profile.
+DEFAULT_COLOR_TARGET = (DEFAULT_OUTPUT_PROFILE, "perceptual", False)
+
 # Paper dimensions
 PAPER_SIZES = {
     "A4": (210, 297),
@@ -23,6 +90,124 @@ PAPER_SIZES = {
     "A6": (105, 148)
 }
 
+# Roll paper is named "Roll <width in mm>" (see roll_paper): a fixed width and
+# a length that grows with the number of frames, laid out as one long page
+ROLL_PREFIX = "Roll "
+DEFAULT_ROLL_WIDTH_MM = 610 # 24 inch media
+# A roll preview is one image as long as the roll, so its length caps the preview DPI
+MAX_ROLL_PREVIEW_PIXELS = 16 * 1024 * 1024
+
+class Metrics:
+    """
+    Per-stage totals of wall time, pixels produced and bytes allocated.
+    Stages are recorded by the thread that installed the object with
+    collect_metrics(); frames rendered in pool workers are merged back in.
+    callback(stage, seconds, pixels, nbytes), if given, sees every single
+    record, i.e. each frame and each page separately.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stages = {} # stage -> {"count", "seconds", "pixels", "bytes"}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, pixels=0, nbytes=0, count=1):
+        with self._lock:
+            totals = self.stages.get(stage)
+            if totals is None:
+                totals = self.stages[stage] = {"count": 0, "seconds": 0.0, "pixels": 0, "bytes": 0}
+            totals["count"] += count
+            totals["seconds"] += seconds
+            totals["pixels"] += pixels
+            totals["bytes"] += nbytes
+        if self.callback is not None:
+            self.callback(stage, seconds, pixels, nbytes)
+
+    def merge(self, stages):
+        """
+        Adds totals in the format of .stages, e.g. from another process.
+        """
+        for stage, totals in stages.items():
+            self.record(stage, totals["seconds"], totals["pixels"], totals["bytes"], totals["count"])
+
+    @property
+    def seconds(self):
+        return sum(totals["seconds"] for totals in self.stages.values())
+
+    def breakdown(self, limit=None):
+        """
+        Short one-line summary, slowest stages first.
+        """
+        ranked = sorted(self.stages.items(), key=lambda item: -item[1]["seconds"])
+        parts = [f"{stage} {totals['seconds']:.2f}s" for stage, totals in ranked[:limit]]
+        return f"{self.seconds:.2f}s: " + ", ".join(parts) if parts else "0.00s"
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start", "pixels", "nbytes")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.pixels = 0
+        self.nbytes = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.name, time.perf_counter() - self.start, self.pixels, self.nbytes)
+        return False
+
+    def add(self, image, allocated=True):
+        # Counts the pixels an image produced or touched by the stage, and its
+        # size if the stage allocated it
+        self.pixels += image.width * image.height
+        if allocated:
+            self.nbytes += _image_nbytes(image)
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, image, allocated=True):
+        pass
+
+_NULL_STAGE = _NullStage()
+_local = threading.local()
+
+def stage(name):
+    """
+    Context manager timing one processing stage into the current thread's
+    Metrics. Without collect_metrics() it is a shared no-op object.
+    """
+    metrics = getattr(_local, "metrics", None)
+    if metrics is None:
+        return _NULL_STAGE
+    return _Stage(metrics, name)
+
+def current_metrics():
+    return getattr(_local, "metrics", None)
+
+@contextmanager
+def collect_metrics(metrics=None):
+    """
+    Records every stage run by this thread inside the block.
+    yields: the Metrics object (a new one unless given)
+    """
+    if metrics is None:
+        metrics = Metrics()
+    previous = getattr(_local, "metrics", None)
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
 def draw_rounded_rect(draw, x, y, w, h, r, fill):
     draw.rectangle([x + r, y, x + w - r, y + h], fill=fill)
     draw.rectangle([x, y + r, x + w, y + h - r], fill=fill)
@@ -31,92 +216,423 @@ def draw_rounded_rect(draw, x, y, w, h, r, fill):
     draw.pieslice([x, y + h - 2*r, x + 2*r, y + h], 90, 180, fill=fill)
     draw.pieslice([x + w - 2*r, y + h - 2*r, x + w, y + h], 0, 90, fill=fill)
 
-def draw_sprocket_holes(image, x_start_px, y_start_px, width_px, dpi=DEFAULT_DPI):
+@lru_cache(maxsize=None)
+def film_geometry(dpi=DEFAULT_DPI):
     """
-    Draws continuous sprocket holes on the image.
+    Pixel sizes of the frame and sprocket-hole geometry at a DPI, computed once per DPI.
     """
-    draw = ImageDraw.Draw(image)
-    hole_w = mm_to_px(SPROCKET_HOLE_W_MM, dpi)
-    hole_h = mm_to_px(SPROCKET_HOLE_H_MM, dpi)
-    pitch = mm_to_px(SPROCKET_HOLE_PITCH_MM, dpi)
-    hole_r = mm_to_px(SPROCKET_HOLE_RADIUS_MM, dpi)
-    
     margin_h = (FRAME_H_MM - IMAGE_H_MM) / 2
-    top_hole_y = mm_to_px((margin_h - SPROCKET_HOLE_H_MM) / 2, dpi)
-    bottom_hole_y = mm_to_px(FRAME_H_MM - margin_h + (margin_h - SPROCKET_HOLE_H_MM) / 2, dpi)
-    
-    # Use a fixed offset to ensure alignment across frames when gap is 2mm
-    offset = mm_to_px(0.5, dpi)
+    return {
+        "frame_w": mm_to_px(FRAME_W_MM, dpi),
+        "frame_h": mm_to_px(FRAME_H_MM, dpi),
+        "img_w": mm_to_px(IMAGE_W_MM, dpi),
+        "img_h": mm_to_px(IMAGE_H_MM, dpi),
+        "img_y": mm_to_px(margin_h, dpi),
+        "hole_w": mm_to_px(SPROCKET_HOLE_W_MM, dpi),
+        "hole_h": mm_to_px(SPROCKET_HOLE_H_MM, dpi),
+        "pitch": mm_to_px(SPROCKET_HOLE_PITCH_MM, dpi),
+        "hole_r": mm_to_px(SPROCKET_HOLE_RADIUS_MM, dpi),
+        "top_hole_y": mm_to_px((margin_h - SPROCKET_HOLE_H_MM) / 2, dpi),
+        "bottom_hole_y": mm_to_px(FRAME_H_MM - margin_h + (margin_h - SPROCKET_HOLE_H_MM) / 2, dpi),
+        # Use a fixed offset to ensure alignment across frames when gap is 2mm
+        "hole_offset": mm_to_px(0.5, dpi),
+    }
+
+def sprocket_hole_rects(x_start_px, y_start_px, width_px, dpi=DEFAULT_DPI):
+    """
+    Yields (x, y, w, h, r) of every sprocket hole of a strip, in pixels.
+    """
+    g = film_geometry(dpi)
+    hole_w = g["hole_w"]
     
-    curr_x = x_start_px + offset
+    curr_x = x_start_px + g["hole_offset"]
     while curr_x + hole_w <= x_start_px + width_px:
-        draw_rounded_rect(draw, curr_x, y_start_px + top_hole_y, hole_w, hole_h, hole_r, "white")
-        draw_rounded_rect(draw, curr_x, y_start_px + bottom_hole_y, hole_w, hole_h, hole_r, "white")
-        curr_x += pitch
+        yield curr_x, y_start_px + g["top_hole_y"], hole_w, g["hole_h"], g["hole_r"]
+        yield curr_x, y_start_px + g["bottom_hole_y"], hole_w, g["hole_h"], g["hole_r"]
+        curr_x += g["pitch"]
+
+# Holes per cached strip tile; longer strips paste the tile repeatedly
+STRIP_TILE_HOLES = 8
+
+@lru_cache(maxsize=None)
+def _hole_stamp(dpi):
+    # One hole as a mask, drawn with the same primitives as draw_sprocket_holes
+    g = film_geometry(dpi)
+    stamp = Image.new('L', (g["hole_w"] + 1, g["hole_h"] + 1), 0)
+    draw_rounded_rect(ImageDraw.Draw(stamp), 0, 0, g["hole_w"], g["hole_h"], g["hole_r"], 255)
+    return stamp
+
+@lru_cache(maxsize=4)
+def strip_tile(dpi=DEFAULT_DPI):
+    """
+    Pre-rendered run of STRIP_TILE_HOLES sprocket holes (black film base with
+    white holes), built once per DPI by stamping the cached hole. Strips of
+    any width repeat it, so its size does not grow with the paper: a few MB
+    at 3600 DPI. It ends right after its last hole, and the top and bottom
+    hole rows of a strip are identical, so one tile serves both.
+    """
+    g = film_geometry(dpi)
+    width = g["hole_offset"] + (STRIP_TILE_HOLES - 1) * g["pitch"] + g["hole_w"] + 1
+    tile = Image.new('RGB', (width, g["hole_h"] + 1), color='black')
+    stamp = _hole_stamp(dpi)
+    for i in range(STRIP_TILE_HOLES):
+        tile.paste("white", (g["hole_offset"] + i * g["pitch"], 0), stamp)
+    return tile
+
+def paste_strip_holes(image, x_start_px, y_start_px, width_px, dpi=DEFAULT_DPI):
+    """
+    Pastes the hole rows of a strip from the cached tile, a few opaque pastes
+    per row. Only valid where the hole rows are plain film base (black), as
+    on a laid out strip; use draw_sprocket_holes to draw holes over arbitrary
+    pixels.
+    """
+    g = film_geometry(dpi)
+    if width_px < g["hole_offset"] + g["hole_w"]:
+        return
+    holes = (width_px - g["hole_offset"] - g["hole_w"]) // g["pitch"] + 1
+    with stage("holes"):
+        tile = strip_tile(dpi)
+        for first in range(0, holes, STRIP_TILE_HOLES):
+            count = min(STRIP_TILE_HOLES, holes - first)
+            part = tile
+            if count < STRIP_TILE_HOLES:
+                part = tile.crop((0, 0, g["hole_offset"] + (count - 1) * g["pitch"] + g["hole_w"] + 1, tile.height))
+            x = x_start_px + first * g["pitch"]
+            image.paste(part, (x, y_start_px + g["top_hole_y"]))
+            image.paste(part, (x, y_start_px + g["bottom_hole_y"]))
+
+def draw_sprocket_holes(image, x_start_px, y_start_px, width_px, dpi=DEFAULT_DPI):
+    """
+    Draws continuous sprocket holes on the image.
+    """
+    with stage("holes"):
+        draw = ImageDraw.Draw(image)
+        for x, y, w, h, r in sprocket_hole_rects(x_start_px, y_start_px, width_px, dpi):
+            draw_rounded_rect(draw, x, y, w, h, r, "white")
+
+def _open_image(image_path):
+    """
+    Opens a path, raw bytes or a file-like object (rewound first).
+    """
+    if isinstance(image_path, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image_path))
+    if hasattr(image_path, "seek"):
+        image_path.seek(0)
+    return Image.open(image_path)
+
+# Lossless transposes for right-angle rotations (counter-clockwise, like Image.rotate)
+TRANSPOSES = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+
+def plan_frame(src_w, src_h, crop_mode, rotation, img_w, img_h):
+    """
+    Works out how an unrotated src_w x src_h source maps onto the img_w x img_h
+    image area, so only the needed region is resampled before rotating.
+    returns: (box, size, offset)
+        box: region of the unrotated source to resample
+        size: resampled size, still unrotated
+        offset: paste position in the image area once rotated
+    """
+    rw, rh = (src_h, src_w) if rotation in (90, 270) else (src_w, src_h)
+    img_ratio = rw / rh
+    target_ratio = img_w / img_h
+
+    if crop_mode == 'short':
+        if img_ratio > target_ratio:
+            new_h = img_h
+            new_w = int(new_h * img_ratio)
+        else:
+            new_w = img_w
+            new_h = int(new_w / img_ratio)
+    else:
+        if img_ratio > target_ratio:
+            new_w = img_w
+            new_h = int(new_w / img_ratio)
+        else:
+            new_h = img_h
+            new_w = int(new_h * img_ratio)
+
+    # Region and output size in rotated coordinates
+    if crop_mode == 'short':
+        crop_left = (new_w - img_w) // 2
+        crop_top = (new_h - img_h) // 2
+        sx, sy = rw / new_w, rh / new_h
+        x0, y0 = crop_left * sx, crop_top * sy
+        x1, y1 = (crop_left + img_w) * sx, (crop_top + img_h) * sy
+        out_w, out_h = img_w, img_h
+        offset = (0, 0)
+    else:
+        x0, y0, x1, y1 = 0, 0, rw, rh
+        out_w, out_h = new_w, new_h
+        offset = ((img_w - new_w) // 2, (img_h - new_h) // 2)
+
+    # Map back onto the unrotated source
+    if rotation == 90:
+        box = (src_w - y1, x0, src_w - y0, x1)
+        size = (out_h, out_w)
+    elif rotation == 180:
+        box = (src_w - x1, src_h - y1, src_w - x0, src_h - y0)
+        size = (out_w, out_h)
+    elif rotation == 270:
+        box = (y0, src_h - x1, y1, src_h - x0)
+        size = (out_h, out_w)
+    else:
+        box = (x0, y0, x1, y1)
+        size = (out_w, out_h)
+    # Float rounding must not push the box outside the source
+    box = (max(0, box[0]), max(0, box[1]), min(src_w, box[2]), min(src_h, box[3]))
+    return box, size, offset
+
+def _contrast_curve(x, contrast):
+    # x in 0..1; positive contrast blends towards a smoothstep S-curve, negative flattens towards gray
+    if contrast > 0:
+        s_curve = x * x * (3 - 2 * x)
+        return min(1.0, max(0.0, x + 2 * contrast / 100 * (s_curve - x)))
+    return 0.5 + (x - 0.5) * (1 + contrast / 200)
+
+@lru_cache(maxsize=256)
+def color_lut(color_mode='color', film_type='positive', contrast=0):
+    """
+    Compiles color settings into one lookup table: contrast, then the sepia
+    tone, then inversion or the orange-mask negative.
+    returns: 768 values (R, G and B curves) for Image.point, also used as the
+    palette of the gray image in "bw" and "sepia" modes; None if the table is the identity
+    """
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"unknown color mode: {color_mode}")
+    if film_type not in FILM_TYPES:
+        raise ValueError(f"unknown film type: {film_type}")
+    if color_mode != 'sepia' and film_type == 'positive' and contrast == 0:
+        return None
+
+    lut = []
+    for channel in range(3):
+        for i in range(256):
+            x = _contrast_curve(i / 255, contrast) if contrast else i / 255
+            if color_mode == 'sepia':
+                x = x ** SEPIA_GAMMA[channel]
+            if film_type == 'negative':
+                x = 1 - x
+            elif film_type == 'color_negative':
+                x = ORANGE_MASK[channel] * (1 - x)
+            lut.append(round(x * 255))
+    return tuple(lut)
+
+@lru_cache(maxsize=256)
+def _interleaved(lut):
+    return tuple(v for rgb in zip(lut[:256], lut[256:512], lut[512:]) for v in rgb)
 
-def create_film_frame(image_path, crop_mode='short', color_mode='color', film_type='positive', rotation=0, draw_holes=True, dpi=DEFAULT_DPI):
+def apply_color(img, color_mode='color', film_type='positive', contrast=0):
+    """
+    Returns img as RGB with the color settings applied in a single pass over
+    the pixels (after the gray conversion in "bw" and "sepia" modes).
+    """
+    lut = color_lut(color_mode, film_type, contrast)
+    if color_mode != 'color' or img.mode == 'L':
+        # Gray levels expand through a palette, so the table costs nothing extra
+        gray = img.convert('L')
+        if lut is not None:
+            # Palettes are RGB triples, point tables one curve per channel
+            gray.putpalette(_interleaved(lut))
+        return gray.convert('RGB')
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img if lut is None else img.point(lut)
+
+def color_target(output_profile=DEFAULT_OUTPUT_PROFILE, intent="perceptual", soft_proof=False):
+    """
+    Returns a color_target, checking that the output profile can be used.
+    """
+    if intent not in RENDERING_INTENTS:
+        raise ValueError(f"unknown rendering intent: {intent}")
+    if output_profile != DEFAULT_OUTPUT_PROFILE:
+        _output_profile(output_profile)
+    return (output_profile, intent, bool(soft_proof))
+
+def preview_color_target(target, soft_proof=False):
+    """
+    Returns the color_target for showing frames made for `target` on screen:
+    a soft proof of its output profile, or a plain conversion to sRGB.
+    """
+    output_profile, intent, _ = target
+    if soft_proof and output_profile != DEFAULT_OUTPUT_PROFILE:
+        return (output_profile, intent, True)
+    return (DEFAULT_OUTPUT_PROFILE, intent, False)
+
+@lru_cache(maxsize=32)
+def _output_profile(name):
+    if ImageCms is None:
+        raise ValueError("color management needs Pillow with littlecms")
+    if name == DEFAULT_OUTPUT_PROFILE:
+        return ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+    profile = ImageCms.getOpenProfile(name)
+    if profile.profile.xcolor_space.strip() != "RGB":
+        raise ValueError(f"output profile is not an RGB profile: {name}")
+    return profile
+
+def output_profile_bytes(target):
+    """
+    Returns the ICC data to embed in a PDF of frames made for `target`:
+    None when they are sRGB (also the case for a soft proof).
+    """
+    output_profile, _, soft_proof = target
+    if output_profile == DEFAULT_OUTPUT_PROFILE or soft_proof:
+        return None
+    return _output_profile(output_profile).tobytes()
+
+@lru_cache(maxsize=256)
+def icc_transform(source_icc, mode='RGB', target=DEFAULT_COLOR_TARGET):
+    """
+    Returns the ImageCms transform from a source profile to a color target,
+    built once per (source profile, image mode, target) and shared by every
+    frame using it. None when the pixels would not change (sRGB to sRGB) or
+    the source cannot be managed. Apply it with apply_icc.
+    source_icc: embedded ICC data (img.info["icc_profile"]), None if untagged
+    mode: "RGB", "CMYK" or "L"; the result is always RGB. Untagged gray is
+    taken as sRGB gray, so its transform is the RGB one.
+    """
+    if ImageCms is None:
+        return None
+    output_profile, intent, soft_proof = target
+    source = None
+    if source_icc:
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(source_icc))
+        except (OSError, ImageCms.PyCMSError):
+            logger.warning("Ignoring unreadable embedded ICC profile")
+    if source is None or source.profile.xcolor_space.strip() != ICC_COLOR_SPACES[mode]:
+        if mode == 'CMYK':
+            return None
+        source = _output_profile(DEFAULT_OUTPUT_PROFILE)
+        mode = 'RGB'
+    if (mode == 'RGB' and output_profile == DEFAULT_OUTPUT_PROFILE and not soft_proof
+            and "sRGB" in (source.profile.profile_description or "")):
+        return None
+
+    rendering_intent = ImageCms.Intent[RENDERING_INTENTS[intent]]
+    # Without its one-pixel cache a transform is safe to share between threads
+    flags = ImageCms.Flags.NOCACHE
+    if soft_proof:
+        return ImageCms.buildProofTransform(
+            source, _output_profile(DEFAULT_OUTPUT_PROFILE), _output_profile(output_profile), mode, 'RGB',
+            renderingIntent=ImageCms.Intent.RELATIVE_COLORIMETRIC, proofRenderingIntent=rendering_intent,
+            flags=flags | ImageCms.Flags.SOFTPROOFING,
+        )
+    return ImageCms.buildTransform(source, _output_profile(output_profile), mode, 'RGB', rendering_intent, flags)
+
+def apply_icc(img, transform):
+    """
+    Returns img converted by an icc_transform, first converting gray to RGB
+    when the transform takes RGB (untagged gray).
+    """
+    if img.mode != transform.input_mode:
+        img = img.convert(transform.input_mode)
+    return ImageCms.applyTransform(img, transform)
+
+def spec_kwargs(spec):
+    """
+    Returns a frame spec (image_path, crop_mode, color_mode, film_type, rotation, contrast)
+    as keyword arguments for create_film_frame, create_frame_image and FrameCache.
+    Shorter specs leave the missing settings at their defaults.
+    """
+    return dict(zip(SPEC_FIELDS, spec))
+
+def create_frame_image(image_path, crop_mode='short', color_mode='color', film_type='positive', rotation=0, dpi=DEFAULT_DPI, quality='full', contrast=0, color_target=DEFAULT_COLOR_TARGET):
+    """
+    Returns the 36x24mm image area of a frame (the cropped, color-processed photo on black).
+    contrast: -100..100, see color_lut
+    quality: "full" for export, "preview" for fast reduced-scale decoding
+    color_target: output profile, intent and soft proof, see DEFAULT_COLOR_TARGET
+    The source is resampled first, straight from the needed region, and only
+    the small result is rotated and color-processed.
+    """
+    img_w = mm_to_px(IMAGE_W_MM, dpi)
+    img_h = mm_to_px(IMAGE_H_MM, dpi)
+    canvas = Image.new('RGB', (img_w, img_h), color='black')
+
+    try:
+        with _open_image(image_path) as img:
+            source_icc = img.info.get("icc_profile")
+            with stage("decode") as st:
+                if quality == 'preview':
+                    # Ask the decoder for the smallest scale that still covers the frame
+                    src_w, src_h = img.size
+                    fit_w, fit_h = (img_h, img_w) if rotation in (90, 270) else (img_w, img_h)
+                    if crop_mode == 'short':
+                        scale = max(fit_w / src_w, fit_h / src_h)
+                    else:
+                        scale = min(fit_w / src_w, fit_h / src_h)
+                    img.draft('RGB', (math.ceil(src_w * scale), math.ceil(src_h * scale)))
+                img.load()
+                st.add(img)
+
+            # Arbitrary angles cannot be planned in source coordinates
+            if rotation not in TRANSPOSES and rotation != 0:
+                with stage("rotate") as st:
+                    img = img.rotate(rotation, expand=True)
+                    st.add(img)
+                rotation = 0
+
+            # Pixels stay in the source's color space until the (cached) transform
+            transform = icc_transform(source_icc, img.mode if img.mode in ('CMYK', 'L') else 'RGB', color_target)
+
+            # Resampling works on RGB and L; palette and other modes are converted up front
+            if img.mode not in ('RGB', 'L'):
+                with stage("color") as st:
+                    if img.mode == 'CMYK' and transform is not None:
+                        img = ImageCms.applyTransform(img, transform)
+                        transform = None
+                    else:
+                        img = img.convert('RGB')
+                    st.add(img)
+
+            box, size, offset = plan_frame(img.width, img.height, crop_mode, rotation, img_w, img_h)
+            with stage("resize") as st:
+                # reducing_gap lets the preview tier shrink by whole factors with a cheap box filter first
+                img = img.resize(size, RESAMPLING[quality], box=box, reducing_gap=2.0 if quality == 'preview' else None)
+                st.add(img)
+
+            if rotation in TRANSPOSES:
+                with stage("rotate") as st:
+                    img = img.transpose(TRANSPOSES[rotation])
+                    st.add(img)
+
+            with stage("color") as st:
+                resized = img
+                if transform is not None:
+                    img = apply_icc(img, transform)
+                img = apply_color(img, color_mode, film_type, contrast)
+                if img is not resized:
+                    st.add(img)
+
+            with stage("paste") as st:
+                canvas.paste(img, offset)
+                st.add(canvas)
+    except Exception:
+        logger.warning("Error processing image %s", image_path, exc_info=True)
+
+    return canvas
+
+def create_film_frame(image_path, crop_mode='short', color_mode='color', film_type='positive', rotation=0, draw_holes=True, dpi=DEFAULT_DPI, quality='full', contrast=0, color_target=DEFAULT_COLOR_TARGET):
     """
     Takes an image and returns a PIL Image object of a 35mm film frame.
+    quality: "full" (Lanczos, used for export) or "preview" (decoder draft mode, bilinear)
     """
     target_w = mm_to_px(FRAME_W_MM, dpi)
     target_h = mm_to_px(FRAME_H_MM, dpi)
-    img_w = mm_to_px(IMAGE_W_MM, dpi)
-    img_h = mm_to_px(IMAGE_H_MM, dpi)
 
     # 1. Create black background
     frame = Image.new('RGB', (target_w, target_h), color='black')
 
     # 2. Process input image
-    try:
-        with Image.open(image_path) as img:
-            # Apply rotation
-            if rotation != 0:
-                img = img.rotate(rotation, expand=True)
-
-            if color_mode == 'bw':
-                img = img.convert('L').convert('RGB')
-            else:
-                img = img.convert('RGB')
-
-            if film_type == 'negative':
-                img = ImageOps.invert(img)
-
-            img_ratio = img.width / img.height
-            target_ratio = img_w / img_h
-
-            if crop_mode == 'short':
-                if img_ratio > target_ratio:
-                    new_h = img_h
-                    new_w = int(new_h * img_ratio)
-                else:
-                    new_w = img_w
-                    new_h = int(new_w / img_ratio)
-            else:
-                if img_ratio > target_ratio:
-                    new_w = img_w
-                    new_h = int(new_w / img_ratio)
-                else:
-                    new_h = img_h
-                    new_w = int(new_h * img_ratio)
-
-            img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-            canvas = Image.new('RGB', (img_w, img_h), color='black')
-            
-            left = (img_w - new_w) // 2
-            top = (img_h - new_h) // 2
-            
-            if crop_mode == 'short':
-                crop_left = (new_w - img_w) // 2
-                crop_top = (new_h - img_h) // 2
-                img = img.crop((crop_left, crop_top, crop_left + img_w, crop_top + img_h))
-                canvas.paste(img, (0, 0))
-            else:
-                canvas.paste(img, (left, top))
-
-            offset_y = mm_to_px((FRAME_H_MM - IMAGE_H_MM) / 2, dpi)
-            frame.paste(canvas, (0, offset_y))
-    except Exception as e:
-        print(f"Error processing image {image_path}: {e}")
+    canvas = create_frame_image(image_path, crop_mode, color_mode, film_type, rotation, dpi, quality, contrast, color_target)
+    offset_y = mm_to_px((FRAME_H_MM - IMAGE_H_MM) / 2, dpi)
+    with stage("paste") as st:
+        frame.paste(canvas, (0, offset_y))
+        st.add(frame)
 
     # 3. Draw sprocket holes if requested
     if draw_holes:
@@ -124,13 +640,518 @@ def create_film_frame(image_path, crop_mode='short', color_mode='color', film_ty
 
     return frame
 
-def layout_on_paper(image_list, paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, dpi=DEFAULT_DPI):
+def native_dpi(image_path, crop_mode='short', rotation=0):
     """
-    image_list: list of PIL Image objects (the film frames)
-    paper_size: "A4", "A5", or "A6"
-    orientation: "Auto", "Portrait", or "Landscape"
-    returns: (list of PIL Images, list of layout_info)
+    Returns the DPI at which the photo fills the 36x24mm image area without
+    resampling, i.e. the pixel density the source itself provides.
+    Only the image header is read.
+    """
+    try:
+        with _open_image(image_path) as img:
+            src_w, src_h = img.size
+    except Exception:
+        return None
+    if rotation in (90, 270):
+        src_w, src_h = src_h, src_w
+    dpi_w = src_w * 25.4 / IMAGE_W_MM
+    dpi_h = src_h * 25.4 / IMAGE_H_MM
+    # Filling crops the longer side, so the shorter density decides; fitting is the opposite
+    return min(dpi_w, dpi_h) if crop_mode == 'short' else max(dpi_w, dpi_h)
+
+def make_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    """
+    Returns a small RGB copy of the photo, at most size pixels on its longest side.
+    JPEGs are decoded at reduced scale, so this costs far less than a full decode.
+    Colors are converted to sRGB for the screen.
+    """
+    with _open_image(image_path) as img:
+        img.draft('RGB', (size, size))
+        transform = None
+        if img.mode in ('RGB', 'CMYK', 'L'):
+            transform = icc_transform(img.info.get("icc_profile"), img.mode)
+        img = apply_icc(img, transform) if transform else img.convert('RGB')
+    img.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return img
+
+def probe_image(image_path, size=THUMBNAIL_SIZE):
+    """
+    Reads what a photo's header tells, without decoding its pixels.
+    returns: dict with size, mode, orientation (EXIF, 1 if absent), icc (has
+    an embedded profile) and thumbnail: the EXIF thumbnail as an RGB image at
+    most size pixels, or None
+    """
+    with _open_image(image_path) as img:
+        raw = img.info.get("exif") or b""
+        if img.format in ("JPEG", "MPO", "TIFF"):
+            exif = img.getexif()
+        else:
+            # For other formats (PNG) getexif() loads the whole image to find late EXIF chunks
+            exif = Image.Exif()
+            if raw:
+                exif.load(raw)
+        orientation = exif.get(ExifTags.Base.Orientation, 1)
+        info = {
+            "size": img.size,
+            "mode": img.mode,
+            "orientation": orientation,
+            "icc": bool(img.info.get("icc_profile")),
+            "thumbnail": None,
+        }
+        # The thumbnail is a small JPEG in IFD1, addressed from the TIFF header
+        ifd1 = exif.get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(ExifTags.Base.JpegIFOffset)
+        length = ifd1.get(ExifTags.Base.JpegIFByteCount)
+        if raw.startswith(b"Exif\x00\x00"):
+            raw = raw[6:]
+        if offset and length and offset + length <= len(raw):
+            try:
+                with Image.open(io.BytesIO(raw[offset:offset + length])) as thumb:
+                    thumb.draft('RGB', (size, size))
+                    thumb = thumb.convert('RGB')
+                thumb.thumbnail((size, size), Image.Resampling.BILINEAR)
+                info["thumbnail"] = thumb
+            except (OSError, SyntaxError):
+                logger.warning("Ignoring unreadable EXIF thumbnail")
+    return info
+
+class HashedBytes(bytes):
+    """
+    In-memory image data (e.g. an upload) whose content hash is computed once.
+    source_key returns the stored digest instead of hashing the data again,
+    so equal content gets the same cache entries whatever its file name.
     """
+    def __new__(cls, data, digest=None):
+        obj = super().__new__(cls, data)
+        obj.digest = digest or hashlib.sha1(obj).hexdigest()
+        return obj
+
+    def __reduce__(self):
+        # Keeps the digest when sent to pool workers
+        return (HashedBytes, (bytes(self), self.digest))
+
+def source_key(image_path):
+    """
+    Returns a hashable identity for an image source.
+    Files are identified by absolute path, mtime and size; in-memory sources
+    (bytes or file-like objects such as uploads) by a hash of their content.
+    """
+    if isinstance(image_path, HashedBytes):
+        return image_path.digest
+    if isinstance(image_path, (str, os.PathLike)):
+        path = os.path.abspath(image_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return (path, None, None)
+        return (path, st.st_mtime_ns, st.st_size)
+
+    if isinstance(image_path, (bytes, bytearray)):
+        data = image_path
+    else:
+        pos = image_path.tell()
+        image_path.seek(0)
+        data = image_path.read()
+        image_path.seek(pos)
+    return hashlib.sha1(data).hexdigest()
+
+def _image_nbytes(img):
+    # Pillow keeps multi-band 8-bit modes (RGB, RGBA, CMYK...) at 4 bytes per pixel
+    if len(img.getbands()) > 1 or img.mode in ("I", "F"):
+        per_pixel = 4
+    elif img.mode.startswith("I;16"):
+        per_pixel = 2
+    else:
+        per_pixel = 1
+    return img.width * img.height * per_pixel
+
+class FrameCache:
+    """
+    LRU cache of rendered film frames with a byte budget.
+    Frames are keyed by source identity plus every setting that affects the
+    rendered pixels, so identical entries are only rendered once.
+    Returned frames are shared: callers must not modify them in place.
+    The cache may be used from several threads at once.
+    """
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self._lock = threading.RLock()
+        self._frames = OrderedDict()
+        self._max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = value
+            self._evict()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def key(self, image_path, crop_mode='short', color_mode='color', film_type='positive', rotation=0, draw_holes=True, dpi=DEFAULT_DPI, quality='full', contrast=0, color_target=DEFAULT_COLOR_TARGET):
+        return (source_key(image_path), crop_mode, color_mode, film_type, rotation, contrast, dpi, draw_holes, quality, color_target)
+
+    def get(self, image_path, crop_mode='short', color_mode='color', film_type='positive', rotation=0, draw_holes=True, dpi=DEFAULT_DPI, quality='full', contrast=0, color_target=DEFAULT_COLOR_TARGET):
+        """
+        Same arguments as create_film_frame; renders only on a cache miss.
+        """
+        key = self.key(image_path, crop_mode, color_mode, film_type, rotation, draw_holes, dpi, quality, contrast, color_target)
+        frame = self.lookup(key)
+        if frame is not None:
+            return frame
+
+        frame = create_film_frame(image_path, crop_mode, color_mode, film_type, rotation, draw_holes, dpi, quality, contrast, color_target)
+        self.put(key, frame)
+        return frame
+
+    def lookup(self, key):
+        """
+        Returns the cached frame for key, or None (counted as a miss).
+        """
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key, frame):
+        size = _image_nbytes(frame)
+        with self._lock:
+            if size > self._max_bytes:
+                return
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.nbytes -= _image_nbytes(old)
+            self._frames[key] = frame
+            self.nbytes += size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self._frames and self.nbytes > self._max_bytes:
+            _, old = self._frames.popitem(last=False)
+            self.nbytes -= _image_nbytes(old)
+
+# Shared cache used by the GUI and the web app
+frame_cache = FrameCache()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool_context():
+    # Forking a process that runs Qt, preview and export threads can copy
+    # locks held by those threads into the workers; start them clean instead
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+def _get_pool(workers):
+    # Pools are kept for the life of the process; starting workers is the expensive part.
+    # Preview and export threads may ask for one at the same time.
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # Workers must share the parent's resource tracker, otherwise each one
+            # reports the shared memory blocks it handed over as leaked on exit
+            resource_tracker.ensure_running()
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+            _pools[workers] = pool
+        return pool
+
+def _render_to_shared_memory(spec, draw_holes, dpi, quality, color_target, collect=False):
+    """
+    Pool worker: renders a frame into a new shared memory block so the pixels
+    are not pickled back to the parent. The parent unlinks the block.
+    collect: also return the frame's stage totals (Metrics.stages), else None
+    """
+    if collect:
+        with collect_metrics() as metrics:
+            frame = create_film_frame(**spec_kwargs(spec), draw_holes=draw_holes, dpi=dpi, quality=quality, color_target=color_target)
+        stages = metrics.stages
+    else:
+        frame = create_film_frame(**spec_kwargs(spec), draw_holes=draw_holes, dpi=dpi, quality=quality, color_target=color_target)
+        stages = None
+    return _to_shared_memory(frame) + (stages,)
+
+def _render_photo_to_shared_memory(spec, dpi, color_target):
+    # Pool worker for iter_photos
+    return _to_shared_memory(render_photo(spec, dpi, color_target))
+
+def _to_shared_memory(image):
+    data = image.tobytes()
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    shm.buf[:len(data)] = data
+    shm.close()
+    return shm.name, image.mode, image.size
+
+def _frame_from_shared_memory(name, mode, size):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        frame = Image.frombytes(mode, size, shm.buf[:size[0] * size[1] * len(mode)])
+    finally:
+        shm.close()
+        shm.unlink()
+    return frame
+
+def _discard_futures(futures):
+    """
+    Cancels futures that have not started and unlinks the shared memory
+    blocks of the ones that finished or were already running.
+    """
+    for future in futures:
+        if future.cancel():
+            continue
+        try:
+            name = future.result()[0]
+        except Exception:
+            continue
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        block.close()
+        block.unlink()
+
+def _picklable_source(image_path):
+    # Uploads and other file-like objects are sent to workers as their bytes
+    if isinstance(image_path, (str, os.PathLike, bytes, bytearray)):
+        return image_path
+    image_path.seek(0)
+    return image_path.read()
+
+class PendingFrames:
+    """
+    Frames handed to the pool by submit_frames. result() waits for them and
+    returns them in spec order; discard() drops the ones not collected yet.
+    """
+    def __init__(self, keys, frames, missing, futures, shared, render, cache, metrics):
+        self._keys = keys
+        self._key_set = set(keys)
+        self.frames = frames
+        self._missing = missing
+        self._futures = futures
+        self._shared = shared
+        self._render = render
+        self._cache = cache
+        self._metrics = metrics
+
+    def result(self):
+        frames = self.frames
+        for key, spec in self._missing.items():
+            frames[key] = self._render(spec)
+            self._cache.put(key, frames[key])
+        self._missing = {}
+        futures, self._futures = self._futures, []
+        done = 0
+        try:
+            for key, future in futures:
+                done += 1
+                name, mode, size, stages = future.result()
+                frames[key] = _frame_from_shared_memory(name, mode, size)
+                self._cache.put(key, frames[key])
+                if stages:
+                    self._metrics.merge(stages)
+        finally:
+            # After a failed frame the remaining blocks would otherwise leak
+            _discard_futures([future for _, future in futures[done:]])
+        # Frames an earlier batch renders are taken from it once it has been collected
+        for key, earlier in self._shared.items():
+            frames[key] = earlier.frames[key]
+        return [frames[key] for key in self._keys]
+
+    def discard(self):
+        futures, self._futures = self._futures, []
+        _discard_futures([future for _, future in futures])
+
+def submit_frames(specs, dpi=DEFAULT_DPI, quality='full', draw_holes=False, workers=None, cache=None, color_target=DEFAULT_COLOR_TARGET,
+                  after=None):
+    """
+    Starts rendering frame specs like render_frames without waiting for them,
+    so several batches can keep the pool busy at once.
+    after: PendingFrames to be collected before this one; frames it already
+    renders are taken from it instead of being rendered again
+    returns: PendingFrames
+    """
+    if cache is None:
+        cache = frame_cache
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    keys = [cache.key(**spec_kwargs(spec), draw_holes=draw_holes, dpi=dpi, quality=quality, color_target=color_target) for spec in specs]
+    frames = {}
+    missing = {}
+    shared = {}
+    for key, spec in zip(keys, specs):
+        if key in frames or key in missing or key in shared:
+            continue
+        if after is not None and key in after._key_set:
+            shared[key] = after
+            continue
+        frame = cache.lookup(key)
+        if frame is None:
+            missing[key] = spec
+        else:
+            frames[key] = frame
+
+    def render(spec):
+        return create_film_frame(**spec_kwargs(spec), draw_holes=draw_holes, dpi=dpi, quality=quality, color_target=color_target)
+
+    futures = []
+    metrics = current_metrics()
+    if workers > 1 and len(missing) > 1:
+        pool = _get_pool(workers)
+        futures = [
+            (key, pool.submit(_render_to_shared_memory, (_picklable_source(spec[0]),) + tuple(spec[1:]), draw_holes, dpi, quality, color_target, metrics is not None))
+            for key, spec in missing.items()
+        ]
+        missing = {}
+    return PendingFrames(keys, frames, missing, futures, shared, render, cache, metrics)
+
+def render_frames(specs, dpi=DEFAULT_DPI, quality='full', draw_holes=False, workers=None, cache=None, color_target=DEFAULT_COLOR_TARGET):
+    """
+    Renders frame specs (image_path, crop_mode, color_mode, film_type, rotation, contrast)
+    across a process pool and returns the frames in spec order.
+    Cached frames and repeated specs are rendered only once. Pixels come back
+    through shared memory instead of being pickled.
+    workers: pool size (None: one per CPU, 1: render in this process)
+    """
+    return submit_frames(specs, dpi, quality, draw_holes, workers, cache, color_target).result()
+
+def render_photo(spec, dpi=DEFAULT_DPI, color_target=DEFAULT_COLOR_TARGET):
+    """
+    Returns the photo of a frame spec without the film base (see
+    create_frame_image) at the photo's own pixel density, capped at dpi.
+    """
+    native = native_dpi(spec[0], spec[1], spec[4])
+    photo_dpi = min(dpi, native) if native else dpi
+    return create_frame_image(**spec_kwargs(spec), dpi=photo_dpi, color_target=color_target)
+
+def iter_photos(specs, dpi=DEFAULT_DPI, workers=None, color_target=DEFAULT_COLOR_TARGET):
+    """
+    Yields render_photo of each spec in order, rendered across the process
+    pool like render_frames. Closing the generator early drops the photos
+    not yet taken.
+    workers: pool size (None: one per CPU, 1: render in this process)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(specs) <= 1:
+        for spec in specs:
+            yield render_photo(spec, dpi, color_target)
+        return
+
+    pool = _get_pool(workers)
+    futures = [pool.submit(_render_photo_to_shared_memory, (_picklable_source(spec[0]),) + tuple(spec[1:]), dpi, color_target)
+               for spec in specs]
+    done = 0
+    try:
+        for future in futures:
+            done += 1
+            yield _frame_from_shared_memory(*future.result())
+    finally:
+        _discard_futures(futures[done:])
+
+def frame_source(quality='full', cache=None, workers=1, color_target=DEFAULT_COLOR_TARGET):
+    """
+    Returns a LayoutEngine frame_source rendering frame specs
+    (image_path, crop_mode, color_mode, film_type, rotation, contrast) through the cache.
+    Its many() renders a whole page of frames at once with render_frames, and
+    submit() starts a batch without waiting for it (see submit_frames).
+    color_target: see color_target(); previews use preview_color_target
+    """
+    if cache is None:
+        cache = frame_cache
+    def source(spec, dpi):
+        # Holes are left out because the layout draws them continuously per strip
+        return cache.get(**spec_kwargs(spec), draw_holes=False, dpi=dpi, quality=quality, color_target=color_target)
+    def many(specs, dpi):
+        return render_frames(specs, dpi, quality=quality, workers=workers, cache=cache, color_target=color_target)
+    def submit(specs, dpi, after=None):
+        return submit_frames(specs, dpi, quality=quality, workers=workers, cache=cache, color_target=color_target, after=after)
+    source.many = many
+    source.submit = submit
+    return source
+
+def roll_paper(width_mm=DEFAULT_ROLL_WIDTH_MM):
+    """
+    Returns the paper_size name of roll media width_mm wide.
+    """
+    return f"{ROLL_PREFIX}{width_mm:g}"
+
+def roll_width_mm(paper_size):
+    """
+    Returns the width of a roll paper_size, or None for sheet sizes.
+    """
+    if isinstance(paper_size, str) and paper_size.startswith(ROLL_PREFIX):
+        return float(paper_size[len(ROLL_PREFIX):])
+    return None
+
+def page_grid(paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, dpi=DEFAULT_DPI, count=0, layout_dpi=None):
+    """
+    Chooses the page size and frame grid for the given settings.
+    The result is cached and shared, so it must not be modified.
+    count: number of frames; only roll paper depends on it, as its single
+        page is exactly as long as the frames need (orientation is ignored)
+    layout_dpi: DPI at which the capacity (orientation, cols and rows) is
+        decided, usually the export DPI. Sizes are rounded to whole pixels, so
+        at a low preview DPI a different number of frames may fit; with
+        layout_dpi the preview shows the exported layout, sized at dpi.
+    returns: dict with page_w, page_h, cols, rows, frames_per_page, margin, gap, frame_w, frame_h (pixels)
+        and roll (True for roll paper)
+    """
+    width_mm = roll_width_mm(paper_size)
+    if layout_dpi is not None and layout_dpi != dpi:
+        reference = page_grid(paper_size, orientation, margin_mm, gap_mm, layout_dpi, count)
+        if width_mm is not None:
+            grid = _roll_grid(width_mm, margin_mm, gap_mm, dpi, count)
+            rows = reference["rows"]
+            page_h = 2 * grid["margin"] + rows * (grid["frame_h"] + grid["gap"]) - (grid["gap"] if rows else 0)
+        else:
+            landscape = reference["page_w"] > reference["page_h"]
+            grid = _sheet_grid(paper_size, "Landscape" if landscape else "Portrait", margin_mm, gap_mm, dpi)
+            page_h = grid["page_h"]
+        return dict(grid, page_h=page_h, cols=reference["cols"], rows=reference["rows"],
+                    frames_per_page=reference["frames_per_page"])
+    if width_mm is not None:
+        return _roll_grid(width_mm, margin_mm, gap_mm, dpi, count)
+    return _sheet_grid(paper_size, orientation, margin_mm, gap_mm, dpi)
+
+@lru_cache(maxsize=1024)
+def _roll_grid(width_mm, margin_mm, gap_mm, dpi, count):
+    margin = mm_to_px(margin_mm, dpi)
+    gap = mm_to_px(gap_mm, dpi)
+    frame_w = mm_to_px(FRAME_W_MM, dpi)
+    frame_h = mm_to_px(FRAME_H_MM, dpi)
+    page_w = mm_to_px(width_mm, dpi)
+    cols = max(0, (page_w - 2 * margin + gap) // (frame_w + gap))
+    rows = -(-count // cols) if cols else 0
+    return {
+        "page_w": page_w,
+        "page_h": 2 * margin + rows * (frame_h + gap) - (gap if rows else 0),
+        "cols": cols,
+        "rows": rows,
+        "frames_per_page": cols * rows,
+        "margin": margin,
+        "gap": gap,
+        "frame_w": frame_w,
+        "frame_h": frame_h,
+        "roll": True,
+    }
+
+@lru_cache(maxsize=1024)
+def _sheet_grid(paper_size, orientation, margin_mm, gap_mm, dpi):
     margin = mm_to_px(margin_mm, dpi)
     gap = mm_to_px(gap_mm, dpi)
     
@@ -171,7 +1192,252 @@ def layout_on_paper(image_list, paper_size="A4", orientation="Auto", margin_mm=1
             best_w, best_h = w_p, h_p
             best_cols, best_rows = cols_p, rows_p
             frames_per_page = cap_p
-        
+
+    return {
+        "page_w": best_w,
+        "page_h": best_h,
+        "cols": best_cols,
+        "rows": best_rows,
+        "frames_per_page": frames_per_page,
+        "margin": margin,
+        "gap": gap,
+        "frame_w": frame_w,
+        "frame_h": frame_h,
+        "roll": False,
+    }
+
+def fit_dpi(view_w, view_h, paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, layout_dpi=DEFAULT_DPI):
+    """
+    Returns the DPI at which the page fits inside view_w x view_h pixels,
+    for rendering a preview directly at the size it is displayed.
+    layout_dpi: DPI whose layout picks the "Auto" orientation, see page_grid
+    """
+    width_mm = roll_width_mm(paper_size)
+    if width_mm is not None:
+        # A roll is fitted to its width and scrolled along its length
+        return view_w / width_mm * 25.4
+    grid = page_grid(paper_size, orientation, margin_mm, gap_mm, layout_dpi)
+    paper_w_mm, paper_h_mm = PAPER_SIZES.get(paper_size, PAPER_SIZES["A4"])
+    if grid["page_w"] > grid["page_h"]:
+        paper_w_mm, paper_h_mm = paper_h_mm, paper_w_mm
+    return min(view_w / paper_w_mm, view_h / paper_h_mm) * 25.4
+
+def roll_preview_dpi(dpi, count, paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, layout_dpi=None,
+                     max_pixels=MAX_ROLL_PREVIEW_PIXELS, max_side=None):
+    """
+    Lowers a preview dpi so a roll of count frames stays within max_pixels
+    (and max_side pixels long, if given). Sheet sizes keep dpi.
+    layout_dpi: see page_grid
+    """
+    if roll_width_mm(paper_size) is None:
+        return dpi
+    grid = page_grid(paper_size, orientation, margin_mm, gap_mm, dpi, count, layout_dpi)
+    if not grid["page_h"]:
+        return dpi
+    scale = min(1, math.sqrt(max_pixels / (grid["page_w"] * grid["page_h"])))
+    if max_side is not None:
+        scale = min(scale, max_side / grid["page_h"])
+    return max(1, math.floor(dpi * scale))
+
+def page_layout_info(grid, first_index, count):
+    """
+    Returns the layout_info entries of one page holding `count` frames,
+    starting at frame `first_index`.
+    """
+    frame_w, frame_h, gap = grid["frame_w"], grid["frame_h"], grid["gap"]
+    page_layout = []
+    for k in range(count):
+        r, c = divmod(k, grid["cols"])
+        x = grid["margin"] + c * (frame_w + gap)
+        y = grid["margin"] + r * (frame_h + gap)
+        page_layout.append({
+            "rect": (x, y, x + frame_w, y + frame_h),
+            "index": first_index + k
+        })
+    return page_layout
+
+def page_rows(grid, count):
+    """
+    Returns (x, y, width) in pixels of every film strip on a page holding `count` frames.
+    """
+    rows = []
+    frame_w, frame_h, gap = grid["frame_w"], grid["frame_h"], grid["gap"]
+    for r in range(grid["rows"]):
+        start_idx = r * grid["cols"]
+        if start_idx >= count:
+            break
+        row_cols = min(grid["cols"], count - start_idx)
+        row_w_px = row_cols * frame_w + (row_cols - 1) * gap
+        rows.append((grid["margin"], grid["margin"] + r * (frame_h + gap), row_w_px))
+    return rows
+
+class LayoutPlan:
+    """
+    Geometry of a layout of `count` frames, without any pixels: page count,
+    frame rectangles, and constant-time lookups between frame indices, pages
+    and page coordinates.
+    """
+    __slots__ = ("grid", "count")
+
+    def __init__(self, grid, count):
+        self.grid = grid
+        self.count = count
+
+    @property
+    def frames_per_page(self):
+        return self.grid["frames_per_page"]
+
+    @property
+    def page_count(self):
+        fpp = self.grid["frames_per_page"]
+        return (self.count + fpp - 1) // fpp if fpp else 0
+
+    @property
+    def page_size(self):
+        return self.grid["page_w"], self.grid["page_h"]
+
+    def page_of(self, index):
+        """
+        Returns the page holding frame `index`, or None when no frame fits on a page.
+        """
+        fpp = self.grid["frames_per_page"]
+        return index // fpp if fpp else None
+
+    def page_range(self, page_index):
+        fpp = self.grid["frames_per_page"]
+        start = page_index * fpp
+        return start, min(start + fpp, self.count)
+
+    def frame_rect(self, index):
+        """
+        Returns (x1, y1, x2, y2) of a frame on its page.
+        """
+        g = self.grid
+        r, c = divmod(index % g["frames_per_page"], g["cols"])
+        x = g["margin"] + c * (g["frame_w"] + g["gap"])
+        y = g["margin"] + r * (g["frame_h"] + g["gap"])
+        return (x, y, x + g["frame_w"], y + g["frame_h"])
+
+    def page_info(self, page_index):
+        start, end = self.page_range(page_index)
+        return page_layout_info(self.grid, start, end - start)
+
+    def frame_at(self, page_index, x, y):
+        """
+        Returns the index of the frame at page coordinates (x, y), or None
+        for margins, gaps and empty slots.
+        """
+        g = self.grid
+        if not g["frames_per_page"] or x < g["margin"] or y < g["margin"]:
+            return None
+        c, dx = divmod(x - g["margin"], g["frame_w"] + g["gap"])
+        r, dy = divmod(y - g["margin"], g["frame_h"] + g["gap"])
+        if dx > g["frame_w"] or dy > g["frame_h"] or c >= g["cols"] or r >= g["rows"]:
+            return None
+        index = page_index * g["frames_per_page"] + int(r) * g["cols"] + int(c)
+        start, end = self.page_range(page_index)
+        return index if start <= index < end else None
+
+def plan_layout(count, paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, dpi=DEFAULT_DPI, layout_dpi=None):
+    """
+    Plans the layout of `count` frames without rendering anything.
+    layout_dpi: see page_grid
+    """
+    return LayoutPlan(page_grid(paper_size, orientation, margin_mm, gap_mm, dpi, count, layout_dpi), count)
+
+def plan_layouts(count, paper_sizes=None, orientations=("Portrait", "Landscape"), margins_mm=(10,), gap_mm=2, dpi=DEFAULT_DPI):
+    """
+    Plans every combination of paper size, orientation and margin.
+    returns: dict (paper_size, orientation, margin_mm) -> LayoutPlan
+    """
+    return {
+        (paper_size, orientation, margin_mm): plan_layout(count, paper_size, orientation, margin_mm, gap_mm, dpi)
+        for paper_size in (paper_sizes or PAPER_SIZES)
+        for orientation in orientations
+        for margin_mm in margins_mm
+    }
+
+def draw_strip(target, x_row_start, y_row_start, row_w_px, row_batch, grid, dpi=DEFAULT_DPI):
+    """
+    Composites one film strip (base, frames, holes) onto target at the given
+    position. Parts falling outside target are clipped, so a strip can be
+    drawn into a band of the page by passing a band-relative y.
+    """
+    frame_w, frame_h, gap = grid["frame_w"], grid["frame_h"], grid["gap"]
+
+    with stage("paste") as st:
+        # Draw black background for the whole row (strip)
+        draw = ImageDraw.Draw(target)
+        draw.rectangle([x_row_start, y_row_start, x_row_start + row_w_px, y_row_start + frame_h], fill="black")
+
+        for c, img in enumerate(row_batch):
+            x = x_row_start + c * (frame_w + gap)
+            target.paste(img, (x, y_row_start))
+            st.add(img, allocated=False)
+    
+    # Continuous sprocket holes for the row, from the cached strip tile
+    paste_strip_holes(target, x_row_start, y_row_start, row_w_px, dpi)
+
+def render_page(grid, batch, dpi=DEFAULT_DPI):
+    """
+    Rasterizes one page holding the frames in `batch` (at most frames_per_page).
+    """
+    with stage("paste") as st:
+        page = Image.new('RGB', (grid["page_w"], grid["page_h"]), color='white')
+        st.add(page)
+    best_cols = grid["cols"]
+
+    for r, (x_row_start, y_row_start, row_w_px) in enumerate(page_rows(grid, len(batch))):
+        row_batch = batch[r * best_cols : (r + 1) * best_cols]
+        draw_strip(page, x_row_start, y_row_start, row_w_px, row_batch, grid, dpi)
+
+    return page
+
+def render_page_bands(grid, count, row_frames, dpi=DEFAULT_DPI, band_height=None):
+    """
+    Rasterizes a page holding `count` frames as horizontal bands, top to
+    bottom, so the full page never exists in memory.
+    row_frames(r): returns the frames of strip r; it is called when the first
+        band touching the strip is drawn and the frames are dropped once the
+        bands have moved past it.
+    band_height: rows per band (default: the height of one film strip)
+    yields: (y, band) with band being page_w wide
+    """
+    page_w, page_h = grid["page_w"], grid["page_h"]
+    frame_h = grid["frame_h"]
+    band_height = band_height or frame_h
+    rows = page_rows(grid, count)
+    loaded = {}
+
+    for y0 in range(0, page_h, band_height):
+        y1 = min(y0 + band_height, page_h)
+        with stage("paste") as st:
+            band = Image.new('RGB', (page_w, y1 - y0), color='white')
+            st.add(band)
+        for r, (x_row_start, y_row_start, row_w_px) in enumerate(rows):
+            # The base rectangle includes its bottom edge, hence frame_h + 1 rows
+            if y_row_start + frame_h + 1 <= y0:
+                loaded.pop(r, None)
+                continue
+            if y_row_start >= y1:
+                break
+            if r not in loaded:
+                loaded[r] = row_frames(r)
+            draw_strip(band, x_row_start, y_row_start - y0, row_w_px, loaded[r], grid, dpi)
+        yield y0, band
+        del band
+
+def layout_on_paper(image_list, paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, dpi=DEFAULT_DPI, layout_dpi=None):
+    """
+    image_list: list of PIL Image objects (the film frames)
+    paper_size: "A4", "A5", "A6", or roll_paper(width_mm)
+    orientation: "Auto", "Portrait", or "Landscape"
+    layout_dpi: see page_grid
+    returns: (list of PIL Images, list of layout_info)
+    """
+    grid = page_grid(paper_size, orientation, margin_mm, gap_mm, dpi, len(image_list), layout_dpi)
+    frames_per_page = grid["frames_per_page"]
+
     pages = []
     all_layout_info = []
     
@@ -179,40 +1445,278 @@ def layout_on_paper(image_list, paper_size="A4", orientation="Auto", margin_mm=1
         return [], []
 
     for i in range(0, len(image_list), frames_per_page):
-        page = Image.new('RGB', (best_w, best_h), color='white')
         batch = image_list[i : i + frames_per_page]
-        page_layout = []
-        
-        for r in range(best_rows):
-            start_idx = r * best_cols
-            if start_idx >= len(batch):
-                break
-            
-            row_batch = batch[start_idx : min(start_idx + best_cols, len(batch))]
-            row_cols = len(row_batch)
-            row_w_px = row_cols * frame_w + (row_cols - 1) * gap
-            
-            x_row_start = margin
-            y_row_start = margin + r * (frame_h + gap)
-            
-            # Draw black background for the whole row (strip)
-            draw = ImageDraw.Draw(page)
-            draw.rectangle([x_row_start, y_row_start, x_row_start + row_w_px, y_row_start + frame_h], fill="black")
-            
-            for c, img in enumerate(row_batch):
-                img_idx = i + start_idx + c
-                x = x_row_start + c * (frame_w + gap)
-                y = y_row_start
-                page.paste(img, (x, y))
-                page_layout.append({
-                    "rect": (x, y, x + frame_w, y + frame_h),
-                    "index": img_idx
-                })
-            
-            # Draw continuous sprocket holes for the row
-            draw_sprocket_holes(page, x_row_start, y_row_start, row_w_px, dpi)
-            
-        pages.append(page)
-        all_layout_info.append(page_layout)
+        pages.append(render_page(grid, batch, dpi))
+        all_layout_info.append(page_layout_info(grid, i, len(batch)))
         
     return pages, all_layout_info
+
+class RenderCancelled(Exception):
+    """
+    Raised when a render is abandoned because its result is no longer wanted.
+    """
+
+class LayoutEngine:
+    """
+    Incremental version of layout_on_paper.
+    Keeps the ordered frame specs and the pages already rasterized, and on
+    every update() only marks the pages whose frames or settings changed as
+    dirty. Pages are rasterized lazily by render_page(), so frames are only
+    rendered for pages that are actually displayed or exported.
+
+    frame_source(spec, dpi) must return the film frame (without holes) for a
+    hashable frame spec. If it also has a many(specs, dpi) attribute, a page's
+    frames are requested with one call so they can be rendered in parallel.
+    source_factory(color_target): returns the frame_source for a color target;
+    update() switches to it when its color_target changes.
+    """
+    def __init__(self, frame_source, max_pages=8, source_factory=None):
+        self.frame_source = frame_source
+        self.source_factory = source_factory
+        self.color_target = None
+        self.max_pages = max_pages
+        self.specs = []
+        self.settings = None
+        self.grid = None
+        self._pages = OrderedDict() # page index -> rasterized page (clean pages only)
+
+    @property
+    def dpi(self):
+        return self.settings[-1] if self.settings else DEFAULT_DPI
+
+    @property
+    def page_count(self):
+        fpp = self.grid["frames_per_page"] if self.grid else 0
+        if fpp == 0:
+            return 0
+        return (len(self.specs) + fpp - 1) // fpp
+
+    def update(self, specs, paper_size="A4", orientation="Auto", margin_mm=10, gap_mm=2, dpi=DEFAULT_DPI, color_target=None,
+               layout_dpi=None):
+        """
+        Replaces the frame specs and layout settings.
+        color_target: renders frames from source_factory(color_target) from now
+        on (None keeps the current frame_source)
+        layout_dpi: see page_grid; a preview passes the export DPI
+        returns: sorted list of page indices that became dirty
+        """
+        specs = list(specs)
+        if color_target is not None and color_target != self.color_target and self.source_factory is not None:
+            self.frame_source = self.source_factory(color_target)
+            self.color_target = color_target
+        settings = (paper_size, orientation, margin_mm, gap_mm, self.color_target, layout_dpi, dpi)
+        # A roll's page grows with the frame count, so its grid can change too
+        grid = page_grid(paper_size, orientation, margin_mm, gap_mm, dpi, len(specs), layout_dpi)
+
+        if settings != self.settings or grid != self.grid:
+            self.settings = settings
+            self.grid = grid
+            self.specs = specs
+            dirty = list(self._pages)
+            self._pages.clear()
+            return sorted(set(dirty) | set(range(self.page_count)))
+
+        old = self.specs
+        self.specs = specs
+        changed = [i for i in range(max(len(old), len(specs)))
+                   if i >= len(old) or i >= len(specs) or old[i] != specs[i]]
+        return self.invalidate(changed)
+
+    def invalidate(self, indices=None):
+        """
+        Marks the pages holding the given frame indices dirty (all pages if None).
+        returns: sorted list of page indices that became dirty
+        """
+        if indices is None:
+            dirty = set(range(self.page_count)) | set(self._pages)
+        else:
+            fpp = self.grid["frames_per_page"] if self.grid else 0
+            dirty = {i // fpp for i in indices} if fpp else set()
+        # Pages past the end no longer exist
+        dirty |= {p for p in self._pages if p >= self.page_count}
+        for p in dirty:
+            self._pages.pop(p, None)
+        return sorted(dirty)
+
+    def is_dirty(self, page_index):
+        return page_index not in self._pages
+
+    @property
+    def plan(self):
+        return LayoutPlan(self.grid, len(self.specs))
+
+    def page_range(self, page_index):
+        fpp = self.grid["frames_per_page"]
+        start = page_index * fpp
+        return start, min(start + fpp, len(self.specs))
+
+    def layout_info(self, page_index):
+        start, end = self.page_range(page_index)
+        return page_layout_info(self.grid, start, end - start)
+
+    def all_layout_info(self):
+        return [self.layout_info(p) for p in range(self.page_count)]
+
+    def render_page(self, page_index, cancelled=None):
+        """
+        Returns the rasterized page, redrawing it only if it is dirty.
+        cancelled: optional callable checked between frames; when it returns
+        True the render stops with RenderCancelled (frames already rendered
+        stay in the frame cache).
+        """
+        page = self._pages.get(page_index)
+        if page is not None:
+            self._pages.move_to_end(page_index)
+            return page
+
+        start, end = self.page_range(page_index)
+        many = getattr(self.frame_source, "many", None)
+        if cancelled is not None:
+            batch = []
+            for spec in self.specs[start:end]:
+                if cancelled():
+                    raise RenderCancelled()
+                batch.append(self.frame_source(spec, self.dpi))
+        elif many is not None:
+            batch = many(self.specs[start:end], self.dpi)
+        else:
+            batch = [self.frame_source(spec, self.dpi) for spec in self.specs[start:end]]
+        page = render_page(self.grid, batch, self.dpi)
+        self._pages[page_index] = page
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return page
+
+    def iter_page_bands(self, page_index, band_height=None, rows=None):
+        """
+        Yields (y, band) strips of a page without ever building the whole page;
+        each film row's frames are rendered only while bands cross that row.
+        Bands are not cached.
+        rows: optional RowPipeline that has the rows' frames rendered ahead
+        """
+        start, end = self.page_range(page_index)
+        cols = self.grid["cols"]
+
+        def row_frames(r):
+            specs = self.specs[start + r * cols : min(start + (r + 1) * cols, end)]
+            if rows is not None:
+                return rows.take(specs)
+            return self.row_frames(specs)
+
+        return render_page_bands(self.grid, end - start, row_frames, self.dpi, band_height)
+
+    def row_frames(self, specs):
+        many = getattr(self.frame_source, "many", None)
+        if many is not None:
+            return many(specs, self.dpi)
+        return [self.frame_source(spec, self.dpi) for spec in specs]
+
+    def iter_pages(self):
+        """
+        Yields every page in order. With max_pages=0 no page is kept after
+        it has been yielded, so only one page is alive at a time.
+        """
+        for page_index in range(self.page_count):
+            yield self.render_page(page_index)
+
+class RowPipeline:
+    """
+    Renders the film rows of every page of a LayoutEngine, in order, on a
+    background thread that stays at most `depth` rows ahead of the consumer,
+    so rendering overlaps compositing and encoding without piling up frames.
+    When the frame_source can submit() batches, the next rows are handed to
+    the pool while a row is collected, so about frames_ahead frames (default:
+    two per CPU) are in flight even when a row has fewer frames than workers.
+    take(specs) returns the next row's frames; close() stops the thread.
+    frames_taken counts the frames handed out so far.
+    cancelled: optional callable checked before every row; when it returns
+    True take() raises RenderCancelled.
+    """
+    def __init__(self, engine, depth=2, cancelled=None, frames_ahead=None):
+        self._engine = engine
+        self._cancelled = cancelled
+        if frames_ahead is None:
+            frames_ahead = 2 * (os.cpu_count() or 1)
+        cols = engine.grid["cols"] if engine.grid else 0
+        self._rows_ahead = max(1, -(-frames_ahead // cols)) if cols else 1
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self.frames_taken = 0
+        # Stages timed on the thread go to the creating thread's metrics, if any
+        self._metrics = current_metrics()
+        self._thread = threading.Thread(target=self._run, name="row-render", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _rows(self):
+        engine = self._engine
+        cols = engine.grid["cols"] if engine.grid else 0
+        for page_index in range(engine.page_count):
+            start, end = engine.page_range(page_index)
+            for row_start in range(start, end, cols):
+                yield engine.specs[row_start:min(row_start + cols, end)]
+
+    def _run(self):
+        engine = self._engine
+        submit = getattr(engine.frame_source, "submit", None)
+        rows = self._rows()
+        pending = deque()
+        last = None
+        try:
+            with collect_metrics(self._metrics):
+                while True:
+                    if self._stop.is_set() or (self._cancelled is not None and self._cancelled()):
+                        raise RenderCancelled()
+                    if submit is None:
+                        specs = next(rows, None)
+                        if specs is None:
+                            return
+                        frames = engine.row_frames(specs)
+                    else:
+                        # The next rows render in the pool while this one is collected
+                        while len(pending) < self._rows_ahead:
+                            specs = next(rows, None)
+                            if specs is None:
+                                break
+                            last = submit(specs, engine.dpi, last)
+                            pending.append((specs, last))
+                        if not pending:
+                            return
+                        specs, frames = pending.popleft()
+                        frames = frames.result()
+                    if not self._put((specs, frames)):
+                        return
+        except BaseException as e:
+            self._put(e)
+        finally:
+            for _, submitted in pending:
+                submitted.discard()
+
+    def _put(self, item):
+        # Gives up once the consumer has gone, instead of blocking forever
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def take(self, specs):
+        item = self._queue.get()
+        if isinstance(item, BaseException):
+            raise item
+        row_specs, frames = item
+        if row_specs != specs:
+            raise RuntimeError("rows taken out of order")
+        self.frames_taken += len(frames)
+        return frames
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
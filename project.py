@@ -0,0 +1,150 @@
+import io
+import json
+import os
+import zipfile
+
+from PIL import Image
+
+import processor
+
+PROJECT_EXT = ".filmproj"
+FORMAT_NAME = "filmlayout-project"
+FORMAT_VERSION = 1
+
+# Resolution of the stored preview proxies (a frame is about 210x200 px)
+PROXY_DPI = 150
+
+DEFAULT_SETTINGS = {
+    "paper_size": "A4",
+    "orientation": "Auto",
+    "margin_mm": 10,
+    "gap_mm": 2,
+    "dpi": 1200,
+    "mode": "raster",
+    "compression": "flate",
+    "jpeg_quality": 90,
+    "output_profile": processor.DEFAULT_OUTPUT_PROFILE,
+    "intent": "perceptual",
+}
+
+def save_project(path, specs, settings, proxies=None):
+    """
+    Writes a project file: a zip holding project.json (ordered frame specs
+    and settings, in the same shape as a batch.py job) and one small JPEG
+    proxy of every frame. Proxies already in `proxies` (spec -> frame image)
+    are reused, so unchanged frames do not touch their sources again.
+    specs: frame specs (image_path, crop_mode, color_mode, film_type, rotation, contrast)
+    settings: layout and export settings, see DEFAULT_SETTINGS
+    returns: dict spec -> proxy image of every frame
+    """
+    proxies = dict(proxies or {})
+    missing = [spec for spec in dict.fromkeys(specs) if spec not in proxies]
+    if missing:
+        frames = processor.render_frames(missing, dpi=PROXY_DPI, quality="preview")
+        proxies.update(zip(missing, frames))
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    names = {}
+    photos = []
+    for spec in specs:
+        if spec not in names:
+            names[spec] = f"proxies/{len(names):04d}.jpg"
+        photos.append({
+            "path": _relative_path(spec[0], base_dir),
+            "crop": spec[1],
+            "color": spec[2],
+            "type": spec[3],
+            "rotation": spec[4],
+            "contrast": spec[5] if len(spec) > 5 else 0,
+            "proxy": names[spec],
+        })
+    manifest = {"format": FORMAT_NAME, "version": FORMAT_VERSION, "proxy_dpi": PROXY_DPI}
+    manifest.update({k: settings.get(k, v) for k, v in DEFAULT_SETTINGS.items()})
+    manifest["photos"] = photos
+
+    # Written next to the target and swapped in, so a failed save keeps the old file
+    tmp_path = path + ".tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, "w") as zf:
+            zf.writestr("project.json", json.dumps(manifest, indent=1, ensure_ascii=False), zipfile.ZIP_DEFLATED)
+            for spec, name in names.items():
+                buf = io.BytesIO()
+                proxies[spec].save(buf, "JPEG", quality=85)
+                zf.writestr(name, buf.getvalue())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {spec: proxies[spec] for spec in names}
+
+def load_project(path):
+    """
+    Reads a project file. Only the proxies are decoded; the source photos
+    are not opened.
+    returns: (specs, settings, proxies) with proxies a dict spec -> frame image
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("project.json"))
+        if manifest.get("format") != FORMAT_NAME:
+            raise ValueError("not a film layout project")
+        if manifest.get("version", 0) > FORMAT_VERSION:
+            raise ValueError(f"project version {manifest['version']} is newer than supported")
+
+        specs = []
+        proxies = {}
+        for photo in manifest["photos"]:
+            spec = (
+                os.path.normpath(os.path.join(base_dir, photo["path"])),
+                photo.get("crop", "short"),
+                photo.get("color", "color"),
+                photo.get("type", "positive"),
+                int(photo.get("rotation", 0)),
+                int(photo.get("contrast", 0)),
+            )
+            specs.append(spec)
+            if spec not in proxies and photo.get("proxy"):
+                with Image.open(io.BytesIO(zf.read(photo["proxy"]))) as img:
+                    proxies[spec] = img.convert("RGB")
+
+    settings = {k: manifest.get(k, v) for k, v in DEFAULT_SETTINGS.items()}
+    return specs, settings, proxies
+
+def _relative_path(image_path, base_dir):
+    # Relative paths keep a project and its photos movable together
+    try:
+        return os.path.relpath(image_path, base_dir)
+    except ValueError: # Different drive on Windows
+        return os.path.abspath(image_path)
+
+def proxy_frame_source(proxies, fallback):
+    """
+    Wraps a LayoutEngine frame_source so frames with a proxy are scaled from
+    it instead of being rendered from the source photo. An edited frame no
+    longer matches its proxy's spec and is rendered by `fallback`.
+    proxies: dict spec -> proxy frame, may be updated later
+    """
+    def scaled(proxy, dpi):
+        size = (processor.mm_to_px(processor.FRAME_W_MM, dpi), processor.mm_to_px(processor.FRAME_H_MM, dpi))
+        return proxy if proxy.size == size else proxy.resize(size, Image.Resampling.BILINEAR)
+
+    def source(spec, dpi):
+        proxy = proxies.get(spec)
+        if proxy is not None:
+            return scaled(proxy, dpi)
+        return fallback(spec, dpi)
+
+    def many(specs, dpi):
+        # Looked up once, so a concurrent clear() cannot split a page
+        found = {spec: proxies.get(spec) for spec in specs}
+        missing = [spec for spec, proxy in found.items() if proxy is None]
+        rendered = {}
+        if missing:
+            if hasattr(fallback, "many"):
+                rendered = dict(zip(missing, fallback.many(missing, dpi)))
+            else:
+                rendered = {spec: fallback(spec, dpi) for spec in missing}
+        return [rendered[spec] if found[spec] is None else scaled(found[spec], dpi) for spec in specs]
+
+    source.many = many
+    return source
@@ -1,8 +1,11 @@
 import streamlit as st
 import processor
+import pdfwriter
 from PIL import Image
 import io
 import os
+import hashlib
+import tempfile
 
 st.set_page_config(page_title="35mm 胶片排版工具", layout="wide")
 
@@ -10,15 +13,77 @@ st.title("35mm 胶片排版工具")
 
 # 初始化 session_state
 if 'images_data' not in st.session_state:
-    st.session_state.images_data = [] # List of dicts: {"file": UploadedFile, "name": str, "crop": str, "color": str, "type": str, "rotation": int}
+    st.session_state.images_data = [] # List of dicts: {"file": HashedBytes, "hash": str, "thumb": bytes, "name": str, "crop": str, "color": str, "type": str, "rotation": int, "contrast": int}
+if 'seen_uploads' not in st.session_state:
+    st.session_state.seen_uploads = set() # 已处理过的上传 file_id，每个上传只读取和计算哈希一次
+
+@st.cache_data(max_entries=8, show_spinner="正在生成 PDF...")
+def build_pdf(signature, _layout):
+    """
+    按排版签名（照片内容哈希 + 各项设置）缓存 PDF 字节，签名不变的重跑直接复用。
+    returns: (PDF 字节, 各阶段耗时摘要)
+    """
+    vector, compression, jpeg_quality, color_target = signature[-1]
+    pdf_buffer = io.BytesIO()
+    with processor.collect_metrics() as metrics:
+        if vector:
+            pdfwriter.write_vector_pdf(pdf_buffer, **_layout, compression=compression, jpeg_quality=jpeg_quality, color_target=color_target)
+        else:
+            engine = processor.LayoutEngine(processor.frame_source("full", workers=None, color_target=color_target), max_pages=0)
+            engine.update(**_layout)
+            # 各条带在线程池中并行压缩，按页序写入；非 sRGB 输出时嵌入输出配置文件
+            pdfwriter.write_layout_pdf(pdf_buffer, engine, compression=compression, jpeg_quality=jpeg_quality,
+                                       icc_profile=processor.output_profile_bytes(color_target))
+    return pdf_buffer.getvalue(), metrics.breakdown(5)
+
+@st.cache_data(max_entries=2000, show_spinner=False)
+def thumbnail(digest, _data):
+    """
+    按内容哈希缓存的列表缩略图（JPEG 字节，仅几 KB），代替原图发送到浏览器。
+    """
+    buf = io.BytesIO()
+    processor.make_thumbnail(_data).save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+def saved_profile(data):
+    """
+    把上传的 ICC 配置文件按内容哈希存入临时目录，返回其路径（同一内容路径不变，签名缓存可复用）。
+    """
+    path = os.path.join(tempfile.gettempdir(), f"filmlayout-{hashlib.sha1(data).hexdigest()}.icc")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+def layout_signature(layout, export):
+    specs = tuple((spec[0].digest,) + tuple(spec[1:]) for spec in layout["specs"])
+    settings = tuple(v for k, v in layout.items() if k != "specs")
+    return specs, settings, export
 
 # 侧边栏：全局设置
 st.sidebar.header("全局设置")
-paper_size = st.sidebar.selectbox("纸张大小", ["A4", "A5", "A6"], index=0)
+paper_size = st.sidebar.selectbox("纸张大小", ["A4", "A5", "A6", "卷筒纸"], index=0)
+if paper_size == "卷筒纸":
+    # 卷筒纸宽度固定，长度随照片数量增长；导出时逐条胶片写入
+    paper_size = processor.roll_paper(st.sidebar.number_input("卷宽 (mm)", min_value=50, max_value=2000, value=processor.DEFAULT_ROLL_WIDTH_MM))
 orientation = st.sidebar.selectbox("纸张方向", ["Auto", "Portrait", "Landscape"], index=0)
 margin_mm = st.sidebar.slider("页边距 (mm)", 0, 50, 10)
 gap_mm = st.sidebar.slider("照片间隙 (mm)", 0, 20, 2)
 dpi = st.sidebar.number_input("DPI (影响 PDF 质量和大小)", min_value=72, max_value=600, value=300)
+vector_pdf = st.sidebar.checkbox("矢量 PDF (胶片底与齿孔为路径，照片按原始精度嵌入)", value=False)
+compression = st.sidebar.selectbox("图像压缩", pdfwriter.COMPRESSIONS, format_func={"flate": "无损 (Flate)", "jpeg": "JPEG (文件更小)"}.get)
+jpeg_quality = st.sidebar.slider("JPEG 质量", 50, 100, pdfwriter.DEFAULT_JPEG_QUALITY, disabled=compression != "jpeg")
+
+# 色彩管理：照片从其嵌入的 ICC 配置文件转换到输出配置文件（默认 sRGB）
+profile_upload = st.sidebar.file_uploader("输出 ICC 配置文件 (留空为 sRGB)", type=["icc", "icm"])
+intent = st.sidebar.selectbox("渲染意图", list(processor.RENDERING_INTENTS), format_func={
+    "perceptual": "感知", "relative": "相对比色", "saturation": "饱和度", "absolute": "绝对比色"}.get)
+try:
+    color_target = processor.color_target(saved_profile(profile_upload.getvalue()) if profile_upload else processor.DEFAULT_OUTPUT_PROFILE, intent)
+except (OSError, ValueError) as e:
+    st.sidebar.error(f"无法使用该配置文件: {e}")
+    color_target = processor.color_target(processor.DEFAULT_OUTPUT_PROFILE, intent)
+soft_proof = st.sidebar.checkbox("预览软打样 (模拟输出配置文件)", value=False, disabled=profile_upload is None)
 
 st.sidebar.divider()
 if st.sidebar.button("清空所有照片"):
@@ -33,16 +98,25 @@ with col_settings:
     uploaded_files = st.file_uploader("添加照片", type=["jpg", "jpeg", "png", "webp"], accept_multiple_files=True)
 
     if uploaded_files:
-        # 将新上传的文件添加到 session_state
+        # 将新上传的文件添加到 session_state；按内容哈希去重，同名的不同照片不会冲突
+        known = {d['hash'] for d in st.session_state.images_data}
         for uploaded_file in uploaded_files:
-            if not any(d['name'] == uploaded_file.name for d in st.session_state.images_data):
+            if uploaded_file.file_id in st.session_state.seen_uploads:
+                continue
+            st.session_state.seen_uploads.add(uploaded_file.file_id)
+            data = processor.HashedBytes(uploaded_file.getvalue())
+            if data.digest not in known:
+                known.add(data.digest)
                 st.session_state.images_data.append({
-                    "file": uploaded_file,
+                    "file": data,
+                    "hash": data.digest,
+                    "thumb": thumbnail(data.digest, data),
                     "name": uploaded_file.name,
                     "crop": "short",
                     "color": "color",
                     "type": "positive",
-                    "rotation": 0
+                    "rotation": 0,
+                    "contrast": 0
                 })
 
     if st.session_state.images_data:
@@ -55,15 +129,16 @@ with col_settings:
                     # 紧凑布局
                     c_img, c_ctrl = st.columns([1, 2])
                     with c_img:
-                        st.image(img_data['file'], use_container_width=True)
+                        st.image(img_data['thumb'], use_container_width=True)
                         if st.button("移除", key=f"remove_{i}"):
                             st.session_state.images_data.pop(i)
                             st.rerun()
                     with c_ctrl:
                         img_data['crop'] = st.selectbox("裁剪", ["short", "long"], index=0 if img_data['crop'] == "short" else 1, key=f"crop_{i}")
-                        img_data['color'] = st.selectbox("颜色", ["color", "bw"], index=0 if img_data['color'] == "color" else 1, key=f"color_{i}")
-                        img_data['type'] = st.selectbox("类型", ["positive", "negative"], index=0 if img_data['type'] == "positive" else 1, key=f"type_{i}")
+                        img_data['color'] = st.selectbox("颜色", processor.COLOR_MODES, index=processor.COLOR_MODES.index(img_data['color']), key=f"color_{i}")
+                        img_data['type'] = st.selectbox("类型", processor.FILM_TYPES, index=processor.FILM_TYPES.index(img_data['type']), key=f"type_{i}")
                         img_data['rotation'] = st.selectbox("旋转", [0, 90, 180, 270], index=[0, 90, 180, 270].index(img_data.get('rotation', 0)), key=f"rot_{i}")
+                        img_data['contrast'] = st.slider("对比度 (%)", *processor.CONTRAST_RANGE, img_data.get('contrast', 0), step=5, key=f"contrast_{i}")
 
         # 排序功能
         if len(st.session_state.images_data) > 1:
@@ -85,54 +160,57 @@ with col_preview:
         
         if col_pre_btn.button("✨ 生成/更新预览", use_container_width=True, type="primary"):
             with st.spinner("正在处理照片..."):
-                frames = []
-                for item in st.session_state.images_data:
-                    item['file'].seek(0)
-                    frame = processor.create_film_frame(
-                        item["file"], 
-                        crop_mode=item["crop"], 
-                        color_mode=item["color"], 
-                        film_type=item["type"],
-                        rotation=item.get("rotation", 0),
-                        draw_holes=False,
-                        dpi=dpi
+                specs = [(item["file"], item["crop"], item["color"], item["type"], item.get("rotation", 0), item.get("contrast", 0))
+                         for item in st.session_state.images_data]
+                # 卷筒纸整卷是一张图，按长度降低预览 DPI；排版仍按导出 DPI 计算，与导出一致
+                preview_dpi = processor.roll_preview_dpi(dpi, len(specs), paper_size, orientation, margin_mm, gap_mm, layout_dpi=dpi)
+                with processor.collect_metrics() as metrics:
+                    # 多进程并行渲染，重复的照片只渲染一次
+                    frames = processor.render_frames(specs, dpi=preview_dpi, quality="preview", workers=None,
+                                                     color_target=processor.preview_color_target(color_target, soft_proof))
+                    
+                    pages, layout_info = processor.layout_on_paper(
+                        frames, 
+                        paper_size=paper_size, 
+                        orientation=orientation, 
+                        margin_mm=margin_mm, 
+                        gap_mm=gap_mm,
+                        dpi=preview_dpi,
+                        layout_dpi=dpi
                     )
-                    frames.append(frame)
-                
-                pages, layout_info = processor.layout_on_paper(
-                    frames, 
-                    paper_size=paper_size, 
-                    orientation=orientation, 
-                    margin_mm=margin_mm, 
-                    gap_mm=gap_mm,
-                    dpi=dpi
-                )
                 
                 if pages:
                     st.session_state.pages = pages
+                    st.session_state.preview_metrics = metrics
                     st.session_state.last_dpi = dpi
+                    st.session_state.last_layout = dict(
+                        specs=specs,
+                        paper_size=paper_size,
+                        orientation=orientation,
+                        margin_mm=margin_mm,
+                        gap_mm=gap_mm,
+                        dpi=dpi
+                    )
                 else:
                     st.error("生成的页面为空。")
 
         if 'pages' in st.session_state:
-            # 导出 PDF
-            pdf_buffer = io.BytesIO()
-            st.session_state.pages[0].save(
-                pdf_buffer, 
-                format='PDF', 
-                save_all=True, 
-                append_images=st.session_state.pages[1:],
-                resolution=st.session_state.last_dpi
-            )
+            # 导出 PDF（逐页压缩写入）；预览页为快速画质，导出时按完整画质重新渲染。
+            # 每个排版只编码一次，切换选项或翻页引起的重跑直接使用缓存
+            layout = st.session_state.last_layout
+            pdf_bytes, pdf_breakdown = build_pdf(layout_signature(layout, (vector_pdf, compression, jpeg_quality, color_target)), layout)
             
             col_pdf_btn.download_button(
                 label="📥 下载 PDF",
-                data=pdf_buffer.getvalue(),
+                data=pdf_bytes,
                 file_name="film_layout.pdf",
                 mime="application/pdf",
                 use_container_width=True
             )
 
+            # 各阶段耗时（解码、缩放、旋转、色彩、粘贴、齿孔、编码）
+            st.caption(f"预览渲染 {st.session_state.preview_metrics.breakdown(5)} · PDF 生成 {pdf_breakdown}")
+
             if st.session_state.get('last_dpi') != dpi:
                 st.warning("DPI 已更改，请重新生成预览以更新导出文件。")
 
@@ -1,7 +1,12 @@
+import io
+import os
 import processor
 from PIL import Image
 
-def test_generate():
+def test_generate(tmp_path=None):
+    # Under pytest the outputs go to a temporary directory; run as a script they are kept here
+    out = str(tmp_path) if tmp_path is not None else "."
+    src = os.path.join(out, "test_input.jpg")
     # Create a dummy image (Gradient)
     img = Image.new('RGB', (1000, 600), color='red')
     # Add some detail
@@ -9,40 +14,838 @@ def test_generate():
     draw = ImageDraw.Draw(img)
     draw.rectangle([100, 100, 400, 400], fill='blue')
     draw.ellipse([500, 100, 800, 400], fill='green')
-    img.save("test_input.jpg")
+    img.save(src)
     
     # 1. Test short side (Fill) - Default
-    frame1 = processor.create_film_frame("test_input.jpg", crop_mode='short')
-    frame1.save("test_frame_fill.png")
+    frame1 = processor.create_film_frame(src, crop_mode='short')
+    frame1.save(os.path.join(out, "test_frame_fill.png"))
     print("Saved test_frame_fill.png")
     
     # 2. Test long side (Fit)
-    frame2 = processor.create_film_frame("test_input.jpg", crop_mode='long')
-    frame2.save("test_frame_fit.png")
+    frame2 = processor.create_film_frame(src, crop_mode='long')
+    frame2.save(os.path.join(out, "test_frame_fit.png"))
     print("Saved test_frame_fit.png")
 
     # 3. Test BW
-    frame3 = processor.create_film_frame("test_input.jpg", color_mode='bw')
-    frame3.save("test_frame_bw.png")
+    frame3 = processor.create_film_frame(src, color_mode='bw')
+    frame3.save(os.path.join(out, "test_frame_bw.png"))
     print("Saved test_frame_bw.png")
 
     # 4. Test Negative
-    frame4 = processor.create_film_frame("test_input.jpg", film_type='negative')
-    frame4.save("test_frame_neg.png")
+    frame4 = processor.create_film_frame(src, film_type='negative')
+    frame4.save(os.path.join(out, "test_frame_neg.png"))
     print("Saved test_frame_neg.png")
 
     # 5. Test Rotation
-    frame5 = processor.create_film_frame("test_input.jpg", rotation=90)
-    frame5.save("test_frame_rot90.png")
+    frame5 = processor.create_film_frame(src, rotation=90)
+    frame5.save(os.path.join(out, "test_frame_rot90.png"))
     print("Saved test_frame_rot90.png")
     
     # Layout test
     frames = [frame1, frame2, frame3, frame4, frame5] * 8
     pages, info = processor.layout_on_paper(frames, paper_size="A4")
     for i, page in enumerate(pages):
-        page.save(f"test_page_{i}.png")
+        page.save(os.path.join(out, f"test_page_{i}.png"))
         print(f"Saved test_page_{i}.png")
 
+def test_frame_cache(tmp_path):
+    src = tmp_path / "cache_input.jpg"
+    Image.new('RGB', (600, 400), color='red').save(src)
+
+    cache = processor.FrameCache()
+    specs = [
+        dict(crop_mode='short'),
+        dict(crop_mode='long'),
+        dict(color_mode='bw'),
+        dict(film_type='negative'),
+        dict(rotation=90),
+    ] * 8
+    frames = [cache.get(str(src), draw_holes=False, **spec) for spec in specs]
+    assert cache.misses == 5
+    assert cache.hits == 35
+    assert frames[0] is frames[5]
+
+    # Touching the file invalidates its entries
+    os.utime(src, ns=(0, 0))
+    cache.get(str(src), draw_holes=False)
+    assert cache.misses == 6
+
+    # The byte budget evicts least recently used frames; RGB is stored at 4 bytes per pixel
+    frame_bytes = frames[0].width * frames[0].height * 4
+    assert cache.nbytes == len(cache) * frame_bytes
+    cache.max_bytes = frame_bytes * 2
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+
+def test_layout_engine_dirty_pages():
+    colors = ['red', 'green', 'blue', 'white', 'gray', 'yellow']
+    size = (processor.mm_to_px(processor.FRAME_W_MM), processor.mm_to_px(processor.FRAME_H_MM))
+    rendered = []
+
+    def frame_source(spec, dpi):
+        rendered.append(spec)
+        return Image.new('RGB', size, color=spec)
+
+    specs = [colors[i % len(colors)] for i in range(60)]
+    engine = processor.LayoutEngine(frame_source)
+    engine.update(specs, paper_size="A5")
+    fpp = engine.grid["frames_per_page"]
+    assert engine.page_count > 3
+    # Nothing is rasterized until a page is requested
+    assert rendered == []
+
+    expected, info = processor.layout_on_paper([Image.new('RGB', size, color=c) for c in specs], paper_size="A5")
+    assert engine.render_page(1).tobytes() == expected[1].tobytes()
+    assert engine.all_layout_info() == info
+    assert len(rendered) == fpp
+
+    # Changing one frame only dirties its page
+    engine.render_page(0)
+    specs[fpp + 1] = 'black'
+    assert engine.update(specs, paper_size="A5") == [1]
+    assert not engine.is_dirty(0)
+
+    # Moving a frame dirties the pages between its old and new position
+    specs.insert(2 * fpp + 1, specs.pop(1))
+    assert engine.update(specs, paper_size="A5") == [0, 1, 2]
+
+    # Changing settings dirties everything
+    assert engine.update(specs, paper_size="A5", margin_mm=5) == list(range(engine.page_count))
+
+    # A cancelled render leaves the page dirty
+    try:
+        engine.render_page(0, cancelled=lambda: True)
+        assert False, "render was not cancelled"
+    except processor.RenderCancelled:
+        pass
+    assert engine.is_dirty(0)
+
+    # A new color target swaps the frame source inside update() and dirties everything
+    targets = []
+    def source_factory(target):
+        targets.append(target)
+        return lambda spec, dpi: Image.new('RGB', size, color='white')
+    engine = processor.LayoutEngine(frame_source, source_factory=source_factory)
+    engine.update(specs, paper_size="A5", color_target=processor.DEFAULT_COLOR_TARGET)
+    engine.render_page(0)
+    assert engine.update(specs, paper_size="A5", color_target=processor.DEFAULT_COLOR_TARGET) == []
+    assert engine.update(specs, paper_size="A5", color_target=("sRGB", "relative", False)) == list(range(engine.page_count))
+    assert targets == [processor.DEFAULT_COLOR_TARGET, ("sRGB", "relative", False)]
+    before = len(rendered)
+    engine.render_page(0)
+    assert len(rendered) == before
+
+def test_pdf_writer_streams_pages(tmp_path):
+    import re
+    import zlib
+    import pdfwriter
+
+    pages = [Image.new('RGB', (300, 200), color=c) for c in ('red', 'blue')]
+    pages[1].paste('white', (10, 10, 50, 50))
+    path = tmp_path / "out.pdf"
+    assert pdfwriter.write_pdf(str(path), iter(pages), dpi=150) == 2
+
+    data = path.read_bytes()
+    assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
+    assert b"/Count 2" in data
+    # 300 x 200 px at 150 DPI is 144 x 96 pt
+    assert b"/MediaBox [0 0 144.0000 96.0000]" in data
+
+    streams = re.findall(rb"/Filter /FlateDecode /Length \d+ 0 R >>\nstream\n(.*?)\nendstream", data, re.S)
+    assert [zlib.decompress(s) for s in streams] == [p.tobytes() for p in pages]
+
+    # Every xref offset points at its object
+    xref = int(data.rsplit(b"startxref", 1)[1].split()[0])
+    entries = data[xref:].split(b"\n")[3:]
+    for obj_id, entry in enumerate(entries[:data.count(b" 0 obj")], start=1):
+        offset = int(entry.split()[0])
+        assert data[offset:].startswith(b"%d 0 obj" % obj_id)
+
+def test_vector_pdf_embeds_each_photo_once(tmp_path):
+    import pdfwriter
+
+    src = tmp_path / "vector_input.png"
+    # 720 px across 36 mm is about 508 DPI
+    Image.new('RGB', (720, 480), color='green').save(src)
+    specs = [(str(src), 'short', 'color', 'positive', 0), (str(src), 'short', 'bw', 'positive', 0)] * 20
+
+    path = tmp_path / "vector.pdf"
+    assert pdfwriter.write_vector_pdf(str(path), specs, paper_size="A5", dpi=1200) > 1
+    data = path.read_bytes()
+    assert data.count(b"/Subtype /Image") == 2
+    # The photo is embedded at its native density rather than the requested 1200 DPI
+    assert b"/Width 720 /Height 480" in data
+
+    # Rendered on the pool, the same file as rendering each photo in turn; a cancel leaves no blocks behind
+    specs = [(str(src), 'short', 'color', 'positive', 0, c) for c in range(0, 60, 5)] * 2
+    pdfwriter.write_vector_pdf(str(path), specs, paper_size="A6", dpi=150, workers=1)
+    serial = path.read_bytes()
+    pdfwriter.write_vector_pdf(str(path), specs, paper_size="A6", dpi=150, workers=2)
+    assert path.read_bytes() == serial
+    blocks = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    calls = []
+    try:
+        pdfwriter.write_vector_pdf(str(path), specs, paper_size="A6", dpi=150, workers=2,
+                                   progress=lambda *a: calls.append(a), cancelled=lambda: len(calls) == 1)
+        assert False, "export was not cancelled"
+    except processor.RenderCancelled:
+        pass
+    processor.render_frames(specs[:3], dpi=100, workers=2, cache=processor.FrameCache())
+    if os.path.isdir("/dev/shm"):
+        assert set(os.listdir("/dev/shm")) <= blocks
+
+def test_preview_quality_tier(tmp_path):
+    from PIL import ImageChops, ImageDraw, ImageStat
+
+    src = tmp_path / "large.jpg"
+    img = Image.new('RGB', (3000, 2000), color='navy')
+    ImageDraw.Draw(img).ellipse([600, 400, 2400, 1600], fill='orange')
+    img.save(src, quality=90)
+
+    for rotation in (0, 90):
+        full = processor.create_film_frame(str(src), rotation=rotation, quality='full')
+        preview = processor.create_film_frame(str(src), rotation=rotation, quality='preview')
+        assert preview.size == full.size
+        diff = ImageStat.Stat(ImageChops.difference(full, preview)).mean
+        assert max(diff) < 3
+
+    cache = processor.FrameCache()
+    cache.get(str(src), quality='preview')
+    cache.get(str(src), quality='full')
+    assert cache.misses == 2
+
+def test_render_frames_parallel(tmp_path):
+    paths = []
+    for i, color in enumerate(['red', 'green', 'blue']):
+        paths.append(str(tmp_path / f"parallel_{i}.png"))
+        Image.new('RGB', (400 + 100 * i, 300), color=color).save(paths[-1])
+    with open(paths[0], 'rb') as f:
+        upload = f.read()
+    specs = [(p, 'short', 'color', 'positive', 90 * i) for i, p in enumerate(paths)] * 3
+    specs.append((upload, 'long', 'bw', 'negative', 0))
+
+    cache = processor.FrameCache()
+    frames = processor.render_frames(specs, dpi=150, workers=2, cache=cache)
+    assert len(cache) == 4
+    expected = [processor.create_film_frame(*spec, draw_holes=False, dpi=150) for spec in specs]
+    assert [f.tobytes() for f in frames] == [f.tobytes() for f in expected]
+
+    # A failed frame still frees the blocks of the frames rendered after it
+    blocks = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    import threading
+    broken = [(paths[0], 'short', 'color', 'positive', 0, threading.Lock())]
+    try:
+        processor.render_frames(broken + specs[:3], dpi=100, workers=2, cache=processor.FrameCache())
+    except TypeError:
+        pass
+    else:
+        assert False, "a spec that cannot be sent to the workers should fail"
+    # Pool tasks run in order, so the abandoned frames are done once these are
+    processor.render_frames(specs[:3], dpi=100, workers=2, cache=processor.FrameCache())
+    if os.path.isdir("/dev/shm"):
+        assert set(os.listdir("/dev/shm")) <= blocks
+
+def test_strip_tile_matches_drawn_holes():
+    for dpi in (150, 300, 1200):
+        # One frame (less than a tile), three frames and a long roll strip (several tiles)
+        for width_mm in (36, 3 * 36 + 2 * 2, 16 * 36 + 15 * 2):
+            width = processor.mm_to_px(width_mm, dpi)
+            height = processor.mm_to_px(processor.FRAME_H_MM, dpi) + 1
+            drawn = Image.new('RGB', (width + 1, height), color='black')
+            processor.draw_sprocket_holes(drawn, 0, 0, width, dpi)
+            pasted = Image.new('RGB', (width + 1, height), color='black')
+            processor.paste_strip_holes(pasted, 0, 0, width, dpi)
+            assert drawn.tobytes() == pasted.tobytes()
+    # One small tile per DPI, whatever the strip width
+    assert processor.strip_tile(1200) is processor.strip_tile(1200)
+    assert processor.strip_tile(1200).width < processor.mm_to_px(8 * processor.SPROCKET_HOLE_PITCH_MM, 1200)
+
+def test_resize_first_pipeline_matches_full_size_pipeline(tmp_path):
+    from PIL import ImageChops, ImageDraw, ImageOps, ImageStat
+
+    src = tmp_path / "pipeline.png"
+    img = Image.new('RGB', (900, 500), color='teal')
+    ImageDraw.Draw(img).rectangle([100, 50, 300, 450], fill='yellow')
+    img.save(src)
+    img_w = processor.mm_to_px(processor.IMAGE_W_MM)
+    img_h = processor.mm_to_px(processor.IMAGE_H_MM)
+
+    for crop_mode in ('short', 'long'):
+        for rotation in (0, 90, 180, 270):
+            # Reference: rotate, process and resize the whole image, then crop
+            ref = ImageOps.invert(img.rotate(rotation, expand=True).convert('L').convert('RGB'))
+            box, size, offset = processor.plan_frame(img.width, img.height, crop_mode, rotation, img_w, img_h)
+            out_w, out_h = size[::-1] if rotation in (90, 270) else size
+            if crop_mode == 'short':
+                ratio = ref.width / ref.height
+                new_w, new_h = (int(img_h * ratio), img_h) if ratio > img_w / img_h else (img_w, int(img_w / ratio))
+                ref = ref.resize((new_w, new_h), Image.Resampling.LANCZOS)
+                left, top = (new_w - img_w) // 2, (new_h - img_h) // 2
+                ref = ref.crop((left, top, left + img_w, top + img_h))
+            else:
+                ref = ref.resize((out_w, out_h), Image.Resampling.LANCZOS)
+            expected = Image.new('RGB', (img_w, img_h), color='black')
+            expected.paste(ref, offset)
+
+            canvas = processor.create_frame_image(str(src), crop_mode, 'bw', 'negative', rotation)
+            assert max(ImageStat.Stat(ImageChops.difference(canvas, expected)).mean) < 0.5
+
+def test_page_bands_match_full_page(tmp_path):
+    import pdfwriter
+
+    src = tmp_path / "band.png"
+    Image.new('RGB', (600, 400), color='orange').save(src)
+    specs = [(str(src), 'short', 'color', 'positive', i % 4 * 90) for i in range(7)]
+    engine = processor.LayoutEngine(processor.frame_source(workers=1), max_pages=0)
+    engine.update(specs, paper_size='A6', margin_mm=5, gap_mm=3, dpi=150)
+    page = engine.render_page(0)
+
+    for band_height in (1, 37, engine.grid["frame_h"], page.height):
+        stitched = Image.new('RGB', page.size)
+        for y, band in engine.iter_page_bands(0, band_height):
+            assert band.width == page.width and band.height <= band_height
+            stitched.paste(band, (0, y))
+        assert stitched.tobytes() == page.tobytes()
+
+    pdf = tmp_path / "bands.pdf"
+    assert pdfwriter.write_layout_pdf(str(pdf), engine) == engine.page_count
+    assert pdf.read_bytes().count(b"/Type /Page ") == engine.page_count
+
+def test_batch_manifest(tmp_path):
+    import json
+    import batch
+
+    Image.new('RGB', (600, 400), color='purple').save(tmp_path / "a.jpg")
+    Image.new('RGB', (400, 600), color='olive').save(tmp_path / "b.jpg")
+    photos = ["a.jpg", {"path": "b.jpg", "color": "bw", "rotation": 90}]
+    manifest = tmp_path / "jobs.json"
+    manifest.write_text(json.dumps({"jobs": [
+        {"name": "first", "output": "out/first.pdf", "photos": photos, "paper_size": "A6", "dpi": 150},
+        {"name": "repeat", "output": "out/repeat.pdf", "photos": photos * 3, "paper_size": "A6", "dpi": 150},
+        {"name": "vector", "output": "out/vector.pdf", "photos": photos, "mode": "vector", "dpi": 150},
+        {"name": "missing", "output": "out/missing.pdf", "photos": ["nope.jpg"]},
+        {"name": "nofit", "output": "out/nofit.pdf", "photos": photos, "paper_size": "A6", "margin_mm": 80},
+    ]}))
+    report_path = tmp_path / "report.json"
+    broken = tmp_path / "broken.json"
+    broken.write_text("{not json")
+
+    # An unreadable manifest is reported and the jobs after it still run
+    assert batch.main([str(broken), str(manifest), "--workers", "1", "--report", str(report_path)]) == 1
+    reports = {r["name"]: r for r in json.loads(report_path.read_text())}
+    assert reports[str(broken)]["status"] == "error"
+    assert [reports[n]["status"] for n in ("first", "repeat", "vector", "missing", "nofit")] == ["ok", "ok", "ok", "error", "error"]
+    assert not (tmp_path / "out" / "nofit.pdf").exists()
+    # The second job reuses the frames decoded for the first one
+    assert reports["repeat"]["cached"] >= 2
+    for name in ("first", "repeat", "vector"):
+        assert (tmp_path / "out" / f"{name}.pdf").read_bytes().startswith(b"%PDF")
+    assert not (tmp_path / "out" / "missing.pdf").exists()
+
+    # Typos in photo settings are rejected instead of rendering with a fallback
+    for bad in ({"crop": "fill"}, {"rotation": "left"}, {"color": "grey"}):
+        try:
+            batch.job_specs({"photos": [dict(bad, path="a.jpg")]}, str(tmp_path))
+            assert False, f"accepted {bad}"
+        except ValueError:
+            pass
+
+def test_benchmark_cases(tmp_path):
+    import benchmark
+
+    paths = benchmark.make_corpus(str(tmp_path / "corpus"), sizes=((300, 200), (200, 300), (250, 250)))
+    specs = benchmark.corpus_specs(paths)
+    for bench in benchmark.CASES.values():
+        assert bench(specs, 100, str(tmp_path)) > 0
+
+    baseline = {"results": [{"case": "layout", "dpi": 300, "seconds": 1.0}, {"case": "layout", "dpi": 600, "error": "oom"}]}
+    results = [{"case": "layout", "dpi": 300, "seconds": 1.5}, {"case": "layout", "dpi": 600, "seconds": 2.0}]
+    assert benchmark.compare(results, baseline) == [("layout", 300, 1.0, 1.5, 1.5, True)]
+
+def test_metrics_stages(tmp_path):
+    src = tmp_path / "metrics.jpg"
+    Image.new('RGB', (640, 480), color='navy').save(src)
+    cache = processor.FrameCache()
+
+    processor.create_film_frame(str(src), 'short', 'bw', 'negative', 90, dpi=100)
+    assert processor.current_metrics() is None
+
+    seen = []
+    with processor.collect_metrics(processor.Metrics(lambda *record: seen.append(record[0]))) as metrics:
+        processor.create_film_frame(str(src), 'short', 'bw', 'negative', 90, dpi=100)
+        specs = [(str(src), crop, 'color', 'positive', 0) for crop in ('short', 'long')]
+        processor.render_frames(specs, dpi=100, workers=2, cache=cache)
+    assert processor.current_metrics() is None
+    for name in ("decode", "resize", "rotate", "color", "paste", "holes"):
+        assert metrics.stages[name]["count"] >= 1
+    # Two frames decoded in pool workers plus one in this process
+    assert metrics.stages["decode"]["count"] == 3
+    assert metrics.stages["decode"]["pixels"] == 3 * 640 * 480
+    assert metrics.stages["resize"]["bytes"] > 0
+    assert set(seen) == set(metrics.stages)
+    assert metrics.breakdown(2).count("s") >= 2
+
+def test_hashed_bytes_source_key():
+    import io
+    import pickle
+
+    buf = io.BytesIO()
+    Image.new('RGB', (300, 200), color='gold').save(buf, 'JPEG')
+    a = processor.HashedBytes(buf.getvalue())
+    b = processor.HashedBytes(buf.getvalue())
+    assert a.digest == b.digest == processor.source_key(buf.getvalue())
+    assert processor.source_key(a) == a.digest
+
+    copy = pickle.loads(pickle.dumps(a))
+    assert isinstance(copy, processor.HashedBytes) and copy.digest == a.digest and copy == a
+
+    # Same content under another object (e.g. another upload name) hits the cache
+    cache = processor.FrameCache()
+    processor.render_frames([(a, 'short', 'color', 'positive', 0)], dpi=100, workers=1, cache=cache)
+    processor.render_frames([(b, 'short', 'color', 'positive', 0)], dpi=100, workers=1, cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+def test_make_thumbnail(tmp_path):
+    src = tmp_path / "large.jpg"
+    Image.new('RGB', (3000, 1000), color='coral').save(src)
+    thumb = processor.make_thumbnail(str(src))
+    assert thumb.mode == 'RGB' and max(thumb.size) == processor.THUMBNAIL_SIZE
+    assert abs(thumb.width / thumb.height - 3) < 0.05
+    assert processor.make_thumbnail(src.read_bytes(), size=64).size[0] == 64
+
+def test_fit_dpi():
+    # A4 portrait is 210 x 297 mm: a 827 x 1400 px view is limited by its width
+    dpi = processor.fit_dpi(827, 1400, "A4", "Portrait")
+    assert abs(dpi - 100) < 0.1
+    grid = processor.page_grid("A4", "Portrait", dpi=dpi)
+    assert grid["page_w"] <= 827 and grid["page_h"] <= 1400
+    # Landscape swaps the paper sides
+    assert abs(processor.fit_dpi(1400, 827, "A4", "Landscape") - 100) < 0.1
+
+def test_preview_plan_matches_export():
+    # At 60 DPI whole-pixel margins and gaps fit 40 frames on this A4, the export only 35
+    assert processor.plan_layout(40, "A4", "Auto", 2, 2, dpi=60).frames_per_page == 40
+    for paper_size in ("A4", "A5", "A6", processor.roll_paper(300)):
+        for orientation in ("Auto", "Portrait", "Landscape"):
+            for margin_mm, gap_mm in ((2, 2), (5, 1), (10, 3), (0, 0)):
+                for export_dpi in (300, 1200, 2400):
+                    export = processor.plan_layout(50, paper_size, orientation, margin_mm, gap_mm, dpi=export_dpi)
+                    for preview_dpi in (36, 60, 97, 120):
+                        preview = processor.plan_layout(50, paper_size, orientation, margin_mm, gap_mm, dpi=preview_dpi,
+                                                        layout_dpi=export_dpi)
+                        g = preview.grid
+                        assert (preview.frames_per_page, preview.page_count, g["cols"], g["rows"]) == \
+                            (export.frames_per_page, export.page_count, export.grid["cols"], export.grid["rows"])
+                        assert (g["page_w"] > g["page_h"]) == (export.grid["page_w"] > export.grid["page_h"])
+                        # Every frame stays on the page, so clicks map to the exported frames
+                        if g["cols"]:
+                            x2, y2 = preview.frame_rect(preview.frames_per_page - 1)[2:]
+                            assert x2 <= g["page_w"] and y2 <= g["page_h"]
+                            assert preview.frame_at(0, *preview.frame_rect(g["cols"] - 1)[:2]) == g["cols"] - 1
+
+def test_layout_plan_matches_layout_info():
+    frames = [Image.new('RGB', (processor.mm_to_px(processor.FRAME_W_MM, 50), processor.mm_to_px(processor.FRAME_H_MM, 50)))] * 23
+    for paper_size in ('A4', 'A6'):
+        for orientation in ('Portrait', 'Landscape'):
+            pages, layout_info = processor.layout_on_paper(frames, paper_size, orientation, margin_mm=8, gap_mm=3, dpi=50)
+            plan = processor.plan_layout(len(frames), paper_size, orientation, margin_mm=8, gap_mm=3, dpi=50)
+            assert plan.page_count == len(pages) and plan.page_size == pages[0].size
+            for p, page_info in enumerate(layout_info):
+                assert plan.page_info(p) == page_info
+                for info in page_info:
+                    x1, y1, x2, y2 = info["rect"]
+                    assert plan.page_of(info["index"]) == p and plan.frame_rect(info["index"]) == info["rect"]
+                    assert plan.frame_at(p, (x1 + x2) / 2, (y1 + y2) / 2) == info["index"]
+            # Margins, gaps and empty slots on the last page hit nothing
+            assert plan.frame_at(0, 1, 1) is None
+            x1, y1, x2, y2 = plan.frame_rect(0)
+            assert plan.frame_at(0, x2 + 1, y1 + 1) is None
+            last = plan.page_count - 1
+            assert plan.frame_at(last, *plan.frame_rect(plan.frames_per_page - 1)[:2]) is None
+
+    plans = processor.plan_layouts(500, margins_mm=range(0, 51), dpi=1200)
+    assert len(plans) == 3 * 2 * 51
+    assert plans[("A5", "Landscape", 8)].page_count == processor.plan_layout(500, "A5", "Landscape", 8, dpi=1200).page_count
+
+    # Layouts without room for a frame have no pages and no frames to find
+    for plan in (processor.plan_layout(3, "A6", margin_mm=60, dpi=100), processor.plan_layout(0, processor.roll_paper(610), dpi=100),
+                 processor.plan_layout(3, processor.roll_paper(20), dpi=100)):
+        assert plan.frames_per_page == 0 and plan.page_count == 0
+        assert plan.page_of(0) is None and plan.frame_at(0, 500, 500) is None
+
+def test_project_roundtrip_uses_proxies(tmp_path):
+    import project
+
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    Image.new('RGB', (600, 400), color='red').save(photos / "a.jpg")
+    Image.new('RGB', (400, 600), color='blue').save(photos / "b.jpg")
+    specs = [(str(photos / "a.jpg"), 'short', 'color', 'positive', 0, 0),
+             (str(photos / "b.jpg"), 'long', 'sepia', 'negative', 90, 30),
+             (str(photos / "a.jpg"), 'short', 'color', 'positive', 0, 0)]
+    settings = {"paper_size": "A5", "orientation": "Landscape", "margin_mm": 7, "gap_mm": 3, "dpi": 600, "mode": "vector",
+                "compression": "jpeg", "jpeg_quality": 80,
+                "output_profile": "sRGB", "intent": "relative"}
+    path = str(tmp_path / ("session" + project.PROJECT_EXT))
+    project.save_project(path, specs, settings)
+
+    # Move the project and its photos together: relative paths still resolve
+    moved = tmp_path / "moved"
+    moved.mkdir()
+    photos.rename(moved / "photos")
+    os.replace(path, moved / "session.filmproj")
+    loaded_specs, loaded_settings, proxies = project.load_project(str(moved / "session.filmproj"))
+    assert loaded_settings == settings
+    assert loaded_specs == [(str(moved / "photos" / os.path.basename(s[0])),) + s[1:] for s in specs]
+    assert len(proxies) == 2
+
+    # Proxies serve the preview without opening any source
+    opened = []
+    def fallback(spec, dpi):
+        opened.append(spec)
+        return processor.create_film_frame(**processor.spec_kwargs(spec), draw_holes=False, dpi=dpi)
+    source = project.proxy_frame_source(proxies, fallback)
+    frames = source.many(loaded_specs, 100)
+    assert opened == []
+    assert frames[0].size == (processor.mm_to_px(processor.FRAME_W_MM, 100), processor.mm_to_px(processor.FRAME_H_MM, 100))
+    r, g, b = frames[0].getpixel((frames[0].width // 2, frames[0].height // 2))
+    assert r > 200 and g < 60 and b < 60
+
+    # An edited frame no longer matches its proxy and is rendered from the source
+    edited = (loaded_specs[0][0], 'long', 'bw', 'positive', 0)
+    source(edited, 100)
+    assert opened == [edited]
+
+def test_color_lut_single_pass():
+    from PIL import ImageOps
+
+    assert processor.color_lut('color', 'positive', 0) is None
+    assert processor.color_lut('sepia', 'negative', 40) is processor.color_lut('sepia', 'negative', 40)
+
+    ramp = Image.linear_gradient('L').rotate(90).resize((256, 4)).convert('RGB')
+    # Plain negative is an exact inversion, in color and gray modes
+    assert processor.apply_color(ramp, 'color', 'negative').tobytes() == ImageOps.invert(ramp).tobytes()
+    assert processor.apply_color(ramp, 'bw', 'negative').tobytes() == ImageOps.invert(ramp.convert('L').convert('RGB')).tobytes()
+
+    # Gray modes go through a palette: same result as mapping every channel of the gray image
+    gray = ramp.convert('L').convert('RGB')
+    for color_mode, film_type, contrast in [('bw', 'positive', 60), ('sepia', 'positive', 0), ('sepia', 'color_negative', -50)]:
+        lut = processor.color_lut(color_mode, film_type, contrast)
+        assert processor.apply_color(ramp, color_mode, film_type, contrast).tobytes() == gray.point(lut).tobytes()
+
+    # Sepia keeps black and white and warms the midtones
+    sepia = processor.apply_color(ramp, 'sepia')
+    assert sepia.getpixel((0, 0)) == (0, 0, 0) and sepia.getpixel((255, 0)) == (255, 255, 255)
+    r, g, b = sepia.getpixel((128, 0))
+    assert r > g > b
+
+    # The unexposed base of a color negative is orange
+    r, g, b = processor.apply_color(ramp, 'color', 'color_negative').getpixel((0, 0))
+    assert r > g > b > 0
+
+    # Contrast steepens the midtones, negative contrast flattens towards gray
+    steep = processor.apply_color(ramp, 'color', 'positive', 100)
+    flat = processor.apply_color(ramp, 'color', 'positive', -100)
+    assert steep.getpixel((64, 0))[0] < 64 < flat.getpixel((64, 0))[0] < 128
+
+def test_contrast_keeps_positional_arguments(tmp_path):
+    src = tmp_path / "photo.png"
+    Image.new('RGB', (600, 400), color='gray').save(src)
+    # Calls written before contrast existed keep their meaning: no holes, 100 DPI
+    frame = processor.create_film_frame(str(src), 'short', 'color', 'positive', 0, False, 100)
+    assert frame.size == (processor.mm_to_px(processor.FRAME_W_MM, 100), processor.mm_to_px(processor.FRAME_H_MM, 100))
+    assert frame.tobytes() == processor.create_film_frame(str(src), draw_holes=False, dpi=100, contrast=0).tobytes()
+    spec = (str(src), 'short', 'color', 'positive', 0, 40)
+    assert processor.spec_kwargs(spec)["contrast"] == 40
+    assert processor.create_film_frame(**processor.spec_kwargs(spec), dpi=100).tobytes() != frame.tobytes()
+
+def test_pdf_pieces_encoded_in_parallel(monkeypatch):
+    import io
+    import re
+    import zlib
+    import pdfwriter
+
+    # Small pieces, so every band is split and carries rows to the next
+    monkeypatch.setattr(pdfwriter, "CHUNK_BYTES", 300 * 3 * 40)
+    page = Image.effect_noise((300, 203), 60).convert('RGB')
+    jpeg = io.BytesIO()
+    page.save(jpeg, "JPEG", quality=80, subsampling=2, restart_marker_rows=1)
+
+    for compression in pdfwriter.COMPRESSIONS:
+        buf = io.BytesIO()
+        with processor.collect_metrics() as metrics:
+            with pdfwriter.PdfWriter(buf, 150, compression, jpeg_quality=80, workers=4) as writer:
+                writer.begin_page(300, 203)
+                for y in range(0, 203, 37):
+                    writer.write_band(page.crop((0, y, 300, min(y + 37, 203))))
+                writer.end_page()
+                writer.add_page(page)
+        assert metrics.stages["encode"]["count"] > 2
+        streams = re.findall(rb"/Length \d+ 0 R >>\nstream\n(.*?)\nendstream", buf.getvalue(), re.S)
+        assert len(streams) == 2
+        for stream in streams:
+            if compression == "jpeg":
+                # The pieces join into exactly the JPEG of the whole page
+                assert stream == jpeg.getvalue()
+            else:
+                assert zlib.decompress(stream) == page.tobytes()
+
+def test_roll_paper_streams_strips(tmp_path, monkeypatch):
+    import re
+    import zlib
+    import pdfwriter
+
+    src = tmp_path / "roll.png"
+    Image.new('RGB', (600, 400), color='teal').save(src)
+    paper = processor.roll_paper(120)
+    assert processor.roll_width_mm(paper) == 120 and processor.roll_width_mm("A4") is None
+
+    # 3 frames across 120 mm, and the single page is exactly as long as 9 strips
+    plan = processor.plan_layout(25, paper, margin_mm=5, gap_mm=2, dpi=50)
+    g = plan.grid
+    assert (plan.page_count, g["cols"], g["rows"]) == (1, 3, 9)
+    assert g["page_h"] == 2 * g["margin"] + 9 * g["frame_h"] + 8 * g["gap"]
+    assert plan.frame_at(0, *plan.frame_rect(24)[:2]) == 24
+
+    # A long roll's preview DPI is lowered to the pixel cap, with the export's strips
+    preview_dpi = processor.roll_preview_dpi(300, 2000, paper, margin_mm=5, gap_mm=2, layout_dpi=300)
+    preview = processor.plan_layout(2000, paper, margin_mm=5, gap_mm=2, dpi=preview_dpi, layout_dpi=300)
+    assert preview_dpi < 300 and preview.grid["page_w"] * preview.grid["page_h"] <= processor.MAX_ROLL_PREVIEW_PIXELS
+    assert preview.grid["rows"] == processor.plan_layout(2000, paper, margin_mm=5, gap_mm=2, dpi=300).grid["rows"]
+    assert processor.roll_preview_dpi(300, 2000, "A4") == 300
+
+    specs = [(str(src), 'short', 'color', 'positive', 0)] * 25
+    engine = processor.LayoutEngine(processor.frame_source(workers=1), max_pages=0)
+    engine.update(specs, paper_size=paper, margin_mm=5, dpi=50)
+    bands = list(engine.iter_page_bands(0))
+    assert all(band.height <= g["frame_h"] for _, band in bands)
+    page = engine.render_page(0)
+    for y, band in bands:
+        assert band.tobytes() == page.crop((0, y, page.width, y + band.height)).tobytes()
+
+    # One more frame starts a new strip and lengthens the roll
+    assert engine.update(specs + specs[:1], paper_size=paper, margin_mm=5, dpi=50) == [0]
+    assert engine.grid["rows"] == 9 and engine.update(specs * 2, paper_size=paper, margin_mm=5, dpi=50) == [0]
+    assert engine.grid["rows"] == 17
+
+    # Over 200 inches long: one page, scaled into the box with a user unit
+    engine.update(specs * 17, paper_size=paper, margin_mm=5, dpi=50)
+    path = tmp_path / "roll.pdf"
+    assert pdfwriter.write_layout_pdf(str(path), engine) == 1
+    data = path.read_bytes()
+    assert b"/UserUnit 2" in data and b"/Version /1.6" in data
+
+    # Past the JPEG size limit the page becomes a stack of images cut between strips
+    monkeypatch.setattr(pdfwriter, "JPEG_MAX_SIDE", 500)
+    engine.update(specs * 2, paper_size=paper, margin_mm=5, dpi=50)
+    g = engine.grid
+    breaks = pdfwriter.strip_breaks(g, 50)
+    bounds = [0, *breaks, g["page_h"]]
+    assert len(breaks) == 2 and all(0 < y1 - y0 <= 500 for y0, y1 in zip(bounds, bounds[1:]))
+    strip_rows = [(y, y + g["frame_h"] + 1) for _, y, _ in processor.page_rows(g, 50)]
+    assert not any(y0 < y < y1 for y in breaks for y0, y1 in strip_rows)
+    assert pdfwriter.write_layout_pdf(str(path), engine, band_height=70) == 1
+    data = path.read_bytes()
+    streams = re.findall(rb"/Filter /FlateDecode /Length \d+ 0 R >>\nstream\n(.*?)\nendstream", data, re.S)
+    assert [int(h) for h in re.findall(rb"/Subtype /Image /Width \d+ /Height (\d+)", data)] == [y1 - y0 for y0, y1 in zip(bounds, bounds[1:])]
+    assert b"".join(zlib.decompress(s) for s in streams) == engine.render_page(0).tobytes()
+    assert pdfwriter.write_layout_pdf(str(path), engine, compression="jpeg") == 1
+
+def _icc_profile(space, curves, name, colorants=()):
+    # Minimal ICC v2 display profile: D50 XYZ colorant columns and gamma curves
+    import struct
+    s15 = lambda *v: b"".join(struct.pack(">i", round(x * 65536)) for x in v)
+    desc = name.encode() + b"\0"
+    tags = [(b"desc", b"desc" + bytes(4) + struct.pack(">I", len(desc)) + desc + bytes(4 + 4 + 3 + 67)),
+            (b"wtpt", b"XYZ " + bytes(4) + s15(0.9642, 1.0, 0.8249)),
+            (b"cprt", b"text" + bytes(4) + b"none\0")]
+    for sig, xyz in zip((b"rXYZ", b"gXYZ", b"bXYZ"), colorants):
+        tags.append((sig, b"XYZ " + bytes(4) + s15(*xyz)))
+    tags += [(sig, b"curv" + bytes(4) + struct.pack(">IH", 1, round(gamma * 256))) for sig, gamma in curves]
+    offset = 128 + 4 + 12 * len(tags)
+    table, data = b"", b""
+    for sig, body in tags:
+        body += bytes(-len(body) % 4)
+        table += sig + struct.pack(">II", offset + len(data), len(body))
+        data += body
+    size = offset + len(data)
+    header = (struct.pack(">I", size) + bytes(4) + bytes([2, 0x10, 0, 0]) + b"mntr" + space.ljust(4) + b"XYZ " + bytes(12)
+              + b"acsp" + bytes(24) + bytes(4) + s15(0.9642, 1.0, 0.8249) + bytes(48))
+    return header + struct.pack(">I", len(tags)) + table + data
+
+def _matrix_profile(columns, gamma, name):
+    return _icc_profile(b"RGB", [(sig, gamma) for sig in (b"rTRC", b"gTRC", b"bTRC")], name, columns)
+
+def test_icc_conversion_and_cached_transforms(tmp_path):
+    import pdfwriter
+
+    adobe = _matrix_profile(((0.6097559, 0.3111242, 0.0194811), (0.2052401, 0.6256560, 0.0608902),
+                             (0.1492240, 0.0632197, 0.7448387)), 563 / 256, "Adobe RGB (1998) compatible")
+    profile_path = tmp_path / "adobe.icc"
+    profile_path.write_bytes(adobe)
+    color = (60, 160, 90)
+    Image.new('RGB', (360, 240), color).save(tmp_path / "plain.png")
+    Image.new('RGB', (360, 240), color).save(tmp_path / "tagged.png", icc_profile=adobe)
+
+    def center(path, **kwargs):
+        frame = processor.create_frame_image(str(path), dpi=100, **kwargs)
+        return frame.getpixel((frame.width // 2, frame.height // 2))
+
+    # Untagged sources count as sRGB and pass through unchanged
+    assert center(tmp_path / "plain.png") == color
+    assert processor.icc_transform(None) is None
+    # The wider Adobe RGB green comes out more saturated in sRGB
+    tagged = center(tmp_path / "tagged.png")
+    assert tagged[1] > color[1] and tagged[0] < color[0]
+
+    # Gray sources are managed too: untagged gray counts as sRGB gray...
+    gray = 128
+    Image.new('L', (360, 240), gray).save(tmp_path / "gray.png")
+    Image.new('RGB', (360, 240), (gray,) * 3).save(tmp_path / "gray_rgb.png")
+    adobe_target = processor.color_target(str(profile_path), "relative")
+    assert center(tmp_path / "gray.png") == (gray,) * 3
+    assert center(tmp_path / "gray.png", color_target=adobe_target) == center(tmp_path / "gray_rgb.png", color_target=adobe_target)
+    # ...and an embedded gray profile is honored: linear mid gray is lighter in sRGB
+    Image.new('L', (360, 240), gray).save(tmp_path / "linear_gray.png", icc_profile=_icc_profile(b"GRAY", [(b"kTRC", 1.0)], "Linear gray"))
+    linear = center(tmp_path / "linear_gray.png")
+    assert linear[0] > 170 and max(linear) - min(linear) <= 2
+    assert processor.make_thumbnail(str(tmp_path / "linear_gray.png")).getpixel((0, 0))[0] > 170
+
+    # One transform per (source profile, mode, target), however many frames use it
+    processor.icc_transform.cache_clear()
+    for _ in range(3):
+        center(tmp_path / "tagged.png", quality='preview')
+    info = processor.icc_transform.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
+
+    # Converting for an Adobe RGB output embeds the profile; a soft proof shows it as sRGB
+    target = processor.color_target(str(profile_path), "relative")
+    assert center(tmp_path / "tagged.png", color_target=target) == color
+    assert processor.preview_color_target(target) == ("sRGB", "relative", False)
+    proof = processor.preview_color_target(target, soft_proof=True)
+    assert proof == (str(profile_path), "relative", True) and processor.output_profile_bytes(proof) is None
+    path = tmp_path / "adobe.pdf"
+    specs = [(str(tmp_path / "tagged.png"), 'short', 'color', 'positive', 0, 0)]
+    pdfwriter.write_vector_pdf(str(path), specs, dpi=100, color_target=target)
+    assert b"/ColorSpace [/ICCBased 3 0 R]" in path.read_bytes()
+
+def test_probe_image_reads_header_only(tmp_path, monkeypatch):
+    import struct
+    from PIL import ImageFile
+
+    # EXIF with orientation 6 (shot rotated) and a blue embedded thumbnail in IFD1
+    buf = io.BytesIO()
+    Image.new('RGB', (160, 120), color='blue').save(buf, "JPEG")
+    thumb = buf.getvalue()
+    tiff = (b"II*\0" + struct.pack("<I", 8)
+            + struct.pack("<HHHIHHI", 1, 0x0112, 3, 1, 6, 0, 26)
+            + struct.pack("<HHHIIHHII", 2, 0x0201, 4, 1, 56, 0x0202, 4, 1, len(thumb)) + struct.pack("<I", 0)
+            + thumb)
+    src = tmp_path / "camera.jpg"
+    Image.new('RGB', (600, 400), color='red').save(src, exif=b"Exif\0\0" + tiff)
+
+    info = processor.probe_image(str(src), size=64)
+    assert info["size"] == (600, 400) and info["mode"] == 'RGB' and not info["icc"]
+    assert info["orientation"] == 6 and "rotation" not in info
+    assert info["thumbnail"].size == (64, 48)
+    assert info["thumbnail"].getpixel((32, 24))[2] > 200 # The embedded one, not the red photo
+
+    Image.new('RGB', (300, 200), color='red').save(tmp_path / "plain.png")
+    Image.new('RGB', (300, 200), color='red').save(tmp_path / "camera.png", exif=b"Exif\0\0" + tiff)
+    loads = []
+    real_load = ImageFile.ImageFile.load
+    monkeypatch.setattr(ImageFile.ImageFile, "load", lambda self: loads.append(self.format) or real_load(self))
+    info = processor.probe_image(str(tmp_path / "plain.png"))
+    assert (info["orientation"], info["thumbnail"]) == (1, None)
+    # PNG EXIF comes from its header chunk; the pixels are never decoded
+    info = processor.probe_image(str(tmp_path / "camera.png"), size=64)
+    assert info["orientation"] == 6 and info["thumbnail"].size == (64, 48)
+    assert "PNG" not in loads
+
+def test_pipelined_export_progress_and_cancel(tmp_path):
+    import threading
+    import time
+    import pdfwriter
+
+    src = tmp_path / "photo.png"
+    Image.new('RGB', (600, 400), color='olive').save(src)
+    specs = [(str(src), 'short', 'color', 'positive', 0, c) for c in range(14)]
+    engine = processor.LayoutEngine(processor.frame_source(workers=1), max_pages=0)
+    engine.update(specs, paper_size="A6", margin_mm=5, dpi=60)
+    assert engine.page_count == 3
+
+    # Rendering runs ahead of the consumer by at most the queue depth
+    rendered = []
+    lock = threading.Lock()
+    def counting(spec, dpi):
+        with lock:
+            rendered.append(spec)
+        return processor.frame_cache.get(**processor.spec_kwargs(spec), draw_holes=False, dpi=dpi)
+    slow = processor.LayoutEngine(counting, max_pages=0)
+    slow.update(specs, paper_size="A6", margin_mm=5, dpi=60)
+    cols = slow.grid["cols"]
+    with processor.RowPipeline(slow, depth=1) as rows:
+        assert len(rows.take(specs[:cols])) == cols
+        time.sleep(0.3)
+        assert len(rendered) <= 3 * cols
+
+    # A source that can submit() gets the next rows in flight while one is collected
+    submitted = []
+    class Pending:
+        def __init__(self, specs, dpi):
+            self.specs, self.dpi = specs, dpi
+        def result(self):
+            return [counting(spec, self.dpi) for spec in self.specs]
+        def discard(self):
+            pass
+    def submit(specs, dpi, after=None):
+        submitted.append(specs)
+        return Pending(specs, dpi)
+    counting.submit = submit
+    with processor.RowPipeline(slow, depth=1, frames_ahead=3 * cols) as rows:
+        assert rows.take(specs[:cols]) is not None
+        time.sleep(0.3)
+        assert 3 < len(submitted) <= 5
+        for specs_row in submitted[1:]:
+            assert len(rows.take(specs_row)) == len(specs_row)
+    del counting.submit
+
+    # The same pages as rendering in line, with progress per band and page
+    path = tmp_path / "out.pdf"
+    calls = []
+    assert pdfwriter.write_layout_pdf(str(path), engine, progress=lambda *a: calls.append(a), compression="jpeg") == 3
+    assert calls[-1] == (14, 3) and calls == sorted(calls)
+    piped = path.read_bytes()
+    with pdfwriter.PdfWriter(str(tmp_path / "inline.pdf"), 60, "jpeg") as writer:
+        for page_index in range(engine.page_count):
+            writer.begin_page(engine.grid["page_w"], engine.grid["page_h"])
+            for _, band in engine.iter_page_bands(page_index):
+                writer.write_band(band)
+            writer.end_page()
+    assert piped == (tmp_path / "inline.pdf").read_bytes()
+
+    # Cancelling keeps the previous file and leaves no temporary file behind
+    def cancel_after_first(frames, pages):
+        calls.append("stop")
+    calls.clear()
+    try:
+        pdfwriter.write_layout_pdf(str(path), engine, progress=cancel_after_first, cancelled=lambda: bool(calls))
+        assert False, "export was not cancelled"
+    except processor.RenderCancelled:
+        pass
+    assert path.read_bytes() == piped and not os.path.exists(str(path) + ".tmp")
+
+    # Vector export reports and checks for a cancel at every photo, not only between pages
+    calls.clear()
+    try:
+        pdfwriter.write_vector_pdf(str(path), specs, paper_size="A6", margin_mm=5, dpi=60,
+                                   progress=lambda *a: calls.append(a), cancelled=lambda: len(calls) == 2)
+        assert False, "export was not cancelled"
+    except processor.RenderCancelled:
+        pass
+    assert calls == [(1, 0), (2, 0)]
+    assert path.read_bytes() == piped and not os.path.exists(str(path) + ".tmp")
+
 if __name__ == "__main__":
     try:
         test_generate()